@@ -0,0 +1,220 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+from six.moves import queue as queues
+
+from pysciencedock.instrument import METRICS_ENV, PROFILE_ENV, Metrics, fileSize, peakRss
+from pysciencedock.resultcache import RESULT_CACHE_ENV
+
+from synthetic import writeStudy
+
+# Each benchmark runs a task on a synthetic study with the given number of
+# groups and non-file parameters. readCsv is not a task, so it is timed
+# directly.
+BENCHMARKS = [
+    ('readCsv', 'pysciencedock.io.readCsv', 2, {}),
+    ('normalize', 'pysciencedock.metabolomics.normalize', 2, {'normalization': 'median', 'transformation': 'log', 'scaling': 'auto'}),
+    ('ttest', 'pysciencedock.statistics.ttest', 2, {}),
+    ('anova', 'pysciencedock.statistics.anova', 3, {}),
+    ('correlation', 'pysciencedock.statistics.correlation', 2, {}),
+    ('hierarchy', 'pysciencedock.statistics.hierarchy', 2, {'method': 'average'}),
+    ('heatmap', 'pysciencedock.statistics.heatmap', 2, {'method': 'average'}),
+    ('pca', 'pysciencedock.statistics.pca', 2, {'num_components': 5}),
+    ('plsda', 'pysciencedock.statistics.plsda', 2, {'num_components': 3}),
+    ('kmeans', 'pysciencedock.statistics.kmeans', 2, {'num_clusters': 3})
+]
+
+# Table sizes as (rows, columns).
+DEFAULT_SIZES = [(100, 100), (1000, 500), (5000, 1000)]
+
+# A run is a regression when it takes this fraction more time or memory than
+# the baseline...
+DEFAULT_TOLERANCE = 0.25
+
+# ...and the difference exceeds these, so that noise in tiny runs is ignored.
+MIN_SECONDS = 0.05
+MIN_BYTES = 16 << 20
+
+
+def _importPath(path):
+    moduleName, name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(moduleName), name)
+
+
+def _measure(name, path, dataFile, params, outDir, queue):
+    """
+    Runs one benchmark in a fresh process, so that its peak resident set
+    size is its own, and puts its metrics on the queue.
+    """
+    for var in [RESULT_CACHE_ENV, PROFILE_ENV]:
+        os.environ.pop(var, None)
+    metricsFile = os.path.join(outDir, 'metrics.jsonl')
+    os.environ[METRICS_ENV] = metricsFile
+    startRss = peakRss()
+
+    fun = _importPath(path)
+    if hasattr(fun, 'description'):
+        params = dict(params, data=dataFile)
+        for outputDesc in fun.description.outputs:
+            params[outputDesc['id']] = os.path.join(outDir, outputDesc['id'])
+        fun(_mode='params', params=params)
+    else:
+        metrics = Metrics(name, metricsFile)
+        with metrics.phase('deserialize', input='data', bytes=fileSize(dataFile)):
+            fun(dataFile)
+        metrics.emit('success')
+
+    with open(metricsFile) as f:
+        record = json.loads(f.readline())
+    record['start_rss'] = startRss
+    queue.put(record)
+
+
+def measure(name, path, dataFile, params):
+    """
+    Runs one benchmark in a child process and returns its metrics record.
+    """
+    outDir = tempfile.mkdtemp()
+    try:
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_measure, args=(name, path, dataFile, params, outDir, queue))
+        process.start()
+        # A child does not exit until the record it put on the queue is
+        # read, so read it before joining, giving up if the child died.
+        record = None
+        while record is None and (process.is_alive() or not queue.empty()):
+            try:
+                record = queue.get(timeout=1)
+            except queues.Empty:
+                pass
+        process.join()
+        if process.exitcode != 0 or record is None:
+            raise Exception('Benchmark %s failed with exit code %d' % (name, process.exitcode))
+        return record
+    finally:
+        shutil.rmtree(outDir, ignore_errors=True)
+
+
+def runBenchmarks(names=None, sizes=DEFAULT_SIZES, repeat=1, missing=0.0, skew=1.0, seed=0, log=None):
+    """
+    Times each benchmark on a synthetic study of each size, keeping the
+    fastest of the repeats, and returns the results as a JSON-ready dict.
+    """
+    benchmarks = [b for b in BENCHMARKS if names is None or b[0] in names]
+    dataDir = tempfile.mkdtemp()
+    results = []
+    try:
+        for rows, columns in sizes:
+            for name, path, groups, params in benchmarks:
+                dataFile = os.path.join(dataDir, '%dx%dx%d.csv' % (rows, columns, groups))
+                if not os.path.exists(dataFile):
+                    writeStudy(dataFile, rows, columns, groups=groups, missing=missing, skew=skew, seed=seed)
+                records = [measure(name, path, dataFile, params) for _ in range(repeat)]
+                best = min(records, key=lambda record: record['wall'])
+                result = {
+                    'benchmark': name,
+                    'rows': rows,
+                    'columns': columns,
+                    'groups': groups,
+                    'wall': best['wall'],
+                    'cpu': best['cpu'],
+                    'peak_rss': max(record['process_peak_rss'] for record in records),
+                    'start_rss': best['start_rss'],
+                    'phases': dict((phase['phase'], phase['wall']) for phase in best['phases'])
+                }
+                results.append(result)
+                if log is not None:
+                    log.write('%-12s %6d x %-6d %9.3fs %8.1f MiB\n' % (
+                        name, rows, columns, result['wall'], result['peak_rss'] / float(1 << 20)))
+    finally:
+        shutil.rmtree(dataDir, ignore_errors=True)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': multiprocessing.cpu_count()
+        },
+        'settings': {'repeat': repeat, 'missing': missing, 'skew': skew, 'seed': seed},
+        'results': results
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares benchmark results with a baseline, matching runs by benchmark
+    and size. Returns a list of the regressions found, each naming the
+    benchmark, size and metric, with the baseline and current values.
+    """
+    def key(result):
+        return (result['benchmark'], result['rows'], result['columns'])
+
+    baselineResults = dict((key(result), result) for result in baseline['results'])
+    regressions = []
+    for result in current['results']:
+        old = baselineResults.get(key(result))
+        if old is None:
+            continue
+        for metric, minimum in [('wall', MIN_SECONDS), ('peak_rss', MIN_BYTES)]:
+            if old.get(metric) is None or result.get(metric) is None:
+                continue
+            if result[metric] > old[metric] * (1 + tolerance) and result[metric] - old[metric] > minimum:
+                regressions.append({
+                    'benchmark': result['benchmark'],
+                    'rows': result['rows'],
+                    'columns': result['columns'],
+                    'metric': metric,
+                    'baseline': old[metric],
+                    'current': result[metric]
+                })
+    return regressions
+
+
+def parseSizes(text):
+    return [tuple(int(n) for n in size.split('x')) for size in text.split(',')]
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run',
+        description='Time pysciencedock tasks on synthetic studies of several sizes.')
+    parser.add_argument('--benchmarks', help='Comma-separated benchmarks to run, of: %s' % ', '.join(b[0] for b in BENCHMARKS))
+    parser.add_argument('--sizes', type=parseSizes, default=DEFAULT_SIZES, help='Comma-separated table sizes as ROWSxCOLUMNS')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs of each benchmark, keeping the fastest')
+    parser.add_argument('--missing', type=float, default=0.0, help='The fraction of missing values')
+    parser.add_argument('--skew', type=float, default=1.0, help='The standard deviation of the log abundances')
+    parser.add_argument('--seed', type=int, default=0, help='The random seed of the synthetic data')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare the results with this JSON file, exiting with status 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='The allowed fractional increase over the baseline')
+    args = parser.parse_args(args)
+
+    names = args.benchmarks.split(',') if args.benchmarks else None
+    results = runBenchmarks(names, args.sizes, args.repeat, args.missing, args.skew, args.seed, log=sys.stderr)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            sys.stderr.write('Regression in %(benchmark)s at %(rows)dx%(columns)d: %(metric)s %(baseline)s -> %(current)s\n' % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
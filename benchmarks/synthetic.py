@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+
+def syntheticStudy(rows, columns, groups=2, missing=0.0, skew=1.0, effect=0.1, seed=0):
+    """
+    A synthetic metabolomics study table, indexed by (_sample, _group) with
+    one column per metabolite.
+
+    Each metabolite has a log-normally distributed baseline abundance, and
+    each sample a log-normal dilution factor, so that sum and median
+    normalization have something to remove. A fraction of the metabolites
+    differ between groups.
+
+    :param rows: the number of samples.
+    :param columns: the number of metabolites.
+    :param groups: the number of groups, assigned to samples in turn.
+    :param missing: the fraction of values missing. Values are removed with
+        a probability that falls with their abundance, as values below the
+        detection limit of an instrument would be.
+    :param skew: the standard deviation of the log abundances; larger values
+        give more right-skewed columns.
+    :param effect: the fraction of metabolites whose mean differs between
+        groups.
+    :param seed: the random seed; equal arguments give equal tables.
+    """
+    random = np.random.RandomState(seed)
+
+    baseline = random.normal(10.0, 2.0, columns)
+    dilution = random.normal(0.0, 0.2, rows)
+    group = np.arange(rows) % groups
+    shift = np.zeros((groups, columns))
+    changed = random.rand(columns) < effect
+    shift[:, changed] = random.normal(0.0, 1.0, (groups, changed.sum()))
+
+    logValues = (baseline[np.newaxis, :] + dilution[:, np.newaxis] + shift[group] +
+                 random.normal(0.0, skew, (rows, columns)))
+    values = np.exp(logValues)
+
+    if missing > 0:
+        # Rank each value within its column, then drop low-ranked values more
+        # often, scaled so that the expected missing fraction is as asked.
+        ranks = logValues.argsort(axis=0).argsort(axis=0) / float(max(rows - 1, 1))
+        weight = 2.0 * (1.0 - ranks)
+        values[random.rand(rows, columns) < missing * weight] = np.nan
+
+    index = pd.MultiIndex.from_arrays(
+        [['sample%d' % i for i in range(rows)], ['group%d' % g for g in group]],
+        names=['_sample', '_group'])
+    return pd.DataFrame(values, index=index, columns=['m%d' % j for j in range(columns)])
+
+
+def writeStudy(fileName, rows, columns, **kwargs):
+    """
+    Writes a synthetic study table to a CSV file; the keyword arguments are
+    those of syntheticStudy.
+    """
+    syntheticStudy(rows, columns, **kwargs).to_csv(fileName)
+    return fileName
@@ -1,3 +0,0 @@
-import metabolomics
-import statistics
-import transform
@@ -1,28 +1,29 @@
-from inspect import getmembers, isfunction
-from itertools import chain
 import json
-import metabolomics
-import statistics
-import transform
 import sys
 
-modules = [
-    metabolomics,
-    statistics,
-    transform
-]
-
-tasks = list(chain.from_iterable([getmembers(module, isfunction) for module in modules]))
+from pysciencedock import registry
 
 if len(sys.argv) == 1:
-    print json.dumps([t[1](_mode='json') for t in tasks], indent=2)
+    print json.dumps(registry.listTasks(), indent=2)
+elif sys.argv[1] == '--build-manifest':
+    registry.writeManifest(*sys.argv[2:3])
+elif sys.argv[1] == '--pipeline':
+    from pysciencedock import pipeline
+    pipeline.main(sys.argv[2:])
+elif sys.argv[1] == '--cache-stats':
+    from pysciencedock.resultcache import getResultCache
+    cache = getResultCache()
+    print json.dumps(cache.stats() if cache is not None else None, indent=2)
+elif sys.argv[1] == '--batch':
+    from pysciencedock import batch
+    batch.main(sys.argv[2:])
+elif sys.argv[1] == '--serve':
+    from pysciencedock import server
+    server.main(sys.argv[2:])
 else:
     taskName = sys.argv[1]
-    found = False
-    for t in tasks:
-        if t[1](_mode='json')['container_args'][0] == taskName:
-            t[1](_mode='cli', args=sys.argv[2:])
-            found = True
-
-    if not found:
+    task = registry.getTask(taskName)
+    if task is not None:
+        task(_mode='cli', args=sys.argv[2:])
+    else:
         sys.stderr.write('Task "%s" not found.\n' % (taskName,))
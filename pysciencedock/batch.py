@@ -0,0 +1,291 @@
+"""
+Runs one task over many input files in a single process pool, so that the
+interpreter and task libraries are loaded once rather than once per file.
+
+Items are given as input file specifications, each a file name, a glob
+pattern or "@" followed by a manifest listing one per line. Each file is
+passed as the task's file input, and each output is written next to it,
+or to an output directory, named by a template:
+
+    python -m pysciencedock --batch ttest 'studies/*.csv' \\
+        --output pvalues={stem}_pvalues.csv --processes 8
+
+Templates may use {name} (the input file name), {stem} (the name without
+its extension), {ext} (the extension) and {output} (the output id).
+Alternatively, items are read from a JSON-lines file of parameters, one
+object per item, giving inputs and outputs explicitly:
+
+    {"data": "a.csv", "pvalues": "a_pvalues.csv"}
+
+Items are run as server requests, so a failing item is reported without
+stopping the others, as is an item whose worker process dies, for instance
+when it runs out of memory, or that runs longer than --timeout seconds.
+Progress is written to stderr as items complete, in the order they
+complete, and a summary of every item is written as JSON once all are done.
+"""
+
+import argparse
+import errno
+import fcntl
+import json
+import multiprocessing
+import os
+import signal
+import struct
+import sys
+import time
+
+from pysciencedock import registry
+from pysciencedock.io import expandPaths
+from pysciencedock.parallel import canFork
+from pysciencedock.server import runRequest
+
+# The output file name template used when none is given for an output.
+DEFAULT_OUTPUT_TEMPLATE = '{stem}_{output}{ext}'
+
+# Seconds between checks on the items running in the pool.
+POLL_SECONDS = 0.05
+
+# Seconds a worker must have been gone before its item is reported failed,
+# so that a result sent just before the worker exited still arrives.
+EXIT_GRACE_SECONDS = 1.0
+
+# The pipe on which workers report the item they start and their process
+# id. Workers are forked after it is opened, so they inherit it. Each report
+# is one write far smaller than the pipe buffer, so reports are never
+# interleaved and need no lock, which a dying worker could leave held.
+_started = None
+
+_REPORT = struct.Struct('<qq')
+
+
+def _parseAssignments(assignments, option):
+    values = {}
+    for assignment in assignments or []:
+        if '=' not in assignment:
+            raise Exception('%s expects ID=VALUE, got %s' % (option, assignment))
+        key, value = assignment.split('=', 1)
+        values[key] = value
+    return values
+
+
+def fileItems(task, specs, inputId=None, templates=None, outputDir=None):
+    """
+    Returns the parameters of one item per input file.
+
+    :param task: the describe-wrapped task.
+    :param specs: input file specifications, expanded by
+        :py:func:`pysciencedock.io.expandPaths`.
+    :param inputId: the file input the files are passed as, by default the
+        first file input of the task.
+    :param templates: a dict mapping output ids to file name templates;
+        other outputs use :py:data:`DEFAULT_OUTPUT_TEMPLATE`.
+    :param outputDir: the directory to write outputs to, by default that of
+        each input file.
+    """
+    description = task.description
+    fileInputs = [descInput['id'] for descInput in description.inputs if descInput['type'] == 'file']
+    if inputId is None:
+        if not fileInputs:
+            raise Exception('Task "%s" has no file input' % description.name)
+        inputId = fileInputs[0]
+    elif inputId not in fileInputs:
+        raise Exception('Task "%s" has no file input "%s"' % (description.name, inputId))
+    templates = templates or {}
+    outputIds = [outputDesc['id'] for outputDesc in description.outputs]
+    for outputId in templates:
+        if outputId not in outputIds:
+            raise Exception('Task "%s" has no output "%s"' % (description.name, outputId))
+
+    items = []
+    for fileName in expandPaths(specs):
+        name = os.path.basename(fileName)
+        stem, ext = os.path.splitext(name)
+        params = {inputId: fileName}
+        for outputId in outputIds:
+            outputName = templates.get(outputId, DEFAULT_OUTPUT_TEMPLATE).format(
+                name=name, stem=stem, ext=ext, output=outputId)
+            params[outputId] = os.path.join(
+                outputDir if outputDir is not None else os.path.dirname(fileName), outputName)
+        items.append(params)
+    return items
+
+
+def readItems(fileName):
+    """
+    Reads item parameters from a JSON-lines file, skipping blank lines.
+    """
+    with open(fileName) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _runItem(request):
+    os.write(_started[1], _REPORT.pack(request['id'], os.getpid()))
+    return runRequest(request)
+
+
+def _readReports(fd, pending):
+    """
+    Returns the (item id, process id) reports waiting on the pipe, keeping
+    any partial report in the pending bytearray.
+    """
+    while True:
+        try:
+            data = os.read(fd, 4096)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+            break
+        if not data:
+            break
+        pending.extend(data)
+    count = len(pending) // _REPORT.size
+    reports = [_REPORT.unpack_from(bytes(pending), i * _REPORT.size) for i in range(count)]
+    del pending[:count * _REPORT.size]
+    return reports
+
+
+def _poolResponses(requests, processes, timeout):
+    """
+    Yields the response of each request in the order they complete, run in a
+    pool of processes. A request whose worker exits without a result, or
+    that runs longer than timeout seconds, gets an error response instead of
+    leaving the pool waiting for it; the pool replaces the worker.
+    """
+    global _started
+    _started = os.pipe()
+    fcntl.fcntl(_started[0], fcntl.F_SETFL, fcntl.fcntl(_started[0], fcntl.F_GETFL) | os.O_NONBLOCK)
+    pool = multiprocessing.Pool(min(processes, len(requests)))
+    try:
+        pending = dict((request['id'], pool.apply_async(_runItem, (request,))) for request in requests)
+        running = {}
+        exited = {}
+        partial = bytearray()
+        while pending:
+            for itemId, pid in _readReports(_started[0], partial):
+                running[itemId] = (pid, time.time())
+
+            done = [itemId for itemId, result in pending.items() if result.ready()]
+            for itemId in done:
+                running.pop(itemId, None)
+                yield pending.pop(itemId).get()
+
+            alive = set(child.pid for child in multiprocessing.active_children())
+            now = time.time()
+            for itemId, (pid, start) in list(running.items()):
+                error = None
+                if pid not in alive:
+                    if now - exited.setdefault(itemId, now) > EXIT_GRACE_SECONDS:
+                        error = 'The worker process running the item exited'
+                elif timeout and now - start > timeout:
+                    os.kill(pid, signal.SIGKILL)
+                    error = 'The item ran longer than %g seconds' % timeout
+                if error is not None:
+                    del running[itemId]
+                    del pending[itemId]
+                    yield {'id': itemId, 'status': 'error', 'error': error, 'seconds': now - start}
+            if not done:
+                time.sleep(POLL_SECONDS)
+    finally:
+        pool.terminate()
+        pool.join()
+        for fd in _started:
+            os.close(fd)
+        _started = None
+
+
+def runBatch(taskName, items, params=None, processes=1, progress=None, timeout=None):
+    """
+    Runs a task once per item in a pool of processes and returns a summary
+    of the runs. Errors in an item are reported in its response rather than
+    raised.
+
+    :param taskName: the name of the task.
+    :param items: a list of dicts of parameters, one per run.
+    :param params: parameters common to every run, overridden by those of
+        each item.
+    :param processes: the number of worker processes.
+    :param progress: a stream to write a line to as each item completes.
+    :param timeout: the seconds an item may run before it is stopped and
+        reported as failed. Items are run in worker processes when a timeout
+        is given, even with one process.
+    :returns: a dict with the task name, the counts of items, successes and
+        failures, the elapsed seconds and the response of each item, as
+        returned by :py:func:`pysciencedock.server.runRequest`.
+    """
+    # Importing the task before the workers are forked means they inherit it.
+    task = registry.getTask(taskName)
+    if task is None:
+        raise Exception('Task "%s" not found.' % (taskName,))
+
+    outputs = set()
+    for item in items:
+        for outputDesc in task.description.outputs:
+            fileName = item.get(outputDesc['id'])
+            if fileName is not None:
+                if fileName in outputs:
+                    raise Exception('More than one item writes %s' % fileName)
+                outputs.add(fileName)
+
+    requests = [{'id': i, 'task': taskName, 'params': dict(params or {}, **item)} for i, item in enumerate(items)]
+    start = time.time()
+    if requests and (processes > 1 or timeout) and canFork():
+        completed = _poolResponses(requests, processes, timeout)
+    else:
+        completed = (runRequest(request) for request in requests)
+    responses = {}
+    for response in completed:
+        responses[response['id']] = response
+        if progress is not None:
+            progress.write('[%d/%d] %s %s %.2fs\n' % (
+                len(responses), len(requests), json.dumps(items[response['id']], sort_keys=True),
+                response['status'], response['seconds']))
+            progress.flush()
+
+    failed = sum(1 for response in responses.values() if response['status'] != 'success')
+    return {
+        'task': taskName,
+        'items': len(responses),
+        'succeeded': len(responses) - failed,
+        'failed': failed,
+        'seconds': time.time() - start,
+        'results': [dict(responses[request['id']], params=request['params']) for request in requests]
+    }
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        prog='pysciencedock --batch',
+        description='Run a task over many input files in a pool of processes.')
+    parser.add_argument('task', help='The task to run')
+    parser.add_argument('inputs', nargs='*', help='Input files, glob patterns or @manifest files')
+    parser.add_argument('--input', help='The file input to pass each file as; by default the first file input of the task')
+    parser.add_argument('--output', action='append', metavar='ID=TEMPLATE',
+        help='The file name template of an output; by default %s' % DEFAULT_OUTPUT_TEMPLATE)
+    parser.add_argument('--output-dir', help='The directory to write outputs to; by default that of each input')
+    parser.add_argument('--items', help='A JSON-lines file of item parameters, one object per item, instead of input files')
+    parser.add_argument('--param', action='append', metavar='ID=VALUE', help='A parameter common to every item')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--timeout', type=float, help='Seconds an item may run before it is stopped and reported as failed')
+    parser.add_argument('--summary', help='Write the summary JSON to this file instead of stdout')
+    args = parser.parse_args(args)
+
+    task = registry.getTask(args.task)
+    if task is None:
+        sys.stderr.write('Task "%s" not found.\n' % (args.task,))
+        sys.exit(1)
+
+    items = readItems(args.items) if args.items else []
+    if args.inputs:
+        items += fileItems(task, args.inputs, args.input, _parseAssignments(args.output, '--output'), args.output_dir)
+    summary = runBatch(args.task, items, _parseAssignments(args.param, '--param'), args.processes, sys.stderr, args.timeout)
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.write('\n')
+    else:
+        json.dump(summary, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    if summary['failed']:
+        sys.exit(1)
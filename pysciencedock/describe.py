@@ -4,6 +4,10 @@ import json
 import six
 import sys
 
+from .instrument import Metrics, fileSize, shapeOf
+from .io import expandPaths, formatForName, readInput, writeOutput
+from .resultcache import getResultCache
+
 
 class Description(object):
     """
@@ -20,6 +24,7 @@ class Description(object):
         self._dockerImage = dockerImage
         self._inputs = []
         self._outputs = []
+        self._stream = None
 
     def asDict(self, name, pullImage=True):
         """
@@ -87,6 +92,10 @@ class Description(object):
         :param upper: For string types, set this to True if the string should be
             converted to uppercase.
         :type upper: bool
+        :param paths: For string types, set this to True if the string names
+            input files as :py:func:`pysciencedock.io.expandPaths` expands
+            them, so that cached results are keyed by their content.
+        :type paths: bool
         """
 
         inputSpec = {
@@ -127,6 +136,22 @@ class Description(object):
         self._outputs.append(outputSpec)
         return self
 
+    def stream(self, fun):
+        """
+        Sets a function taking the same arguments as the described function
+        and returning its outputs in a form that their serializers write
+        incrementally, such as a generator of DataFrame chunks. Runs that
+        serialize the outputs call it instead, so large outputs need not be
+        held in memory, while direct calls still return plain values.
+        :param fun: the streaming function.
+        """
+        self._stream = fun
+        return self
+
+    @property
+    def streamer(self):
+        return self._stream
+
     @property
     def name(self):
         return self._name
@@ -181,83 +206,177 @@ class describe(object):  # noqa: class name
                     json.dump(self.description.asDict(fun.__name__), sys.stdout, indent=2)
                     sys.stdout.write('\n')
                     return
-                parser = argparse.ArgumentParser(
-                    prog=fun.__name__, description=self.description.name + '\n' + self.description.description)
-                for descInput in self.description.inputs:
-                    parser.add_argument('--' + descInput['id'],
-                        help=descInput.get('name', descInput['id'] + '. ' + descInput['description']),
-                        required=descInput.get('required', False),
-                        default=descInput.get('default', None)
-                    )
-                for descOutput in self.description.outputs:
-                    parser.add_argument('--' + descOutput['id'],
-                        help=descOutput.get('name', descOutput['id'] + '. ' + descOutput['description']),
-                        required=False
-                    )
-                kwargs = {}
-                cliParams = {k: v for k, v in six.iteritems(vars(parser.parse_args(args))) if v != None}
-                for descInput in self.description.inputs:
-                    inputId = descInput['id']
-                    inputType = descInput['type']
-                    if inputId in cliParams:
-                        if inputType == 'file' and 'deserialize' in descInput:
-                            kwargs[inputId] = descInput['deserialize'](cliParams[inputId])
-                        else:
-                            kwargs[inputId] = cliParams[inputId]
+                metrics = Metrics.fromEnvironment(fun.__name__)
+                with metrics.phase('parse'):
+                    params = self._parseArgs(fun, args)
+                result = self.run(fun, params, metrics)
+                if result is not None:
+                    json.dump(result, sys.stdout, indent=2)
+                    sys.stdout.write('\n')
+                return
+            elif mode == 'params':
+                return self.run(fun, kwargs.get('params', {}))
+            elif mode == 'stream':
+                del kwargs['_mode']
+                return (self.description.streamer or fun)(**self._prepareInputs(kwargs))
             elif mode == 'json':
                 return self.description.asDict(fun.__name__)
-            else:
-                # Roll positional args into kwargs
-                argNames = inspect.getargspec(fun).args
-                for arg in range(len(args)):
-                    kwargs[argNames[arg]] = args[arg]
-
-            for descInput in self.description.inputs:
-                id = descInput['id']
-                if id in kwargs:
-                    kwargs[id] = self._validateInput(id, descInput, kwargs[id])
-                elif 'default' in descInput:
-                    kwargs[id] = descInput['default']
-                elif descInput['required']:
-                    raise Exception('Input "%s" is required.' % id)
-                else:
-                    # If required=False but no default is specified, use None
-                    kwargs[id] = None
 
-            result = fun(**kwargs)
-
-            if mode == 'cli':
-                if len(self.description.outputs) == 0:
-                    return
-                if len(self.description.outputs) == 1:
-                    result = {self.description.outputs[0]['id']: result}
-                for outputDesc in self.description.outputs:
-                    outputId = outputDesc['id']
-                    outputType = outputDesc['type']
-                    if outputId in result:
-                        if outputType == 'new-file':
-                            if outputId in cliParams:
-                                fileName = cliParams[outputId]
-                            else:
-                                fileName = descOutput.get('path', outputId)
-                            if 'serialize' in outputDesc:
-                                outputDesc['serialize'](result[outputId], fileName)
-                            result[outputId] = fileName
-                json.dump(result, sys.stdout, indent=2)
-                sys.stdout.write('\n')
-                return
+            # Roll positional args into kwargs
+            argNames = inspect.getargspec(fun).args
+            for arg in range(len(args)):
+                kwargs[argNames[arg]] = args[arg]
 
-            return result
+            return fun(**self._prepareInputs(kwargs))
 
         wrapped.description = self.description
         return wrapped
 
+    def run(self, fun, params, metrics=None):
+        """
+        Runs the function from string parameters as given on the command line,
+        deserializing file inputs and serializing file outputs. The stream
+        of the description, if any, is called in place of the function.
+        :param fun: the undecorated function.
+        :param params: a dict mapping input and output ids to their string
+            values. File inputs and outputs are given as file names.
+        :type params: dict
+        :param metrics: the Metrics in which to record the phases of the run,
+            by default as configured by the environment.
+        :returns: a dict mapping output ids to their values, with file outputs
+            replaced by the names of the files written, or None if the
+            function has no outputs.
+        """
+        if metrics is None:
+            metrics = Metrics.fromEnvironment(fun.__name__)
+        status = 'error'
+        try:
+            result = self._run(fun, params, metrics)
+            status = 'success'
+            return result
+        finally:
+            metrics.emit(status)
+
+    def _run(self, fun, params, metrics):
+        cache = getResultCache() if self._cacheable(params) else None
+        if cache is not None:
+            with metrics.phase('cache') as info:
+                key = self._cacheKey(cache, fun, params)
+                outputFiles = dict((outputDesc['id'], self._outputFileName(outputDesc, params))
+                                   for outputDesc in self.description.outputs)
+                values = cache.get(key, outputFiles)
+                info['hit'] = values is not None
+            if values is not None:
+                values.update(outputFiles)
+                return values
+
+        kwargs = {}
+        for descInput in self.description.inputs:
+            inputId = descInput['id']
+            inputType = descInput['type']
+            if inputId in params:
+                if inputType == 'file' and 'deserialize' in descInput:
+                    with metrics.phase('deserialize', input=inputId, bytes=fileSize(params[inputId])) as info:
+                        kwargs[inputId] = readInput(params[inputId], descInput['deserialize'])
+                        info['shape'] = shapeOf(kwargs[inputId])
+                else:
+                    kwargs[inputId] = params[inputId]
+
+        with metrics.phase('validate'):
+            kwargs = self._prepareInputs(kwargs)
+        with metrics.phase('run'):
+            result = metrics.call(self.description.streamer or fun, kwargs)
+
+        if len(self.description.outputs) == 0:
+            return None
+        if len(self.description.outputs) == 1:
+            result = {self.description.outputs[0]['id']: result}
+        for outputDesc in self.description.outputs:
+            outputId = outputDesc['id']
+            outputType = outputDesc['type']
+            if outputId in result:
+                if outputType == 'new-file':
+                    fileName = self._outputFileName(outputDesc, params)
+                    if 'serialize' in outputDesc:
+                        with metrics.phase('serialize', output=outputId, shape=shapeOf(result[outputId])) as info:
+                            writeOutput(result[outputId], fileName, outputDesc['serialize'])
+                        info['bytes'] = fileSize(fileName)
+                    result[outputId] = fileName
+
+        if cache is not None and set(result) == set(outputFiles):
+            cache.put(key, outputFiles, {})
+        return result
+
+    def _outputFileName(self, outputDesc, params):
+        if outputDesc['id'] in params:
+            return params[outputDesc['id']]
+        return outputDesc.get('path', outputDesc['id'])
+
+    def _cacheable(self, params):
+        """
+        Whether a run may use the result cache: every output is a file and
+        every file input is given by file name.
+        """
+        return (len(self.description.outputs) > 0 and
+                all(outputDesc['type'] == 'new-file' for outputDesc in self.description.outputs) and
+                all(isinstance(params[descInput['id']], six.string_types)
+                    for descInput in self.description.inputs
+                    if descInput['type'] == 'file' and descInput['id'] in params))
+
+    def _cacheKey(self, cache, fun, params):
+        values = {}
+        inputFiles = {}
+        for descInput in self.description.inputs:
+            inputId = descInput['id']
+            if descInput['type'] == 'file':
+                if inputId in params:
+                    inputFiles[inputId] = params[inputId]
+            elif descInput.get('paths') and isinstance(params.get(inputId), six.string_types):
+                inputFiles[inputId] = expandPaths([params[inputId]])
+            elif inputId in params:
+                values[inputId] = self._validateInput(inputId, descInput, params[inputId])
+            else:
+                values[inputId] = descInput.get('default')
+        outputFormats = dict((outputDesc['id'], formatForName(self._outputFileName(outputDesc, params)))
+                             for outputDesc in self.description.outputs)
+        return cache.key(fun, values, inputFiles, outputFormats)
+
+    def _parseArgs(self, fun, args):
+        parser = argparse.ArgumentParser(
+            prog=fun.__name__, description=self.description.name + '\n' + self.description.description)
+        for descInput in self.description.inputs:
+            parser.add_argument('--' + descInput['id'],
+                help=descInput.get('name', descInput['id'] + '. ' + descInput['description']),
+                required=descInput.get('required', False),
+                default=descInput.get('default', None)
+            )
+        for descOutput in self.description.outputs:
+            parser.add_argument('--' + descOutput['id'],
+                help=descOutput.get('name', descOutput['id'] + '. ' + descOutput['description']),
+                required=False
+            )
+        return {k: v for k, v in six.iteritems(vars(parser.parse_args(args))) if v != None}
+
+    def _prepareInputs(self, kwargs):
+        for descInput in self.description.inputs:
+            id = descInput['id']
+            if id in kwargs:
+                kwargs[id] = self._validateInput(id, descInput, kwargs[id])
+            elif 'default' in descInput:
+                kwargs[id] = descInput['default']
+            elif descInput['required']:
+                raise Exception('Input "%s" is required.' % id)
+            else:
+                # If required=False but no default is specified, use None
+                kwargs[id] = None
+        return kwargs
+
     def _handleString(self, name, descInput, value):
-        if descInput['_strip']:
+        if descInput.get('strip'):
             value = value.strip()
-        if descInput['_lower']:
+        if descInput.get('lower'):
             value = value.lower()
-        if descInput['_upper']:
+        if descInput.get('upper'):
             value = value.upper()
 
         format = descInput.get('format')
@@ -0,0 +1,195 @@
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Environment variable turning on task metrics: "stderr" to write them to
+# standard error, or the name of a file to append them to, one JSON object
+# per task run.
+METRICS_ENV = 'PYSCIENCEDOCK_METRICS'
+
+# Environment variable naming a directory in which to save a cProfile dump
+# of the body of every task run.
+PROFILE_ENV = 'PYSCIENCEDOCK_PROFILE'
+
+# The information dicts of the phases being measured, innermost last.
+_activePhases = []
+
+
+def _cpuTime():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peakRss():
+    """
+    The peak resident set size of this process in bytes since it started,
+    or None where the resource module is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def fileSize(fileName):
+    try:
+        return os.path.getsize(fileName)
+    except (OSError, TypeError):
+        return None
+
+
+def shapeOf(value):
+    """
+    The shape of a table or array, or None for other values.
+    """
+    shape = getattr(value, 'shape', None)
+    return list(shape) if isinstance(shape, tuple) else None
+
+
+@contextlib.contextmanager
+def parsing():
+    """
+    A context measuring the parsing of an input read lazily, such as a
+    :py:class:`pysciencedock.io.CsvTable`, whose deserialize phase only
+    opens it. The time is added to the parse_wall and parse_cpu of the
+    phase being measured, usually the run or serialize phase.
+    """
+    if not _activePhases:
+        yield
+        return
+
+    info = _activePhases[-1]
+    wall = time.time()
+    cpu = _cpuTime()
+    try:
+        yield
+    finally:
+        info['parse_wall'] = info.get('parse_wall', 0) + time.time() - wall
+        info['parse_cpu'] = info.get('parse_cpu', 0) + _cpuTime() - cpu
+
+
+def parsedChunks(chunks):
+    """
+    Yields the chunks of an input read lazily, measuring the parsing of
+    each as :py:func:`parsing` does.
+    """
+    chunks = iter(chunks)
+    while True:
+        with parsing():
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+        yield chunk
+
+
+class Metrics(object):
+    """
+    Wall time and CPU time of the phases of a task run, such as
+    deserializing each input, running the task and serializing each output,
+    along with whatever sizes and shapes the caller records. Memory is
+    measured by the peak resident set size of the process, which covers its
+    whole life: each phase records it as process_peak_rss, and how much the
+    phase raised it as rss_growth. Lazily read inputs are parsed within
+    later phases, which record the time spent parsing them.
+    A disabled Metrics measures nothing, so the phases cost nothing extra.
+    """
+
+    def __init__(self, task, destination=None, profileDir=None):
+        self.task = task
+        self.destination = destination
+        self.profileDir = profileDir
+        self.enabled = bool(destination or profileDir)
+        self.phases = []
+        self.tracedPeak = None
+        self.start = time.time()
+        self.startCpu = _cpuTime()
+
+    @classmethod
+    def fromEnvironment(cls, task):
+        return cls(task, os.environ.get(METRICS_ENV), os.environ.get(PROFILE_ENV))
+
+    @contextlib.contextmanager
+    def phase(self, name, **info):
+        """
+        A context measuring one phase. It yields a dict of information about
+        the phase, to which the caller may add.
+        """
+        if not self.enabled:
+            yield info
+            return
+
+        info['phase'] = name
+        wall = time.time()
+        cpu = _cpuTime()
+        rss = peakRss()
+        _activePhases.append(info)
+        try:
+            yield info
+        finally:
+            _activePhases.pop()
+            info['wall'] = time.time() - wall
+            info['cpu'] = _cpuTime() - cpu
+            info['process_peak_rss'] = peakRss()
+            info['rss_growth'] = None if rss is None else info['process_peak_rss'] - rss
+            self.phases.append(info)
+
+    def call(self, fun, kwargs):
+        """
+        Calls fun with kwargs, under cProfile when profiling is on, and with
+        tracemalloc's peak traced memory recorded where it is available.
+        """
+        if not self.profileDir:
+            return fun(**kwargs)
+
+        import cProfile
+
+        try:
+            import tracemalloc
+        except ImportError:
+            tracemalloc = None
+        if tracemalloc is not None:
+            tracemalloc.start()
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fun, **kwargs)
+        finally:
+            if tracemalloc is not None:
+                self.tracedPeak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if not os.path.isdir(self.profileDir):
+                os.makedirs(self.profileDir)
+            profile.dump_stats(os.path.join(
+                self.profileDir, '%s-%d-%d.prof' % (self.task, os.getpid(), int(self.start * 1000))))
+
+    def record(self, status):
+        record = {
+            'task': self.task,
+            'status': status,
+            'start': self.start,
+            'wall': time.time() - self.start,
+            'cpu': _cpuTime() - self.startCpu,
+            'process_peak_rss': peakRss(),
+            'phases': self.phases
+        }
+        if self.tracedPeak is not None:
+            record['traced_peak'] = self.tracedPeak
+        return record
+
+    def emit(self, status):
+        """
+        Writes the metrics of the run, if enabled, as one line of JSON.
+        """
+        if not self.destination:
+            return
+        line = json.dumps(self.record(status), sort_keys=True) + '\n'
+        if self.destination == 'stderr':
+            sys.stderr.write(line)
+        else:
+            with open(self.destination, 'a') as f:
+                f.write(line)
@@ -1,7 +1,54 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import types
+import zipfile
+
+import numpy as np
 import pandas as pd
 import six
+from six.moves import cPickle as pickle
+
+from .instrument import parsedChunks, parsing
+
+# Bump when the parsing rules below change so stale cache entries are ignored.
+CACHE_VERSION = 'readCsv-2'
+
+# Environment variable naming a directory for binary sidecar caches of parsed tables.
+CACHE_DIR_ENV = 'PYSCIENCEDOCK_CACHE_DIR'
+
+# Environment variable giving the size bound of that cache in bytes.
+CACHE_SIZE_ENV = 'PYSCIENCEDOCK_CACHE_SIZE'
+
+DEFAULT_CACHE_BYTES = 1 << 30
+
+# Values parsed at a time when reading a table in chunks of columns.
+SPILL_CELLS = 1 << 22
+
 
-def readCsv(fileName):
+def fileDigest(fileName, blockSize=1 << 20):
+    """
+    Returns the SHA-1 hex digest of the contents of a file, read in blocks.
+    """
+    digest = hashlib.sha1()
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sniffIndexColumns(fileName):
+    """
+    Guess which leading columns form the index from the header and first row.
+    A column is part of the index if it is unnamed, its name starts with an
+    underscore, or its first value is a string. Only the start of the file is
+    parsed, by pandas, so quoted values spanning lines and compressed files
+    are read as in the full parse.
+    """
     data = pd.read_csv(fileName, nrows=1)
     indexCol = []
     for col in range(len(data.columns)):
@@ -10,8 +57,10 @@ def readCsv(fileName):
             indexCol.append(col)
         else:
             break
-    data = pd.read_csv(fileName, index_col=indexCol)
+    return indexCol
 
+
+def _transformIndexNames(data):
     def transformName(name):
         if name is None or name.startswith('_'):
             return name
@@ -19,3 +68,657 @@ def readCsv(fileName):
 
     data.index.names = [transformName(name) for name in data.index.names]
     return data
+
+
+def _parseCsv(fileName):
+    # Compression is inferred by pandas from the extension of the file name.
+    return _transformIndexNames(pd.read_csv(fileName, index_col=_sniffIndexColumns(fileName)))
+
+
+def _writeCache(data, cachePath):
+    cacheDir = os.path.dirname(cachePath)
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    fd, tmpPath = tempfile.mkstemp(dir=cacheDir, suffix='.tmp')
+    os.close(fd)
+    try:
+        data.to_pickle(tmpPath)
+        os.rename(tmpPath, cachePath)
+    except Exception:
+        os.remove(tmpPath)
+        raise
+
+
+def _evictCache(cacheDir, maxBytes):
+    """
+    Removes the least recently used tables from the cache until the rest
+    fit in maxBytes.
+    """
+    entries = []
+    for name in os.listdir(cacheDir):
+        if not name.endswith('.pkl'):
+            continue
+        path = os.path.join(cacheDir, name)
+        try:
+            entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        except OSError:
+            continue
+    entries.sort()
+    total = sum(size for mtime, size, path in entries)
+    for mtime, size, path in entries:
+        if total <= maxBytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def readCsv(fileName, cacheDir=None):
+    """
+    Reads a CSV data table, treating leading unnamed, underscore-prefixed or
+    string-valued columns as the index. Index level names are prefixed with
+    an underscore.
+
+    :param fileName: the CSV file to read.
+    :param cacheDir: a directory in which to keep a binary copy of the parsed
+        table, keyed by a hash of the file contents. Repeated reads of the same
+        content load that copy instead of parsing the CSV again. Defaults to
+        the PYSCIENCEDOCK_CACHE_DIR environment variable; no cache is used if
+        neither is set. The copies are pickles, which can run code when
+        loaded, so the directory must be writable only by trusted users. The
+        least recently used copies are removed once the directory grows
+        beyond PYSCIENCEDOCK_CACHE_SIZE bytes, 1 GiB by default.
+    """
+    if cacheDir is None:
+        cacheDir = os.environ.get(CACHE_DIR_ENV)
+
+    if not cacheDir:
+        return _parseCsv(fileName)
+
+    key = hashlib.sha1((CACHE_VERSION + fileDigest(fileName)).encode('utf8')).hexdigest()
+    cachePath = os.path.join(cacheDir, key + '.pkl')
+    if os.path.exists(cachePath):
+        try:
+            data = pd.read_pickle(cachePath)
+            os.utime(cachePath, None)
+            return data
+        except (IOError, OSError):
+            # Evicted by another process since.
+            pass
+
+    data = _parseCsv(fileName)
+    _writeCache(data, cachePath)
+    _evictCache(cacheDir, int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_BYTES)))
+    return data
+
+
+def readCsvChunks(fileName, chunksize, indexCol=None):
+    """
+    Reads a CSV data table in chunks of rows, with the index determined as
+    in :py:func:`readCsv` unless indexCol is given.
+
+    :param fileName: the CSV file to read.
+    :param chunksize: the number of rows in each chunk.
+    :param indexCol: the positions of the index columns, to use instead of
+        guessing them. Index level names are left as they are in the file.
+    """
+    if indexCol is None:
+        for chunk in pd.read_csv(fileName, index_col=_sniffIndexColumns(fileName), chunksize=chunksize):
+            yield _transformIndexNames(chunk)
+    else:
+        for chunk in pd.read_csv(fileName, index_col=indexCol, chunksize=chunksize):
+            yield chunk
+
+
+def readCsvHeader(fileName, indexCol=None):
+    """
+    Returns the positions of the index columns of a CSV data table, guessed
+    as in :py:func:`readCsv` unless indexCol is given, and its value column
+    names, reading only the first lines of the file.
+    """
+    if indexCol is None:
+        indexCol = _sniffIndexColumns(fileName)
+    return indexCol, pd.read_csv(fileName, index_col=indexCol, nrows=0).columns
+
+
+def readCsvColumns(fileName, chunksize, indexCol=None):
+    """
+    Reads a CSV data table in chunks of columns, each with the full index,
+    with the index determined as in :py:func:`readCsvChunks`. The file is
+    parsed once, in chunks of rows, with each chunk's columns split into the
+    column chunks and spilled to a temporary file, so memory use is bounded
+    by the larger of a column chunk and :py:data:`SPILL_CELLS` values.
+
+    :param fileName: the CSV file to read.
+    :param chunksize: the number of value columns in each chunk.
+    :param indexCol: the positions of the index columns, to use instead of
+        guessing them.
+    """
+    numColumns = len(readCsvHeader(fileName, indexCol)[1])
+    starts = list(range(0, numColumns, chunksize))
+    rows = max(1, SPILL_CELLS // max(numColumns, 1))
+    # The pieces of every column chunk go to one spill file, however many
+    # chunks there are, with the offsets of each chunk's pieces kept.
+    offsets = dict((start, []) for start in starts)
+    with tempfile.TemporaryFile() as spill:
+        for chunk in readCsvChunks(fileName, rows, indexCol):
+            for start in starts:
+                offsets[start].append(spill.tell())
+                pickle.dump(chunk.iloc[:, start:start + chunksize], spill, pickle.HIGHEST_PROTOCOL)
+        for start in starts:
+            pieces = []
+            for offset in offsets[start]:
+                spill.seek(offset)
+                pieces.append(pickle.load(spill))
+            if pieces:
+                yield pd.concat(pieces)
+
+
+def expandPaths(specs):
+    """
+    Expands a list of input file specifications into file names. Each is a
+    file name, a glob pattern, whose matches are taken in sorted order, or
+    "@" followed by the name of a manifest file listing one specification per
+    line. Blank lines and lines starting with "#" in a manifest are skipped,
+    and relative names in it are relative to the manifest.
+    """
+    fileNames = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        if spec.startswith('@'):
+            manifest = spec[1:]
+            with open(manifest) as f:
+                lines = [line.strip() for line in f]
+            base = os.path.dirname(manifest)
+            fileNames.extend(expandPaths([
+                '@' + os.path.join(base, line[1:]) if line.startswith('@') else os.path.join(base, line)
+                for line in lines if line and not line.startswith('#')]))
+        elif glob.has_magic(spec):
+            matches = sorted(glob.glob(spec))
+            if not matches:
+                raise Exception('No files match %s' % spec)
+            fileNames.extend(matches)
+        else:
+            fileNames.append(spec)
+    return fileNames
+
+
+class CsvTable(object):
+    """
+    A CSV data table that is only read when a task asks for it, so that
+    tasks able to work on chunks of rows or columns do not need to load it
+    whole.
+    """
+
+    def __init__(self, fileName, indexCol=None):
+        self.fileName = fileName
+        self.indexCol = indexCol
+
+    def read(self):
+        with parsing():
+            if self.indexCol is None:
+                return readCsv(self.fileName)
+            return pd.read_csv(self.fileName, index_col=self.indexCol)
+
+    def chunks(self, chunksize):
+        return parsedChunks(readCsvChunks(self.fileName, chunksize, self.indexCol))
+
+    def columnChunks(self, chunksize):
+        return parsedChunks(readCsvColumns(self.fileName, chunksize, self.indexCol))
+
+    def columns(self):
+        with parsing():
+            return readCsvHeader(self.fileName, self.indexCol)[1]
+
+
+def openCsv(fileName):
+    """
+    Deserializer returning a :py:class:`CsvTable` for tasks that accept data
+    in chunks.
+    """
+    return CsvTable(fileName)
+
+
+def loadTable(data):
+    """
+    Returns a DataFrame for a DataFrame, a :py:class:`CsvTable` or a
+    generator of DataFrame chunks.
+    """
+    if isinstance(data, CsvTable):
+        return data.read()
+    if isinstance(data, types.GeneratorType):
+        return pd.concat(list(data))
+    return data
+
+
+def iterChunks(data, chunksize):
+    """
+    Yields a DataFrame or :py:class:`CsvTable` in chunks of chunksize rows,
+    or whole if chunksize is 0 or the data is already in memory. A generator
+    of chunks is passed through as it is.
+    """
+    if isinstance(data, CsvTable) and chunksize:
+        for chunk in data.chunks(chunksize):
+            yield chunk
+    elif isinstance(data, types.GeneratorType):
+        for chunk in data:
+            yield chunk
+    else:
+        yield loadTable(data)
+
+
+def writeCsv(data, fileName):
+    """
+    Serializer writing a DataFrame, or an iterable of DataFrame chunks, to a
+    CSV file. Chunks are written as they are produced.
+    """
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        data.to_csv(fileName)
+        return
+
+    with open(fileName, 'w') as f:
+        header = True
+        for chunk in data:
+            chunk.to_csv(f, header=header)
+            header = False
+
+
+JSON_ORIENTS = ['columns', 'records', 'lines', 'split']
+
+
+def _openOutput(fileName, compression):
+    if compression == 'gzip':
+        return gzip.open(fileName, 'wb')
+    return open(fileName, 'wb')
+
+
+def _encode(text):
+    return text.encode('utf8') if isinstance(text, six.text_type) else text
+
+
+def _jsonOpening(orient, columns):
+    if orient == 'records':
+        return b'['
+    if orient == 'split':
+        return _encode('{"columns":%s,"data":[' % json.dumps(columns))
+    return b''
+
+
+def writeJson(data, fileName, orient='columns', compression=None):
+    """
+    Writes a DataFrame, or an iterable of DataFrame chunks, to a JSON file.
+    The records, lines and split orientations write each chunk as it is
+    produced, with the index levels as leading fields of every row; the
+    columns orientation is written as DataFrame.to_json does, which needs
+    the whole table at once.
+
+    :param data: a DataFrame or an iterable of DataFrame chunks.
+    :param fileName: the JSON file to write.
+    :param orient: 'columns' for an object of columns, each an object keyed
+        by the index; 'records' for an array of row objects; 'lines' for one
+        row object per line; 'split' for an object with the column names and
+        an array of row arrays.
+    :param compression: 'gzip' to compress the file, or None.
+    """
+    if orient not in JSON_ORIENTS:
+        raise Exception('Unknown JSON orientation: %s' % orient)
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        data = [data]
+
+    with _openOutput(fileName, compression) as f:
+        if orient == 'columns':
+            f.write(_encode(pd.concat(list(data)).to_json()))
+            return
+
+        columns = None
+        written = False
+        for chunk in data:
+            chunk = chunk.reset_index()
+            if columns is None:
+                columns = [str(col) for col in chunk.columns]
+                f.write(_jsonOpening(orient, columns))
+            if orient == 'lines':
+                rows = chunk.to_json(orient='records', lines=True)
+            else:
+                # Strip the enclosing brackets so chunks join into one array.
+                rows = chunk.to_json(orient='records' if orient == 'records' else 'values')[1:-1]
+            if rows:
+                if written:
+                    f.write(b'\n' if orient == 'lines' else b',')
+                f.write(_encode(rows))
+                written = True
+
+        if columns is None:
+            f.write(_jsonOpening(orient, []))
+        if orient == 'records':
+            f.write(b']')
+        elif orient == 'split':
+            f.write(b']}')
+        elif written:
+            f.write(b'\n')
+
+
+# Table file formats. Input files are recognized by their leading bytes,
+# falling back to their extension; output files take the format named by
+# their extension. Parquet and Feather need pyarrow.
+TABLE_FORMATS = ['csv', 'parquet', 'feather', 'npz']
+
+# Value orders of NPZ tables: row-major or column-major.
+NPZ_ORDERS = ['C', 'F']
+
+_FORMAT_MAGIC = [
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'feather'),
+    (b'FEA1', 'feather'),
+    (b'PK\x03\x04', 'npz')
+]
+
+_FORMAT_EXTENSIONS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'feather',
+    '.ipc': 'feather',
+    '.npz': 'npz'
+}
+
+
+def formatForName(fileName):
+    """
+    The table format named by the extension of a file, or 'csv'.
+    """
+    return _FORMAT_EXTENSIONS.get(os.path.splitext(fileName)[1].lower(), 'csv')
+
+
+def sniffFormat(fileName):
+    """
+    The table format of a file from its leading bytes, or from its extension
+    if they are not those of a binary format.
+    """
+    try:
+        with open(fileName, 'rb') as f:
+            prefix = f.read(8)
+    except (IOError, OSError, TypeError):
+        return 'csv'
+    for magic, fmt in _FORMAT_MAGIC:
+        if prefix.startswith(magic):
+            # Other zip files, which NPZ tables are, go to the deserializer.
+            return fmt if fmt != 'npz' or _isNpzTable(fileName) else 'csv'
+    return formatForName(fileName)
+
+
+# The arrays every NPZ table holds, as written by writeTable.
+_NPZ_MEMBERS = ['values.npy', 'columns.npy', 'index_names.npy']
+
+
+def _isNpzTable(fileName):
+    try:
+        with zipfile.ZipFile(fileName) as archive:
+            names = set(archive.namelist())
+    except (IOError, OSError, zipfile.BadZipfile):
+        return False
+    return all(name in names for name in _NPZ_MEMBERS)
+
+
+def _importPyarrow(fmt):
+    try:
+        import pyarrow
+    except ImportError:
+        raise Exception('The %s format requires pyarrow' % fmt)
+    return pyarrow
+
+
+def _tableFrame(data):
+    """
+    A DataFrame with string column names, which Arrow requires, for a
+    DataFrame or Series.
+    """
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if not all(isinstance(col, six.string_types) for col in data.columns):
+        data = data.copy(deep=False)
+        data.columns = [str(col) for col in data.columns]
+    return data
+
+
+def _sniffFrameIndex(data):
+    """
+    Sets the index of a table read without one, such as a Parquet file
+    written by another tool, from its leading columns by the rule of
+    :py:func:`readCsv`.
+    """
+    if data.index.names != [None] or not isinstance(data.index, pd.RangeIndex):
+        return data
+    indexCols = []
+    for col in data.columns:
+        if isinstance(col, six.string_types) and col.startswith('_') or data[col].dtype == object:
+            indexCols.append(col)
+        else:
+            break
+    if indexCols and len(indexCols) < len(data.columns):
+        data = data.set_index(indexCols)
+    return data
+
+
+def _labelArray(labels):
+    values = np.asarray(labels)
+    if values.dtype == object:
+        values = values.astype(six.text_type)
+    return values
+
+
+def _writeNpz(data, fileName, order='C'):
+    data = _tableFrame(data)
+    values = data.values
+    if values.dtype == object:
+        raise Exception('Only numeric tables can be written in the npz format')
+    arrays = {
+        'values': np.asarray(values, order=order),
+        'columns': _labelArray(data.columns),
+        'index_names': np.array([name or u'' for name in data.index.names], dtype=six.text_type)
+    }
+    for level in range(data.index.nlevels):
+        arrays['index_%d' % level] = _labelArray(data.index.get_level_values(level))
+    # Uncompressed, so that the values can be memory-mapped when read. An
+    # open file keeps numpy from adding an extension to the name.
+    with open(fileName, 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def _mapNpzArray(fileName, name):
+    """
+    Memory-maps an array stored uncompressed in an NPZ file, or returns None
+    if it is compressed. The map is copy-on-write: pages are read from the
+    file as they are used, shared with any other process mapping the same
+    file, and copied only if written to.
+    """
+    with zipfile.ZipFile(fileName) as archive:
+        info = archive.getinfo(name + '.npy')
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(fileName, 'rb') as f:
+        # The sizes of the name and extra field in the local header may
+        # differ from those in the central directory.
+        f.seek(info.header_offset + 26)
+        nameLength, extraLength = struct.unpack('<HH', f.read(4))
+        f.seek(info.header_offset + 30 + nameLength + extraLength)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(fileName, dtype=dtype, mode='c', offset=offset, shape=shape,
+                     order='F' if fortranOrder else 'C')
+
+
+def _readNpz(fileName, mmap=True):
+    values = _mapNpzArray(fileName, 'values') if mmap else None
+    with np.load(fileName) as npz:
+        if values is None:
+            values = npz['values']
+        names = [name or None for name in npz['index_names']]
+        levels = [npz['index_%d' % level] for level in range(len(names))]
+        if len(levels) == 1:
+            index = pd.Index(levels[0], name=names[0])
+        else:
+            index = pd.MultiIndex.from_arrays(levels, names=names)
+        return pd.DataFrame(values, index=index, columns=npz['columns'], copy=False)
+
+
+def readTable(fileName, fmt=None, mmap=True):
+    """
+    Reads a data table in any of :py:data:`TABLE_FORMATS`. The index of a
+    binary table is the one it was written with; tables without one are
+    indexed as by :py:func:`readCsv`. Index level names are prefixed with an
+    underscore.
+
+    :param fileName: the file to read.
+    :param fmt: the format of the file, by default found by
+        :py:func:`sniffFormat`.
+    :param mmap: whether to memory-map the values of an uncompressed NPZ
+        table rather than read them. The DataFrame then wraps the mapped
+        values without copying them, in the order they were written with.
+    """
+    fmt = fmt or sniffFormat(fileName)
+    if fmt == 'csv':
+        return readCsv(fileName)
+    if fmt == 'npz':
+        data = _readNpz(fileName, mmap)
+    else:
+        pyarrow = _importPyarrow(fmt)
+        if fmt == 'parquet':
+            import pyarrow.parquet
+            table = pyarrow.parquet.read_table(fileName)
+        else:
+            with open(fileName, 'rb') as f:
+                isFeatherV1 = f.read(4) == b'FEA1'
+            if isFeatherV1:
+                import pyarrow.feather
+                return _transformIndexNames(_sniffFrameIndex(pyarrow.feather.read_feather(fileName)))
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(fileName)).read_all()
+        data = _sniffFrameIndex(table.to_pandas())
+    return _transformIndexNames(data)
+
+
+def _frames(data):
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        yield _tableFrame(data)
+        return
+    for chunk in data:
+        yield _tableFrame(chunk)
+
+
+def writeTable(data, fileName, fmt=None, order='C'):
+    """
+    Writes a DataFrame, Series or iterable of DataFrame chunks as a data
+    table in any of :py:data:`TABLE_FORMATS`, keeping its index. Parquet
+    tables are written a chunk at a time, one row group per chunk; the other
+    binary formats collect the chunks first.
+
+    :param fmt: the format to write, by default named by the extension of
+        the file by :py:func:`formatForName`.
+    :param order: for the npz format, 'C' to store the values row by row or
+        'F' to store them column by column. Tasks treating columns as
+        observations, such as PCA, transpose a memory-mapped column-major
+        table without copying it.
+    """
+    fmt = fmt or formatForName(fileName)
+    if fmt not in TABLE_FORMATS:
+        raise Exception('Unknown table format: %s' % fmt)
+    if fmt == 'csv':
+        writeCsv(data, fileName)
+        return
+    if fmt == 'npz':
+        _writeNpz(pd.concat(list(_frames(data))), fileName, order)
+        return
+
+    pyarrow = _importPyarrow(fmt)
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        writer = None
+        try:
+            for chunk in _frames(data):
+                table = pyarrow.Table.from_pandas(chunk, preserve_index=True)
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(fileName, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    # Feather version 2 is the Arrow IPC file format, which keeps the index
+    # in the pandas metadata of the schema.
+    table = pyarrow.Table.from_pandas(pd.concat(list(_frames(data))), preserve_index=True)
+    with pyarrow.OSFile(fileName, 'wb') as sink:
+        writer = pyarrow.RecordBatchFileWriter(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+
+
+def isTable(data):
+    """
+    Whether a value is a table that :py:func:`writeTable` can write: a
+    DataFrame, a Series or a generator of DataFrame chunks.
+    """
+    return isinstance(data, (pd.DataFrame, pd.Series, types.GeneratorType))
+
+
+def readInput(fileName, deserialize):
+    """
+    Deserializes a file input of a task. A table in a binary format given to
+    a table input, one deserialized by :py:func:`readCsv` or as a
+    :py:class:`CsvTable`, is read with :py:func:`readTable`, which gives a
+    DataFrame that every table task accepts, indexed by the columns the
+    CsvTable names. Other files, and files given to other inputs, are passed
+    to the deserializer of the input.
+    """
+    fmt = sniffFormat(fileName)
+    if fmt == 'csv':
+        return deserialize(fileName)
+    if deserialize is readCsv:
+        return readTable(fileName, fmt)
+    # Table deserializers only open the file, so this reads nothing yet.
+    data = deserialize(fileName)
+    if isinstance(data, CsvTable):
+        return _setIndexColumns(readTable(fileName, fmt), data.indexCol)
+    return data
+
+
+def _setIndexColumns(data, indexCol):
+    """
+    Indexes a table read from a binary file by the columns that a CSV table
+    with the given index columns would use, counting the index the table was
+    written with as its leading columns.
+    """
+    if indexCol is None:
+        return data
+    positions = [indexCol] if isinstance(indexCol, int) else list(indexCol)
+    hasIndex = data.index.names != [None]
+    if hasIndex and positions == list(range(data.index.nlevels)):
+        return data
+    flat = data.reset_index() if hasIndex else data
+    return flat.set_index([flat.columns[position] for position in positions])
+
+
+def writeOutput(data, fileName, serialize):
+    """
+    Serializes a file output of a task. A table output whose file name has
+    the extension of a binary format is written in that format with
+    :py:func:`writeTable`; anything else is passed to the serializer of the
+    output, as are tables with a write method of their own, which know the
+    format they were asked for.
+    """
+    fmt = formatForName(fileName)
+    # The method is looked up on the class, where no column can shadow it.
+    if fmt != 'csv' and isTable(data) and not hasattr(type(data), 'write'):
+        writeTable(data, fileName, fmt)
+    else:
+        serialize(data, fileName)
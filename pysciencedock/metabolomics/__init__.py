@@ -1 +1,2 @@
+from harmonize import harmonize
 from normalize import normalize
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+import six
+
+from ..describe import describe, Description
+from ..io import expandPaths, readTable, sniffFormat, writeCsv
+
+@describe(
+    Description('Harmonize', 'Matches metabolomics datasets from several platforms by metabolite ID, imputes missing values and normalizes each platform.', dockerImage='kitware/pysciencedock')
+        .input('datasets', 'The dataset of each platform: a glob pattern, or @ followed by a file listing one per line. Each has samples in rows, identified by the first column', type='string', paths=True)
+        .input('metadata', 'The metadata file of each platform, given as the datasets are and in the same order, mapping metabolite IDs to dataset columns', type='string', paths=True)
+        .input('platforms', 'The name of each platform, separated by commas; by default the dataset file names without extension', type='string', default='', required=False)
+        .input('id_column', 'The metadata column of metabolite IDs', type='string', default='HMDB_ID', required=False)
+        .input('name_column', 'The metadata column of dataset column names', type='string', default='SAS_NAME', required=False)
+        .input('id_prefix', 'Only metabolite IDs with this prefix are matched', type='string', default='HMDB', required=False)
+        .input('normalization', 'Divide each column of each platform by its median after imputation', type='string-enumeration', values=['none', 'median'], default='median', required=False)
+        .output('harmonized', 'The metabolites found on every platform, in columns named by ID, with rows indexed by sample and platform', type='new-file', serialize=writeCsv)
+)
+def harmonize(datasets, metadata, platforms, id_column, name_column, id_prefix, normalization):
+    datasets = expandPaths([datasets] if isinstance(datasets, six.string_types) else datasets)
+    metadata = expandPaths([metadata] if isinstance(metadata, six.string_types) else metadata)
+    if isinstance(platforms, six.string_types):
+        platforms = [name.strip() for name in platforms.split(',') if name.strip()]
+    if not platforms:
+        platforms = [os.path.splitext(os.path.basename(fileName))[0] for fileName in datasets]
+    if not len(datasets) == len(metadata) == len(platforms):
+        raise Exception('Harmonize requires one metadata file and platform name for each dataset')
+
+    mappings = [readIdMapping(fileName, id_column, name_column, id_prefix) for fileName in metadata]
+    shared = mappings[0].index
+    for mapping in mappings[1:]:
+        shared = shared.intersection(mapping.index)
+    shared = shared.sort_values()
+
+    tables = []
+    for fileName, mapping, platform in zip(datasets, mappings, platforms):
+        table = _readColumns(fileName, list(mapping[shared]))
+        table.columns = shared
+        table = imputeHalfMinimum(table)
+        if normalization == 'median':
+            table = table / table.median()
+        table.index = pd.MultiIndex.from_arrays(
+            [table.index, [platform] * len(table)], names=['_sample', '_platform'])
+        tables.append(table)
+    return pd.concat(tables)
+
+
+def readIdMapping(fileName, idColumn='HMDB_ID', nameColumn='SAS_NAME', idPrefix='HMDB'):
+    """
+    Reads a platform's metadata into a Series mapping metabolite IDs with the
+    given prefix to the names of their dataset columns. Names are upper case,
+    with an "X" before a leading underscore, as in the SAS exports of the
+    datasets. An ID listed more than once maps to its last name.
+    """
+    fmt = sniffFormat(fileName)
+    if fmt == 'csv':
+        meta = pd.read_csv(fileName, usecols=[idColumn, nameColumn], dtype=str)
+    else:
+        # Columns stored as the index are read back as index levels, whose
+        # names gain a leading underscore.
+        table = readTable(fileName, fmt)
+        if table.index.names != [None]:
+            table = table.reset_index()
+        meta = pd.DataFrame(dict(
+            (column, table[column if column in table.columns else '_' + column]) for column in [idColumn, nameColumn]))
+    meta = meta[meta[idColumn].str.startswith(idPrefix, na=False)]
+    names = meta[nameColumn].str.upper()
+    names = names.where(~names.str.startswith('_'), 'X' + names)
+    mapping = pd.Series(names.values, index=meta[idColumn].values)
+    return mapping[~mapping.index.duplicated(keep='last')]
+
+
+def _readColumns(fileName, columns):
+    """
+    Reads the given columns of a dataset, indexed by its first column, without
+    parsing the others. A dataset in a binary format is indexed as it was
+    written.
+    """
+    fmt = sniffFormat(fileName)
+    table = readTable(fileName, fmt) if fmt != 'csv' else None
+    header = pd.read_csv(fileName, nrows=0).columns if table is None else table.columns
+    missing = [column for column in columns if column not in header]
+    if missing:
+        raise Exception('%s has no columns named %s' % (fileName, ', '.join(missing)))
+    if table is None:
+        positions = sorted(set(header.get_loc(column) for column in columns))
+        table = pd.read_csv(fileName, usecols=[0] + positions, index_col=0)
+    return table[columns]
+
+
+def imputeHalfMinimum(table):
+    """
+    Replaces the missing values of each column with half its smallest
+    positive value.
+    """
+    return table.fillna(table.where(table > 0).min() / 2)
@@ -1,39 +1,236 @@
 import numpy as np
 import pandas as pd
+import warnings
 
 from ..describe import describe, Description
+from ..io import CsvTable, loadTable, writeCsv
+from ..sketch import RowReservoir
+
+# Rows sampled to estimate column medians when normalizing in chunks, fewer
+# for tables wide enough that they would hold more than SAMPLE_CELLS values.
+MEDIAN_SAMPLE_ROWS = 1024
+
+# Rows reduced at a time when computing column statistics.
+BLOCK_ROWS = 4096
+
+def _streamNormalize(data, normalization, scaling, transformation, chunksize, dtype):
+    """
+    The output of normalize for serializing: a generator of normalized
+    chunks when reading a file in chunks, so that they are written as they
+    are produced.
+    """
+    if isinstance(data, CsvTable) and chunksize:
+        return _normalizeChunks(data, normalization, scaling, transformation, chunksize, dtype)
+    return _normalizeTable(data, normalization, scaling, transformation, dtype)
+
 
 @describe(
     Description('Normalize', 'Performs normalization of a metabolomics data table.', dockerImage='kitware/pysciencedock')
-        .input('data', 'The study data table', type='file', deserialize=lambda fileName: pd.read_csv(fileName, index_col=(0, 1)))
+        .input('data', 'The study data table', type='file', deserialize=lambda fileName: CsvTable(fileName, indexCol=[0, 1]))
         .input('normalization', 'Sample normalization', type='string-enumeration', values=['none', 'sum', 'median'], required=False, default='none')
         .input('transformation', 'Transformation', type='string-enumeration', values=['none', 'log', 'square root', 'cube root'], required=False, default='none')
         .input('scaling', 'Data scaling', type='string-enumeration', values=['none', 'mean', 'auto', 'pareto', 'range'], required=False, default='none')
-        .output('output', 'The normalized output', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .input('chunksize', 'Rows to process at a time, or 0 to load the whole table. Median normalization is approximate when streaming more rows than %d.' % MEDIAN_SAMPLE_ROWS, type='integer', min=0, default=0, required=False)
+        .input('dtype', 'Floating point precision of the output', type='string-enumeration', values=['float64', 'float32'], required=False, default='float64')
+        .output('output', 'The normalized output', type='new-file', serialize=writeCsv)
+        .stream(_streamNormalize)
 )
-def normalize(data, normalization, scaling, transformation):
-    output = data
+def normalize(data, normalization, scaling, transformation, chunksize, dtype):
+    if isinstance(data, CsvTable) and chunksize:
+        return pd.concat(list(_normalizeChunks(data, normalization, scaling, transformation, chunksize, dtype)))
+    return _normalizeTable(data, normalization, scaling, transformation, dtype)
 
-    if normalization == 'sum':
-        output = output / output.sum()
-    elif normalization == 'median':
-        output = output / output.median()
 
+def _normalizeTable(data, normalization, scaling, transformation, dtype):
+    data = loadTable(data)
+
+    # The only full-size allocation: every later stage works in place.
+    values = np.array(data.values, dtype=dtype, order='C')
+
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        if normalization == 'sum':
+            np.divide(values, _columnSums(values)[1], out=values)
+        elif normalization == 'median':
+            np.divide(values, np.nanmedian(values, axis=0), out=values)
+
+        _transformInPlace(values, transformation)
+
+        if scaling in ('mean', 'auto', 'pareto', 'range'):
+            count, total = _columnSums(values)
+            np.subtract(values, total / count, out=values)
+
+        if scaling in ('auto', 'pareto'):
+            count, total, squares = _columnSums(values, squares=True)
+            std = np.sqrt(squares / (count - 1))
+            np.divide(values, std if scaling == 'auto' else np.sqrt(std), out=values)
+        elif scaling == 'range':
+            np.divide(values, np.nanmax(values, axis=0) - np.nanmin(values, axis=0), out=values)
+
+    return pd.DataFrame(values, index=data.index, columns=data.columns, copy=False)
+
+
+def _columnSums(values, squares=False):
+    """
+    Returns the count and sum of the non-missing values of each column, and
+    the sum of their squares if squares is True, accumulated in float64 over
+    blocks of rows so that temporaries stay small.
+    """
+    count = np.zeros(values.shape[1])
+    total = np.zeros(values.shape[1])
+    sumsq = np.zeros(values.shape[1])
+    for start in range(0, len(values), BLOCK_ROWS):
+        block = values[start:start + BLOCK_ROWS]
+        count += len(block) - np.isnan(block).sum(axis=0)
+        total += np.nansum(block, axis=0, dtype=np.float64)
+        if squares:
+            sumsq += np.nansum(np.square(block), axis=0, dtype=np.float64)
+    if squares:
+        return count, total, sumsq
+    return count, total
+
+
+def _transformInPlace(values, transformation):
     if transformation == 'log':
-        output = np.log10(output)
+        np.log10(values, out=values)
     elif transformation == 'square root':
-        output = np.sqrt(output)
+        np.sqrt(values, out=values)
     elif transformation == 'cube root':
-        output = np.power(output, 1.0/3.0)
+        np.power(values, 1.0/3.0, out=values)
+    return values
+
+
+class _ColumnMoments(object):
+    """
+    Count, sum, sum of squares, minimum and maximum of each column, skipping
+    missing values, accumulated over chunks of rows.
+    """
+
+    def __init__(self):
+        self.count = None
+
+    def update(self, values):
+        if self.count is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                shift = np.nanmean(values, axis=0)
+            self.shift = np.where(np.isfinite(shift), shift, 0)
+            self.count = np.zeros(values.shape[1])
+            self.sum = np.zeros(values.shape[1])
+            self.sumsq = np.zeros(values.shape[1])
+            self.min = np.full(values.shape[1], np.inf)
+            self.max = np.full(values.shape[1], -np.inf)
+
+        shifted = values - self.shift
+        missing = np.isnan(shifted)
+        shifted[missing] = 0
+        self.count += (~missing).sum(axis=0)
+        self.sum += shifted.sum(axis=0)
+        self.sumsq += (shifted * shifted).sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            self.min = np.fmin(self.min, np.nanmin(np.where(missing, np.inf, values), axis=0))
+            self.max = np.fmax(self.max, np.nanmax(np.where(missing, -np.inf, values), axis=0))
+
+    def mean(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sum / self.count + self.shift
+
+    def std(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (self.sumsq - self.sum * self.sum / self.count) / (self.count - 1)
+            return np.sqrt(np.maximum(variance, 0))
+
+    def range(self):
+        with np.errstate(invalid='ignore'):
+            return np.where(self.count > 0, self.max - self.min, np.nan)
+
+
+def _linearize(divisor, transformation):
+    """
+    Returns (a, b) such that transform(x / divisor) == a * transform(x) + b
+    for every column, or None if that does not hold for some column.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if transformation == 'none' and np.all((divisor != 0) | np.isnan(divisor)):
+            return 1.0 / divisor, 0
+        if not np.all((divisor > 0) | np.isnan(divisor)):
+            return None
+        if transformation == 'log':
+            return 1.0, -np.log10(divisor)
+        elif transformation == 'square root':
+            return 1.0 / np.sqrt(divisor), 0
+        elif transformation == 'cube root':
+            return 1.0 / np.power(divisor, 1.0/3.0), 0
+
+
+def _normalizeChunks(data, normalization, scaling, transformation, chunksize, dtype):
+    """
+    Normalizes a table in two passes over chunks of rows. The first pass
+    collects column statistics of the raw and transformed values, from which
+    the statistics of the normalized values are derived; the second pass
+    normalizes and yields each chunk. A column divisor that rules out that
+    derivation costs one more pass.
+    """
+    needScaling = scaling in ('mean', 'auto', 'pareto', 'range')
+    total = np.zeros(0)
+    reservoir = RowReservoir(MEDIAN_SAMPLE_ROWS)
+    moments = _ColumnMoments()
+    columns = None
+
+    for chunk in data.chunks(chunksize):
+        values = chunk.values.astype(float)
+        if columns is None:
+            columns = chunk.columns
+            total = np.zeros(len(columns))
+        if normalization == 'sum':
+            total += np.nansum(values, axis=0)
+        elif normalization == 'median':
+            reservoir.update(values)
+        if needScaling:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                moments.update(_transformInPlace(values, transformation))
+
+    divisor = None
+    if normalization == 'sum':
+        divisor = total
+    elif normalization == 'median' and reservoir.filled:
+        divisor = reservoir.median()
+
+    center = 0
+    scale = 1
+    if needScaling and moments.count is not None:
+        mean, std, spread = moments.mean(), moments.std(), moments.range()
+        if divisor is not None:
+            linear = _linearize(divisor, transformation)
+            if linear is None:
+                moments = _ColumnMoments()
+                for chunk in data.chunks(chunksize):
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        moments.update(_transformInPlace(chunk.values.astype(float) / divisor, transformation))
+                mean, std, spread = moments.mean(), moments.std(), moments.range()
+            else:
+                a, b = linear
+                mean, std, spread = a * mean + b, np.abs(a) * std, np.abs(a) * spread
+
+        center = mean
+        if scaling == 'auto':
+            scale = std
+        elif scaling == 'pareto':
+            scale = np.sqrt(std)
+        elif scaling == 'range':
+            scale = spread
 
-    if scaling in ('mean', 'auto', 'pareto', 'range'):
-        output = output - output.mean()
+    return _applyChunks(data, chunksize, divisor, transformation, center, scale, dtype)
 
-    if scaling == 'auto':
-        output = output / output.std()
-    elif scaling == 'pareto':
-        output = output / np.sqrt(output.std())
-    elif scaling == 'range':
-        output = output / (output.max() - output.min())
 
-    return output
+def _applyChunks(data, chunksize, divisor, transformation, center, scale, dtype):
+    for chunk in data.chunks(chunksize):
+        values = np.array(chunk.values, dtype=dtype, order='C')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if divisor is not None:
+                np.divide(values, divisor, out=values)
+            _transformInPlace(values, transformation)
+            np.subtract(values, center, out=values)
+            np.divide(values, scale, out=values)
+        yield pd.DataFrame(values, index=chunk.index, columns=chunk.columns, copy=False)
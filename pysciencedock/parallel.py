@@ -0,0 +1,50 @@
+import multiprocessing
+
+# Values shared with worker processes. Workers are forked after these are set,
+# so they inherit them without pickling.
+_shared = {}
+
+
+def getShared(name):
+    """
+    Returns a value passed to :py:func:`parallelMap` as shared, from within
+    the mapped function.
+    """
+    return _shared[name]
+
+
+def canFork():
+    """
+    Whether this process may start worker processes. Pool workers are
+    daemonic and may not, for instance when a task runs in the server's pool.
+    """
+    return not multiprocessing.current_process().daemon
+
+
+def parallelMap(fun, items, processes=1, shared=None):
+    """
+    Yields fun(item) for each item in order, computed in a pool of processes
+    when processes is greater than one, or in this process otherwise.
+
+    :param fun: a module-level function taking one item.
+    :param items: the list of items.
+    :param processes: the number of worker processes.
+    :param shared: a dict of large read-only values for fun to read with
+        :py:func:`getShared` rather than receive with each item.
+    """
+    _shared.update(shared or {})
+    try:
+        if processes > 1 and len(items) > 1 and canFork():
+            pool = multiprocessing.Pool(min(processes, len(items)))
+            try:
+                for result in pool.imap(fun, items):
+                    yield result
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for item in items:
+                yield fun(item)
+    finally:
+        for name in shared or {}:
+            _shared.pop(name, None)
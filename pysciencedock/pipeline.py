@@ -0,0 +1,212 @@
+"""
+Runs chains of describe-wrapped tasks in a single process, passing outputs
+from one step to the next in memory instead of writing and re-reading files.
+
+A pipeline spec is a JSON object with a list of steps. Each step names a
+task, gives its inputs and optionally declares the files to write its
+outputs to. An input is either a literal value (a file name for file
+inputs, or a DataFrame when building a pipeline in Python), or a reference
+to an output of an earlier step:
+
+    {
+      "steps": [
+        {"id": "norm", "task": "normalize",
+         "inputs": {"data": "study.csv", "normalization": "sum"}},
+        {"id": "stats", "task": "ttest",
+         "inputs": {"data": {"from": "norm.output"}},
+         "outputs": {"pvalues": "pvalues.csv"}}
+      ]
+    }
+
+The step name may be given alone ({"from": "norm"}) if that step has a
+single output. Only outputs listed under "outputs" are serialized.
+"""
+
+import argparse
+import json
+import six
+import sys
+
+from pysciencedock import registry
+from pysciencedock.io import readInput, writeOutput
+
+
+def ref(step, output=None):
+    """
+    Returns an input value referring to an output of an earlier step.
+    """
+    return {'from': step if output is None else '%s.%s' % (step, output)}
+
+
+class Pipeline(object):
+    """
+    A set of task steps wired together by their Description inputs and
+    outputs. Steps may be added in any order; they are run in dependency
+    order.
+    """
+
+    def __init__(self):
+        self._steps = []
+
+    @classmethod
+    def fromSpec(cls, spec):
+        pipeline = cls()
+        for step in spec['steps']:
+            pipeline.step(step['id'], step['task'], step.get('inputs', {}), step.get('outputs', {}))
+        return pipeline
+
+    def step(self, id, task, inputs=None, outputs=None):
+        """
+        Adds a step to the pipeline.
+        :param id: a name for the step, unique within the pipeline.
+        :param task: the task name, or a describe-wrapped function.
+        :param inputs: a dict mapping input ids to values or to references
+            created with :py:func:`ref`.
+        :param outputs: a dict mapping output ids to the file names to
+            serialize them to.
+        """
+        if any(s['id'] == id for s in self._steps):
+            raise Exception('Duplicate pipeline step "%s".' % id)
+        if isinstance(task, six.string_types):
+            fun = registry.getTask(task)
+            if fun is None:
+                raise Exception('Task "%s" not found.' % (task,))
+        else:
+            fun = task
+        self._steps.append({
+            'id': id,
+            'fun': fun,
+            'inputs': inputs or {},
+            'outputs': outputs or {}
+        })
+        return self
+
+    def _resolveRef(self, stepsById, value):
+        name = value['from']
+        stepId, _, outputId = name.partition('.')
+        if stepId not in stepsById:
+            raise Exception('Reference to unknown pipeline step "%s".' % stepId)
+        outputs = stepsById[stepId]['fun'].description.outputs
+        if not outputId:
+            if len(outputs) != 1:
+                raise Exception('Step "%s" has several outputs, reference one of: %s.' % (
+                    stepId, ', '.join(o['id'] for o in outputs)))
+            outputId = outputs[0]['id']
+        if outputId not in [o['id'] for o in outputs]:
+            raise Exception('Step "%s" has no output "%s".' % (stepId, outputId))
+        return stepId, outputId
+
+    def _isRef(self, value):
+        return isinstance(value, dict) and 'from' in value
+
+    def validate(self):
+        """
+        Checks the wiring of every step against its Description and returns
+        the steps in an order where each step follows the steps it uses.
+        """
+        stepsById = {s['id']: s for s in self._steps}
+        deps = {}
+        for s in self._steps:
+            description = s['fun'].description
+            inputIds = [i['id'] for i in description.inputs]
+            for inputId in s['inputs']:
+                if inputId not in inputIds:
+                    raise Exception('Step "%s": task has no input "%s".' % (s['id'], inputId))
+            for descInput in description.inputs:
+                if descInput['required'] and 'default' not in descInput and descInput['id'] not in s['inputs']:
+                    raise Exception('Step "%s": input "%s" is required.' % (s['id'], descInput['id']))
+            outputIds = [o['id'] for o in description.outputs]
+            for outputId in s['outputs']:
+                if outputId not in outputIds:
+                    raise Exception('Step "%s": task has no output "%s".' % (s['id'], outputId))
+            deps[s['id']] = set(self._resolveRef(stepsById, v)[0] for v in s['inputs'].values() if self._isRef(v))
+
+        ordered = []
+        done = set()
+        while len(ordered) < len(self._steps):
+            ready = [s for s in self._steps if s['id'] not in done and deps[s['id']] <= done]
+            if not ready:
+                raise Exception('Pipeline steps form a cycle: %s.' % ', '.join(
+                    s['id'] for s in self._steps if s['id'] not in done))
+            for s in ready:
+                ordered.append(s)
+                done.add(s['id'])
+        return ordered
+
+    def run(self):
+        """
+        Runs the pipeline. Results are kept in memory only as long as a later
+        step still uses them.
+        :returns: a dict mapping each step id to a dict of its serialized
+            outputs and the file names they were written to.
+        """
+        ordered = self.validate()
+        stepsById = {s['id']: s for s in self._steps}
+
+        remaining = {}
+        for s in ordered:
+            for value in s['inputs'].values():
+                if self._isRef(value):
+                    key = self._resolveRef(stepsById, value)
+                    remaining[key] = remaining.get(key, 0) + 1
+
+        results = {}
+        written = {}
+        for s in ordered:
+            description = s['fun'].description
+            kwargs = {}
+            for descInput in description.inputs:
+                inputId = descInput['id']
+                if inputId not in s['inputs']:
+                    continue
+                value = s['inputs'][inputId]
+                if self._isRef(value):
+                    key = self._resolveRef(stepsById, value)
+                    kwargs[inputId] = results[key]
+                    remaining[key] -= 1
+                    if remaining[key] == 0:
+                        del results[key]
+                elif descInput['type'] == 'file' and 'deserialize' in descInput and isinstance(value, six.string_types):
+                    kwargs[inputId] = readInput(value, descInput['deserialize'])
+                else:
+                    kwargs[inputId] = value
+
+            # A step whose outputs are only written may stream them to disk.
+            if any(remaining.get((s['id'], outputDesc['id'])) for outputDesc in description.outputs):
+                result = s['fun'](**kwargs)
+            else:
+                result = s['fun'](_mode='stream', **kwargs)
+            if len(description.outputs) == 1:
+                result = {description.outputs[0]['id']: result}
+
+            written[s['id']] = {}
+            for outputDesc in description.outputs:
+                outputId = outputDesc['id']
+                if outputId not in result:
+                    continue
+                if outputId in s['outputs']:
+                    fileName = s['outputs'][outputId]
+                    if 'serialize' in outputDesc:
+                        writeOutput(result[outputId], fileName, outputDesc['serialize'])
+                    written[s['id']][outputId] = fileName
+                if remaining.get((s['id'], outputId)):
+                    results[(s['id'], outputId)] = result[outputId]
+
+        return written
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        prog='pysciencedock --pipeline',
+        description='Run a pipeline of tasks described by a JSON spec.')
+    parser.add_argument('spec', help='The pipeline spec file, or - to read it from stdin')
+    args = parser.parse_args(args)
+
+    if args.spec == '-':
+        spec = json.load(sys.stdin)
+    else:
+        with open(args.spec) as f:
+            spec = json.load(f)
+
+    json.dump(Pipeline.fromSpec(spec).run(), sys.stdout, indent=2)
+    sys.stdout.write('\n')
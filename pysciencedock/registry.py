@@ -0,0 +1,143 @@
+import ast
+import importlib
+import json
+import os
+import sys
+
+# Precomputed task manifest, regenerated with `python -m pysciencedock --build-manifest`.
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tasks.json')
+
+# Packages scanned for describe-wrapped functions when building the manifest.
+PACKAGES = [
+    'pysciencedock.metabolomics',
+    'pysciencedock.statistics',
+    'pysciencedock.transform'
+]
+
+_manifest = None
+
+
+def _packageImports(module):
+    """
+    Returns the names of the package modules a module imports at its top
+    level, and of the modules its functions import when they are called.
+    """
+    with open(os.path.splitext(module.__file__)[0] + '.py') as f:
+        tree = ast.parse(f.read())
+    package = module.__name__.rsplit('.', 1)[0]
+    local = set()
+    deferred = set()
+
+    def resolve(name, level):
+        if level:
+            base = module.__name__.split('.')[:-level]
+            return '.'.join(base + ([name] if name else []))
+        # An implicit relative import names a sibling module. Python 2 marks
+        # failed implicit relative imports with None in sys.modules.
+        sibling = '%s.%s' % (package, name)
+        return sibling if sys.modules.get(sibling) is not None else name
+
+    def visit(node, inFunction):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.Import):
+                names = [resolve(alias.name, 0) for alias in child.names]
+            elif isinstance(child, ast.ImportFrom):
+                base = resolve(child.module, child.level)
+                # Names imported from a package may be its submodules.
+                names = [base] + [base + '.' + alias.name for alias in child.names
+                                  if sys.modules.get(base + '.' + alias.name) is not None]
+            else:
+                visit(child, inFunction or isinstance(child, (ast.FunctionDef, ast.Lambda)))
+                continue
+            for name in names:
+                if name.split('.')[0] == 'pysciencedock':
+                    local.add(name)
+                elif inFunction:
+                    deferred.add(name)
+
+    visit(tree, False)
+    return local, deferred
+
+
+def _deferredImports(moduleName):
+    """
+    Returns the modules that the functions of a task module, and of the
+    package modules it uses, import only when called, such as scipy and
+    sklearn, so that a server can import them before the first request.
+    """
+    seen = set()
+    deferred = set()
+    todo = [moduleName]
+    while todo:
+        name = todo.pop()
+        if name in seen or not hasattr(sys.modules.get(name), '__file__'):
+            continue
+        seen.add(name)
+        local, imports = _packageImports(sys.modules[name])
+        deferred |= imports
+        todo.extend(local)
+    return sorted(deferred)
+
+
+def buildManifest():
+    """
+    Imports every task package and returns a list of manifest entries, one per
+    describe-wrapped function, holding the task name, the module and function
+    that implement it and its girder_worker spec.
+    """
+    from inspect import getmembers, isfunction
+
+    entries = []
+    for packageName in PACKAGES:
+        package = importlib.import_module(packageName)
+        for name, fun in getmembers(package, isfunction):
+            if not hasattr(fun, 'description'):
+                continue
+            spec = fun(_mode='json')
+            entries.append({
+                'name': spec['container_args'][0],
+                'module': fun.__module__,
+                'function': name,
+                'imports': _deferredImports(fun.__module__),
+                'spec': spec
+            })
+    return entries
+
+
+def writeManifest(path=MANIFEST_PATH):
+    entries = buildManifest()
+    with open(path, 'w') as f:
+        json.dump(entries, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.write('\n')
+    return entries
+
+
+def loadManifest():
+    """
+    Returns the task manifest, reading the precomputed JSON file if present
+    and falling back to importing all tasks otherwise.
+    """
+    global _manifest
+    if _manifest is None:
+        if os.path.exists(MANIFEST_PATH):
+            with open(MANIFEST_PATH) as f:
+                _manifest = json.load(f)
+        else:
+            _manifest = buildManifest()
+    return _manifest
+
+
+def listTasks():
+    return [entry['spec'] for entry in loadManifest()]
+
+
+def getTask(name):
+    """
+    Returns the describe-wrapped function for a task name, importing only the
+    module that defines it. Returns None if there is no such task.
+    """
+    for entry in loadManifest():
+        if entry['name'] == name:
+            module = importlib.import_module(entry['module'])
+            return getattr(module, entry['function'])
+    return None
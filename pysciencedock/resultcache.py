@@ -0,0 +1,243 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from .io import fileDigest
+
+# Environment variable naming a directory in which to keep the outputs of
+# task runs, so that repeated runs with the same inputs reuse them.
+RESULT_CACHE_ENV = 'PYSCIENCEDOCK_RESULT_CACHE'
+
+# Environment variable giving the size bound of the result cache in bytes.
+RESULT_CACHE_SIZE_ENV = 'PYSCIENCEDOCK_RESULT_CACHE_SIZE'
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Bump when the layout of cache entries changes so old entries are ignored.
+RESULT_CACHE_VERSION = 'result-1'
+
+_META = 'meta.json'
+
+# Files in the cache directory holding the hit, miss and eviction counts of
+# every process using it, and the lock serializing their updates.
+_COUNTS = 'counts.json'
+_COUNTS_LOCK = 'counts.lock'
+
+# The directory of the package, whose source stands in for its version.
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_sourceDigests = {}
+
+
+def _packageSources():
+    fileNames = []
+    for dirName, dirNames, names in os.walk(_PACKAGE_DIR):
+        dirNames.sort()
+        fileNames.extend(os.path.join(dirName, name) for name in sorted(names) if name.endswith('.py'))
+    return fileNames
+
+
+def sourceDigest(fun):
+    """
+    The SHA-1 digest of the source files of the package, and of the file
+    defining a function outside it, standing in for the version of a task so
+    that editing it or any helper it calls invalidates its cached results.
+    """
+    fileNames = _packageSources()
+    funFile = os.path.abspath(fun.__code__.co_filename)
+    if not funFile.startswith(_PACKAGE_DIR + os.sep) and os.path.exists(funFile):
+        fileNames.append(funFile)
+    fileNames = tuple(fileNames)
+    if fileNames not in _sourceDigests:
+        digest = hashlib.sha1()
+        for fileName in fileNames:
+            digest.update(('%s %s\n' % (os.path.relpath(fileName, _PACKAGE_DIR), fileDigest(fileName))).encode('utf8'))
+        _sourceDigests[fileNames] = digest.hexdigest()
+    return _sourceDigests[fileNames]
+
+
+class ResultCache(object):
+    """
+    Task outputs kept in a directory, one subdirectory per entry holding the
+    output files and a JSON file of the other output values. Entries are
+    evicted least recently used first once their total size exceeds the
+    bound. Hits, misses and evictions are counted both for the life of the
+    process and, across processes, in a file in the directory.
+    """
+
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def fromEnvironment(cls):
+        """
+        The cache configured by the environment, or None if caching is off.
+        """
+        directory = os.environ.get(RESULT_CACHE_ENV)
+        if not directory:
+            return None
+        return cls(directory, int(os.environ.get(RESULT_CACHE_SIZE_ENV, DEFAULT_MAX_BYTES)))
+
+    def key(self, fun, values, inputFiles, outputFormats=None):
+        """
+        Returns the cache key of a task run.
+
+        :param fun: the task function.
+        :param values: a dict of the validated non-file input values.
+        :param inputFiles: a dict mapping input ids to a file name or a list
+            of file names, which are keyed by their content rather than their
+            name.
+        :param outputFormats: a dict mapping file output ids to the formats
+            their file names select, since the same run writes a table
+            differently as CSV or Parquet.
+        """
+        parts = {
+            'version': RESULT_CACHE_VERSION,
+            'task': '%s.%s' % (fun.__module__, fun.__name__),
+            'source': sourceDigest(fun),
+            'values': values,
+            'files': dict((inputId, [fileDigest(fileName) for fileName in fileNames]
+                           if isinstance(fileNames, list) else fileDigest(fileNames))
+                          for inputId, fileNames in inputFiles.items()),
+            'outputs': outputFormats or {}
+        }
+        text = json.dumps(parts, sort_keys=True, default=repr)
+        return hashlib.sha1(text.encode('utf8')).hexdigest()
+
+    def get(self, key, outputFiles):
+        """
+        Copies the output files of a cached entry to the given file names and
+        returns its other output values, or returns None on a miss.
+
+        :param outputFiles: a dict mapping file output ids to file names.
+        """
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, _META)) as f:
+                meta = json.load(f)
+            for outputId, fileName in outputFiles.items():
+                shutil.copyfile(os.path.join(entry, outputId), fileName)
+            os.utime(entry, None)
+        except (IOError, OSError):
+            self.misses += 1
+            self._count(misses=1)
+            return None
+        self.hits += 1
+        self._count(hits=1)
+        return meta['values']
+
+    def put(self, key, outputFiles, values):
+        """
+        Stores the output files and other output values of a task run, then
+        evicts entries beyond the size bound.
+        """
+        self._makeDirectory()
+        tmpEntry = tempfile.mkdtemp(dir=self.directory, suffix='.tmp')
+        try:
+            for outputId, fileName in outputFiles.items():
+                shutil.copyfile(fileName, os.path.join(tmpEntry, outputId))
+            with open(os.path.join(tmpEntry, _META), 'w') as f:
+                json.dump({'values': values}, f)
+            os.rename(tmpEntry, os.path.join(self.directory, key))
+        except (IOError, OSError):
+            # Another process stored the same entry first, or the files are gone.
+            shutil.rmtree(tmpEntry, ignore_errors=True)
+        self.evict()
+
+    def _makeDirectory(self):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+
+    def _readCounts(self):
+        try:
+            with open(os.path.join(self.directory, _COUNTS)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _count(self, **increments):
+        """
+        Adds to the counts kept in the cache directory. The lock keeps
+        concurrent processes from losing each other's updates, and the counts
+        are replaced by renaming so that readers never see a partial file.
+        """
+        self._makeDirectory()
+        with open(os.path.join(self.directory, _COUNTS_LOCK), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            counts = self._readCounts()
+            for name, increment in increments.items():
+                counts[name] = counts.get(name, 0) + increment
+            fd, tmpName = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(counts, f)
+            os.rename(tmpName, os.path.join(self.directory, _COUNTS))
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries())
+        total = sum(size for mtime, size, path in entries)
+        evicted = 0
+        for mtime, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            self.evictions += evicted
+            self._count(evictions=evicted)
+
+    def stats(self):
+        """
+        The hits, misses and evictions of every process using the cache
+        directory, and the number and total size of its entries.
+        """
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        counts = self._readCounts()
+        return {
+            'hits': counts.get('hits', 0),
+            'misses': counts.get('misses', 0),
+            'evictions': counts.get('evictions', 0),
+            'entries': len(entries),
+            'bytes': sum(size for mtime, size, path in entries)
+        }
+
+
+_cache = None
+
+
+def getResultCache():
+    """
+    The process-wide result cache configured by the environment, or None if
+    caching is off.
+    """
+    global _cache
+    directory = os.environ.get(RESULT_CACHE_ENV)
+    if not directory:
+        return None
+    if _cache is None or _cache.directory != directory:
+        _cache = ResultCache.fromEnvironment()
+    return _cache
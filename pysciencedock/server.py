@@ -0,0 +1,167 @@
+"""
+Long-lived server mode that keeps the interpreter and task libraries loaded
+and runs task requests through a pool of worker processes.
+
+Requests and responses are JSON objects, one per line. A request names the
+task and gives its parameters as they would be passed on the command line,
+with file inputs and outputs given as file names:
+
+    {"id": 1, "task": "ttest", "params": {"data": "in.csv", "pvalues": "out.csv"}}
+
+Each response echoes the request id along with a status of "success" or
+"error", the task result (or the error message and traceback) and the
+elapsed time in seconds. When the result cache is on, successful responses
+also say whether the result came from the cache, with a "cache" of "hit" or
+"miss". Responses are written as requests complete, so
+they may arrive out of order.
+"""
+
+import argparse
+import importlib
+import json
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from six.moves import queue, socketserver
+
+from pysciencedock import registry
+from pysciencedock.resultcache import getResultCache
+
+
+def _warmUp():
+    """
+    Imports every task, and the libraries its functions import only when
+    called, so that no request pays for loading them.
+    """
+    for entry in registry.loadManifest():
+        registry.getTask(entry['name'])
+        for name in entry.get('imports', []):
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                # Optional dependencies, such as pyarrow, may be missing.
+                pass
+
+
+def runRequest(request):
+    """
+    Runs a single task request and returns the response dict. Errors are
+    reported in the response rather than raised.
+    """
+    response = {'id': request.get('id')}
+    start = time.time()
+    cache = getResultCache()
+    hits = cache.hits if cache is not None else 0
+    try:
+        task = registry.getTask(request['task'])
+        if task is None:
+            raise Exception('Task "%s" not found.' % (request['task'],))
+        response['result'] = task(_mode='params', params=request.get('params', {}))
+        response['status'] = 'success'
+        if cache is not None:
+            response['cache'] = 'hit' if cache.hits > hits else 'miss'
+    except Exception as e:
+        response['status'] = 'error'
+        response['error'] = str(e)
+        response['traceback'] = traceback.format_exc()
+    response['seconds'] = time.time() - start
+    return response
+
+
+def _writeResponses(responses, outStream):
+    """
+    Writes responses from a queue to outStream until it yields None. Once
+    the stream fails, as when the client has gone away, the remaining
+    responses are dropped.
+    """
+    broken = False
+    while True:
+        response = responses.get()
+        if response is None:
+            return
+        if broken:
+            continue
+        try:
+            outStream.write(json.dumps(response) + '\n')
+            outStream.flush()
+        except (IOError, socket.error):
+            broken = True
+
+
+def serveStream(pool, inStream, outStream):
+    """
+    Reads JSON-lines requests from inStream until end of file, submits them
+    to the pool and writes responses to outStream. Returns once all submitted
+    requests have completed.
+
+    The pool's result thread only queues responses; a thread of this stream
+    writes them, so a slow or closed stream holds up no other stream.
+    """
+    responses = queue.Queue()
+    writer = threading.Thread(target=_writeResponses, args=(responses, outStream))
+    writer.daemon = True
+    writer.start()
+
+    pending = []
+    try:
+        for line in iter(inStream.readline, ''):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                responses.put({'id': None, 'status': 'error', 'error': 'Invalid request: %s' % (e,)})
+                continue
+            pending = [p for p in pending if not p.ready()]
+            pending.append(pool.apply_async(runRequest, (request,), callback=responses.put))
+
+        for p in pending:
+            p.wait()
+    finally:
+        responses.put(None)
+        writer.join()
+
+
+class _SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serveSocket(pool, path):
+    """
+    Listens on a Unix domain socket at path. Each connection is served as a
+    JSON-lines stream of requests and responses.
+    """
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            serveStream(pool, self.rfile, self.wfile)
+
+    server = _SocketServer(path, Handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        prog='pysciencedock --serve',
+        description='Serve task requests as JSON lines on stdin or a Unix socket.')
+    parser.add_argument('--socket', help='Path of a Unix domain socket to listen on instead of stdin')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+        help='Number of worker processes')
+    args = parser.parse_args(args)
+
+    pool = multiprocessing.Pool(args.processes, initializer=_warmUp)
+    try:
+        if args.socket:
+            serveSocket(pool, args.socket)
+        else:
+            serveStream(pool, sys.stdin, sys.stdout)
+    finally:
+        pool.close()
+        pool.join()
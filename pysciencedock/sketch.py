@@ -0,0 +1,58 @@
+import numpy as np
+import warnings
+
+# Values kept at most by a sample of rows, so that the sample of a wide
+# table holds fewer rows rather than growing with its width.
+SAMPLE_CELLS = 1 << 22
+
+
+class RowReservoir(object):
+    """
+    A uniform random sample of bounded size of the rows of a table seen in
+    chunks, kept with reservoir sampling. Quantiles of the sample estimate
+    the quantiles of each column of the whole table, and are exact when the
+    table has no more rows than the sample size. The sample holds at most
+    maxCells values, fewer rows than the size for tables wider than maxCells
+    divided by it.
+    """
+
+    def __init__(self, size, seed=0, maxCells=SAMPLE_CELLS):
+        self.size = size
+        self.maxCells = maxCells
+        self.seen = 0
+        self.filled = 0
+        self.sample = None
+        self._random = np.random.RandomState(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.sample is None:
+            self.size = max(1, min(self.size, self.maxCells // max(values.shape[1], 1)))
+            self.sample = np.empty((self.size, values.shape[1]))
+
+        take = min(self.size - self.filled, len(values))
+        self.sample[self.filled:self.filled + take] = values[:take]
+        self.filled += take
+        self.seen += take
+
+        rest = values[take:]
+        if len(rest):
+            # Row i of the stream replaces a random slot with probability size / (i + 1).
+            positions = self.seen + np.arange(len(rest))
+            slots = (self._random.random_sample(len(rest)) * (positions + 1)).astype(int)
+            keep = slots < self.size
+            for slot, row in zip(slots[keep], rest[keep]):
+                self.sample[slot] = row
+            self.seen += len(rest)
+        return self
+
+    def values(self):
+        return self.sample[:self.filled]
+
+    def median(self):
+        """
+        The estimated median of each column, skipping missing values.
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanmedian(self.values(), axis=0)
@@ -5,7 +5,9 @@ from foldchange import foldchange
 from heatmap import heatmap
 from hierarchy import hierarchy
 from kmeans import kmeans
+from multitest import multitest
 from pca import pca
 from plsda import plsda
 from ttest import ttest
+from twogroup import twogroup
 from volcano import volcano
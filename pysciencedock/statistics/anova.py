@@ -1,20 +1,26 @@
-import numpy as np
-import pandas as pd
-from scipy.stats import f_oneway
-
 from ..describe import describe, Description
-from ..io import readCsv
+from ..io import iterChunks, openCsv
+from correction import CORRECTIONS, significant
+from groupstats import GroupMoments, oneWayAnova
 
 @describe(
     Description('ANOVA', 'Performs a one-way analysis of variance test on a data table.', dockerImage='kitware/pysciencedock')
-        .input('data', 'The data table', type='file', deserialize=readCsv)
+        .input('data', 'The data table', type='file', deserialize=openCsv)
+        .input('chunksize', 'Rows to read at a time, or 0 to read the whole table', type='integer', min=0, default=0, required=False)
+        .input('correction', 'The multiple testing correction; with a correction, only the columns significant at alpha are output', type='string-enumeration', values=CORRECTIONS, default='none', required=False)
+        .input('alpha', 'The significance threshold for the corrected p-values', type='number', min=0, max=1, default=0.05, required=False)
         .output('pvalues', 'The p-values for each column', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def anova(data):
-    if len(data.groupby(level=1)) <= 2:
+def anova(data, chunksize, correction, alpha):
+    moments = None
+    for chunk in iterChunks(data, chunksize):
+        if moments is None:
+            moments = GroupMoments(chunk.columns)
+        moments.update(chunk)
+
+    if moments is None or len(moments.groups) == 0:
+        raise Exception('ANOVA requires a data table with at least one row')
+    if len(moments.groups) <= 2:
         raise Exception('ANOVA requires a secondary index with three or more values')
 
-    return pd.DataFrame(
-        [f_oneway(*[v for k, v in data[col].groupby(level=1)]) for col in data.columns],
-        columns=['f', 'p'],
-        index=data.columns)
+    return significant(oneWayAnova(moments), correction, alpha)
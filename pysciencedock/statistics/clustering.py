@@ -0,0 +1,254 @@
+import numpy as np
+
+# Tables with at most this many observations are clustered exactly by the approximate backend.
+APPROXIMATE_MAX_EXACT = 2000
+
+BACKENDS = ['scipy', 'memory', 'approximate']
+
+
+def _prepare(observations, metric):
+    """
+    Returns the observations as a float array transformed so that the metric
+    can be computed from dot products, along with their squared norms.
+    For the correlation metric each row is centered and scaled to unit norm,
+    making the correlation distance one minus the dot product.
+    """
+    if metric == 'correlation':
+        values = np.array(observations, dtype=float)
+        values -= values.mean(axis=1)[:, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values /= np.sqrt((values * values).sum(axis=1))[:, np.newaxis]
+    elif metric == 'euclidean':
+        # Only read, so memory-mapped observations are not copied.
+        values = np.asarray(observations, dtype=float)
+    else:
+        raise Exception('Unsupported distance metric: %s' % metric)
+    return values, (values * values).sum(axis=1)
+
+
+def _distanceRows(values, norms, metric, rows):
+    """
+    The distances from the observations at the given row positions to every
+    observation.
+    """
+    products = values[rows].dot(values.T)
+    if metric == 'correlation':
+        return 1 - products
+    squared = norms[rows][:, np.newaxis] + norms[np.newaxis, :] - 2 * products
+    return np.sqrt(np.maximum(squared, 0))
+
+
+def _label(merges, n):
+    """
+    Converts merges of observation representatives (a, b, distance) into a
+    linkage matrix, sorting by distance and numbering new clusters n, n+1, ...
+    as scipy.cluster.hierarchy.linkage does.
+    """
+    merges = sorted(merges, key=lambda merge: merge[2])
+    parent = list(range(2 * n - 1))
+    size = [1] * n + [0] * (n - 1)
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    result = np.zeros((n - 1, 4))
+    for i, (a, b, distance) in enumerate(merges):
+        rootA, rootB = find(a), find(b)
+        cluster = n + i
+        parent[rootA] = parent[rootB] = cluster
+        size[cluster] = size[rootA] + size[rootB]
+        result[i] = [min(rootA, rootB), max(rootA, rootB), distance, size[cluster]]
+    return result
+
+
+def _singleLinkage(distanceRow, n):
+    """
+    Single linkage from the minimum spanning tree, built with Prim's
+    algorithm from one row of distances at a time.
+    """
+    merges = []
+    inTree = np.zeros(n, dtype=bool)
+    nearest = np.full(n, np.inf)
+    nearestFrom = np.zeros(n, dtype=int)
+    current = 0
+    for _ in range(n - 1):
+        inTree[current] = True
+        distances = distanceRow(current)
+        closer = ~inTree & (distances < nearest)
+        nearest[closer] = distances[closer]
+        nearestFrom[closer] = current
+        nearest[inTree] = np.inf
+        current = int(np.argmin(nearest))
+        merges.append((nearestFrom[current], current, nearest[current]))
+    return _label(merges, n)
+
+
+def _wardLinkage(observations):
+    """
+    Ward linkage with the nearest-neighbor chain algorithm, computing
+    distances between cluster centroids on demand instead of storing the
+    distance matrix.
+    """
+    centroids = np.array(observations, dtype=float)
+    n = len(centroids)
+    sizes = np.ones(n)
+    active = np.ones(n, dtype=bool)
+    merges = []
+    chain = []
+
+    def distancesFrom(a):
+        with np.errstate(invalid='ignore'):
+            offsets = centroids - centroids[a]
+            distances = np.sqrt(2 * sizes[a] * sizes / (sizes[a] + sizes) * (offsets * offsets).sum(axis=1))
+        distances[~active] = np.inf
+        distances[a] = np.inf
+        return distances
+
+    for _ in range(n - 1):
+        if not chain:
+            chain.append(int(np.argmax(active)))
+        while True:
+            a = chain[-1]
+            distances = distancesFrom(a)
+            b = int(np.argmin(distances))
+            # Prefer the previous chain element on ties so the chain terminates.
+            if len(chain) > 1 and distances[chain[-2]] <= distances[b]:
+                b = chain[-2]
+                break
+            chain.append(b)
+        chain.pop()
+        chain.pop()
+        total = sizes[a] + sizes[b]
+        centroids[b] = (sizes[a] * centroids[a] + sizes[b] * centroids[b]) / total
+        sizes[b] = total
+        active[a] = False
+        merges.append((a, b, distances[b]))
+    return _label(merges, n)
+
+
+def _memoryLinkage(observations, distances, method, metric):
+    if distances is not None:
+        distances = np.asarray(distances, dtype=float)
+        n = len(distances)
+        if method != 'single':
+            raise Exception('The memory backend supports only single linkage on a distance matrix')
+        return _singleLinkage(lambda row: distances[row], n)
+
+    if method == 'single':
+        values, norms = _prepare(observations, metric)
+        return _singleLinkage(lambda row: _distanceRows(values, norms, metric, [row])[0], len(values))
+    if method == 'ward' and metric == 'euclidean':
+        return _wardLinkage(observations)
+    raise Exception('The memory backend supports single linkage, and ward linkage with the euclidean metric')
+
+
+def _approximateLinkage(observations, method, metric):
+    """
+    Groups the observations into about sqrt(n) buckets with mini-batch
+    k-means, links the observations within each bucket exactly and then
+    links the buckets by their centroids.
+    """
+    from scipy.cluster.hierarchy import linkage
+    from sklearn.cluster import MiniBatchKMeans
+
+    values = np.asarray(observations, dtype=float)
+    n = len(values)
+    if n <= APPROXIMATE_MAX_EXACT:
+        return linkage(values, method=method, metric=metric)
+
+    points = _prepare(values, metric)[0] if metric == 'correlation' else values
+    numBuckets = int(np.sqrt(n))
+    buckets = MiniBatchKMeans(n_clusters=numBuckets, random_state=0).fit_predict(points)
+
+    result = []
+    sizes = {}
+    roots = []
+    centroids = []
+
+    def emit(a, b, distance):
+        cluster = n + len(result)
+        sizes[cluster] = sizes.get(a, 1) + sizes.get(b, 1)
+        result.append([min(a, b), max(a, b), distance, sizes[cluster]])
+        return cluster
+
+    for bucket in range(numBuckets):
+        members = np.flatnonzero(buckets == bucket)
+        if len(members) == 0:
+            continue
+        ids = list(members)
+        if len(members) > 1:
+            for a, b, distance, size in linkage(values[members], method=method, metric=metric):
+                ids.append(emit(ids[int(a)], ids[int(b)], distance))
+        roots.append(ids[-1])
+        centroids.append(values[members].mean(axis=0))
+
+    if len(roots) > 1:
+        for a, b, distance, size in linkage(np.array(centroids), method=method, metric=metric):
+            roots.append(emit(roots[int(a)], roots[int(b)], distance))
+    return _monotonic(np.array(result), n)
+
+
+def _monotonic(links, n):
+    """
+    Raises the height of each merge in a linkage matrix to at least those of
+    its children, then orders the merges by height, renumbering the new
+    clusters to match. Merges of buckets by their centroids can otherwise
+    be lower than the merges within the buckets, inverting the dendrogram.
+    """
+    heights = links[:, 2].copy()
+    for i, (a, b) in enumerate(links[:, :2].astype(int)):
+        for child in (a, b):
+            if child >= n:
+                heights[i] = max(heights[i], heights[child - n])
+    # A stable sort keeps children, which come first, before parents of the
+    # same height.
+    order = np.argsort(heights, kind='mergesort')
+    renumber = np.arange(2 * n - 1)
+    renumber[n + order] = n + np.arange(len(order))
+    result = links[order].copy()
+    result[:, 0] = renumber[result[:, 0].astype(int)]
+    result[:, 1] = renumber[result[:, 1].astype(int)]
+    result[:, :2].sort(axis=1)
+    result[:, 2] = heights[order]
+    return result
+
+
+def computeLinkage(observations=None, distances=None, method='single', metric='euclidean', backend='scipy'):
+    """
+    Computes a hierarchical linkage matrix in the format of
+    scipy.cluster.hierarchy.linkage.
+
+    :param observations: an array with one observation per row.
+    :param distances: a square distance matrix to use instead of computing
+        distances from observations.
+    :param method: the linkage method.
+    :param metric: the distance metric between observations, 'euclidean' or
+        'correlation'.
+    :param backend: 'scipy' builds the full condensed distance matrix;
+        'memory' holds only one row of distances at a time and supports
+        single linkage, and ward linkage with the euclidean metric;
+        'approximate' links buckets of similar observations, found with
+        mini-batch k-means, for tables too large to link exactly. Its merge
+        heights are raised where needed to keep the dendrogram monotonic.
+    """
+    if backend not in BACKENDS:
+        raise Exception('Unknown linkage backend: %s' % backend)
+
+    if backend == 'memory':
+        return _memoryLinkage(observations, distances, method, metric)
+
+    from scipy.cluster.hierarchy import linkage
+    from scipy.spatial.distance import squareform
+
+    if distances is not None:
+        if backend == 'approximate':
+            raise Exception('The approximate backend requires observations rather than a distance matrix')
+        return linkage(squareform(np.asarray(distances, dtype=float), checks=False), method=method)
+    if backend == 'approximate':
+        return _approximateLinkage(observations, method, metric)
+    return linkage(observations, method=method, metric=metric)
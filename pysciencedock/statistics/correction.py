@@ -0,0 +1,69 @@
+import numpy as np
+
+CORRECTIONS = ['none', 'bh', 'by', 'bonferroni', 'holm', 'qvalue']
+
+# The p-value above which tests are taken to be null when estimating the
+# proportion of null hypotheses for q-values.
+QVALUE_LAMBDA = 0.5
+
+
+def adjustPValues(pvalues, method):
+    """
+    Adjusts p-values for multiple testing. Missing p-values stay missing and
+    do not count towards the number of tests.
+
+    :param pvalues: an array of p-values.
+    :param method: 'bh' (Benjamini-Hochberg) or 'by' (Benjamini-Yekutieli)
+        false discovery rates, 'bonferroni' or 'holm' family-wise error rates,
+        'qvalue' for Storey's q-values, or 'none'.
+    """
+    if method not in CORRECTIONS:
+        raise Exception('Unknown multiple testing correction: %s' % method)
+
+    pvalues = np.asarray(pvalues, dtype=float)
+    adjusted = np.full(pvalues.shape, np.nan)
+    valid = np.flatnonzero(~np.isnan(pvalues))
+    m = len(valid)
+    if method == 'none' or m == 0:
+        adjusted[valid] = pvalues[valid]
+        return adjusted
+
+    order = valid[np.argsort(pvalues[valid], kind='mergesort')]
+    ranked = pvalues[order]
+    ranks = np.arange(1, m + 1)
+
+    if method == 'bonferroni':
+        result = ranked * m
+    elif method == 'holm':
+        result = np.maximum.accumulate(ranked * (m - ranks + 1))
+    else:
+        # Step-up: the adjusted value at each rank is the smallest over that rank and all larger ones.
+        result = np.minimum.accumulate((ranked * m / ranks)[::-1])[::-1]
+        if method == 'by':
+            result *= (1.0 / ranks).sum()
+        elif method == 'qvalue':
+            result *= min(1.0, (ranked > QVALUE_LAMBDA).sum() / (m * (1 - QVALUE_LAMBDA)))
+
+    adjusted[order] = np.minimum(result, 1)
+    return adjusted
+
+
+def significant(stats, method, alpha, column='p'):
+    """
+    Returns the rows of a table of test results whose adjusted p-values are
+    at most alpha, with the adjusted p-values in a column named after the
+    p-value column with an "adjusted " prefix. A method of 'none' returns
+    the table unchanged.
+
+    :param stats: a DataFrame of test results.
+    :param method: the correction, as in :py:func:`adjustPValues`.
+    :param alpha: the significance threshold.
+    :param column: the column of p-values.
+    """
+    if method == 'none':
+        return stats
+
+    adjusted = adjustPValues(stats[column].values, method)
+    stats = stats.assign(**{'adjusted ' + column: adjusted})
+    with np.errstate(invalid='ignore'):
+        return stats[adjusted <= alpha]
@@ -1,13 +1,15 @@
-import pandas as pd
-
 from ..describe import describe, Description
 from ..io import readCsv
+from corrmatrix import LAYOUTS, correlationMatrix
 
 @describe(
     Description('Correlation', 'Compute a correlation matrix for the columns of a data table.', dockerImage='kitware/pysciencedock')
         .input('data', 'The data table', type='file', deserialize=readCsv)
         .input('method', 'The correlation method', type='string-enumeration', values=['pearson', 'kendall', 'spearman'], default='pearson', required=False)
+        .input('processes', 'The number of worker processes', type='integer', min=1, default=1, required=False)
+        .input('layout', 'Output the full matrix, the correlation of each pair of columns (upper triangle), or only the pairs at or above the threshold (sparse)', type='string-enumeration', values=LAYOUTS, default='matrix', required=False)
+        .input('threshold', 'The absolute correlation threshold for the sparse layout', type='number', min=0, max=1, default=0, required=False)
         .output('correlation', 'The correlation matrix between columns', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def correlation(data, method):
-    return data.corr(method=method)
+def correlation(data, method, processes, layout, threshold):
+    return correlationMatrix(data, method=method, processes=processes, layout=layout, threshold=threshold)
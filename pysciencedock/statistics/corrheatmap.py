@@ -2,21 +2,34 @@ import pandas as pd
 
 from ..describe import describe, Description
 from ..io import readCsv
-from heatmap import heatmap
+from clustering import BACKENDS
+from corrmatrix import correlationMatrix
+from heatmap import FORMATS, heatmap, writeHeatmap
 
 @describe(
     Description('Correlation Heatmap', 'Compute a correlation matrix for the columns of a data table with hierarchical linkage.', dockerImage='kitware/pysciencedock')
         .input('data', 'The data table', type='file', deserialize=readCsv)
         .input('method', 'The correlation method', type='string-enumeration', values=['pearson', 'kendall', 'spearman'], default='pearson', required=False)
+        .input('processes', 'The number of worker processes for the correlation matrix', type='integer', min=1, default=1, required=False)
         .input('linkage', 'The linkage method', type='string-enumeration', values=['single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward'], default='single', required=False)
-        .output('correlation', 'The correlation matrix between columns', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .input('cluster_on', 'Cluster columns by the similarity of their correlation profiles, or directly by correlation distance (one minus correlation) without recomputing distances', type='string-enumeration', values=['profiles', 'correlation'], default='profiles', required=False)
+        .input('backend', 'The linkage backend: scipy, memory (bounded memory; single, or ward with euclidean) or approximate (for very large tables)', type='string-enumeration', values=BACKENDS, default='scipy', required=False)
+        .input('format', 'CSV with the linkage and the data appended to the correlation matrix, or a binary float32 correlation matrix in leaf order with the linkage in a JSON header', type='string-enumeration', values=FORMATS, default='csv', required=False)
+        .input('max_size', 'For the binary format, the largest number of rows and columns to output, averaging runs of adjacent leaves; 0 to keep every row and column, as the CSV format requires', type='integer', min=0, default=0, required=False)
+        .output('correlation', 'The correlation matrix between columns', type='new-file', serialize=writeHeatmap)
 )
-def corrheatmap(data, method, linkage):
-    corr = data.corr(method=method)
-    heat = heatmap(corr, method=linkage, metric='correlation')
+def corrheatmap(data, method, processes, linkage, cluster_on, backend, format, max_size):
+    corr = correlationMatrix(data, method=method, processes=processes)
+    if cluster_on == 'correlation':
+        heat = heatmap(corr, method=linkage, data_type='correlation', backend=backend, format=format, max_size=max_size)
+    else:
+        heat = heatmap(corr, method=linkage, metric='correlation', backend=backend, format=format, max_size=max_size)
+    if format == 'binary':
+        return heat
 
     # Put optional secondary index in _class column.
     if len(data.index.names) > 1:
+        data = data.copy()
         data['_class'] = data.index.get_level_values(data.index.names[1])
         data.index = data.index.get_level_values(data.index.names[0])
 
@@ -0,0 +1,252 @@
+import numpy as np
+import pandas as pd
+
+from ..parallel import getShared, parallelMap
+
+# Columns per block when computing the correlation matrix block by block.
+BLOCK_COLUMNS = 1024
+
+LAYOUTS = ['matrix', 'upper', 'sparse']
+
+
+def _standardize(values):
+    """
+    Centers each column and scales it to unit norm, so that the Pearson
+    correlation of two columns is the dot product of their standardized
+    versions. Constant columns become NaN, as their correlation is undefined.
+    """
+    values = values - values.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norms = np.sqrt((values * values).sum(axis=0))
+        values /= np.where(norms > 0, norms, np.nan)
+    return values
+
+
+def _productBlock(block):
+    start1, stop1, start2, stop2 = block
+    values = getShared('values')
+    result = values[:, start1:stop1].T.dot(values[:, start2:stop2])
+    return start1, start2, np.clip(result, -1, 1)
+
+
+def _maskedProductBlock(block):
+    """
+    Pairwise-complete Pearson correlations of two blocks of columns, from
+    products of the values, their squares and the masks of present values,
+    which give the sums over the rows where both columns of each pair have
+    values.
+    """
+    start1, stop1, start2, stop2 = block
+    values = getShared('values')
+    valid = getShared('valid')
+    x, y = values[:, start1:stop1], values[:, start2:stop2]
+    mx, my = valid[:, start1:stop1], valid[:, start2:stop2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        count = mx.T.dot(my)
+        sumX = x.T.dot(my)
+        sumY = mx.T.dot(y)
+        ssX = (x * x).T.dot(my)
+        ssY = mx.T.dot(y * y)
+        varX = ssX - sumX * sumX / count
+        varY = ssY - sumY * sumY / count
+        cov = x.T.dot(y) - sumX * sumY / count
+        # Columns constant over the rows of a pair leave only rounding error.
+        constant = (varX <= 1e-12 * ssX) | (varY <= 1e-12 * ssY)
+        result = np.where(constant, np.nan, cov / np.sqrt(varX * varY))
+    return start1, start2, np.clip(result, -1, 1)
+
+
+def _kendallRows(rows):
+    """
+    Kendall's tau-b between each of the given columns and every later column,
+    over the rows where both columns have values, as pandas computes it.
+    """
+    from scipy.stats import kendalltau
+
+    values = getShared('values')
+    valid = ~np.isnan(values)
+    numColumns = values.shape[1]
+    result = []
+    for i in rows:
+        for j in range(i, numColumns):
+            both = valid[:, i] & valid[:, j]
+            if not both.any():
+                c = np.nan
+            elif i == j:
+                c = 1.0
+            elif both.all():
+                c = kendalltau(values[:, i], values[:, j])[0]
+            else:
+                c = kendalltau(values[both, i], values[both, j])[0]
+            result.append((i, j, c))
+    return result
+
+
+def _subsetRanks(column, order, rows):
+    """
+    The ranks of the values of a column on the given rows, ties getting
+    their average rank, placed at those rows. The order sorting the whole
+    column is filtered rather than the values sorted again.
+    """
+    order = order[rows[order]]
+    values = column[order]
+    starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+    counts = np.diff(np.append(starts, len(values)))
+    ranks = np.empty(len(column))
+    ranks[order] = np.repeat(starts + (counts + 1) / 2.0, counts)
+    return ranks
+
+
+def _spearmanRows(rows):
+    """
+    Spearman's rho between each of the given columns and every later or
+    complete column, over the rows where both columns have values, as pandas
+    computes it: the Pearson correlation of the ranks among those rows.
+    """
+    values = getShared('values')
+    orders = getShared('orders')
+    valid = ~np.isnan(values)
+    complete = valid.all(axis=0)
+    result = []
+    for i in rows:
+        for j in range(values.shape[1]):
+            # Pairs of a later column with missing values come from its own rows.
+            if j < i and not complete[j]:
+                continue
+            both = valid[:, i] & valid[:, j]
+            c = np.nan
+            if both.sum() > 1:
+                x = _subsetRanks(values[:, i], orders[:, i], both)[both]
+                y = _subsetRanks(values[:, j], orders[:, j], both)[both]
+                x -= x.mean()
+                y -= y.mean()
+                norm = np.sqrt(x.dot(x) * y.dot(y))
+                if norm > 0:
+                    c = x.dot(y) / norm
+            result.append((min(i, j), max(i, j), c))
+    return result
+
+
+def _blockItems(numColumns):
+    items = []
+    for start1 in range(0, numColumns, BLOCK_COLUMNS):
+        for start2 in range(start1, numColumns, BLOCK_COLUMNS):
+            items.append((start1, min(start1 + BLOCK_COLUMNS, numColumns), start2, min(start2 + BLOCK_COLUMNS, numColumns)))
+    return items
+
+
+def _upperBlock(start1, start2, block, positions=None):
+    rows, cols = np.indices(block.shape)
+    rows += start1
+    cols += start2
+    if positions is not None:
+        rows, cols = positions[rows], positions[cols]
+    upper = rows <= cols
+    return rows[upper], cols[upper], block[upper]
+
+
+def _pairBlocks(fun, columns, processes, shared):
+    """
+    Yields the correlations computed pair by pair by fun between each of the
+    given columns and others, interleaving the columns so that each work item
+    has a similar number of pairs.
+    """
+    numItems = max(1, min(len(columns), processes * 4))
+    items = [list(columns[k::numItems]) for k in range(numItems)]
+    for triples in parallelMap(fun, items, processes, shared):
+        if triples:
+            rows, cols, corr = zip(*triples)
+            yield np.array(rows), np.array(cols), np.array(corr)
+
+
+def _blocks(data, method, processes):
+    """
+    Yields (row positions, column positions, correlations) for blocks
+    covering the upper triangle of the correlation matrix, diagonal included.
+    """
+    values = data.values.astype(float)
+    numColumns = values.shape[1]
+
+    if method == 'kendall':
+        for block in _pairBlocks(_kendallRows, np.arange(numColumns), processes, {'values': values}):
+            yield block
+        return
+
+    missing = np.isnan(values)
+    if missing.any() and method == 'pearson':
+        # Pairwise-complete sums, with the columns centered for precision.
+        with np.errstate(invalid='ignore'):
+            values = values - np.nanmean(values, axis=0)
+        values[missing] = 0
+        shared = {'values': values, 'valid': (~missing).astype(float)}
+        for start1, start2, block in parallelMap(_maskedProductBlock, _blockItems(numColumns), processes, shared):
+            yield _upperBlock(start1, start2, block)
+        return
+
+    # Spearman ranks depend on the rows of each pair, so the pairs of columns
+    # with missing values are computed one by one, the others as products.
+    positions = np.flatnonzero(~missing.any(axis=0))
+    if len(positions) < numColumns:
+        shared = {'values': values, 'orders': np.argsort(values, axis=0, kind='mergesort')}
+        for block in _pairBlocks(_spearmanRows, np.flatnonzero(missing.any(axis=0)), processes, shared):
+            yield block
+        data = data.iloc[:, positions]
+        values = values[:, positions]
+
+    if method == 'spearman':
+        values = data.rank().values.astype(float)
+    values = _standardize(values)
+
+    for start1, start2, block in parallelMap(_productBlock, _blockItems(len(positions)), processes, {'values': values}):
+        yield _upperBlock(start1, start2, block, positions)
+
+
+def correlationMatrix(data, method='pearson', processes=1, layout='matrix', threshold=0):
+    """
+    Computes correlations between the columns of a data table. Pearson and
+    Spearman correlations are computed as products of blocks of standardized
+    (and, for Spearman, ranked) columns; Kendall correlations pair by pair
+    with scipy's O(n log n) algorithm. Either way the work is spread over a
+    pool of processes. Missing values are skipped pair by pair, as by
+    DataFrame.corr: Pearson correlations then come from products of masked
+    blocks, and Spearman correlations of columns with missing values are
+    computed pair by pair. Only the upper triangle is held for the 'upper'
+    and 'sparse' layouts.
+
+    :param data: the data table.
+    :param method: 'pearson', 'spearman' or 'kendall'.
+    :param processes: the number of worker processes.
+    :param layout: 'matrix' for the full square matrix; 'upper' for a table
+        of the correlation of each pair of distinct columns, indexed by the
+        pair; 'sparse' for only the pairs whose absolute correlation is at
+        least threshold.
+    :param threshold: the absolute correlation threshold for the sparse layout.
+    """
+    if layout not in LAYOUTS:
+        raise Exception('Unknown correlation layout: %s' % layout)
+
+    numColumns = data.shape[1]
+    if layout == 'matrix':
+        result = np.empty((numColumns, numColumns))
+        for rows, cols, corr in _blocks(data, method, processes):
+            result[rows, cols] = corr
+            result[cols, rows] = corr
+        return pd.DataFrame(result, index=data.columns, columns=data.columns)
+
+    pairs = []
+    for rows, cols, corr in _blocks(data, method, processes):
+        keep = rows != cols
+        if layout == 'sparse':
+            with np.errstate(invalid='ignore'):
+                keep &= np.abs(corr) >= threshold
+        pairs.append((rows[keep].astype(np.int32), cols[keep].astype(np.int32), corr[keep]))
+
+    if pairs:
+        rows, cols, corr = [np.concatenate(part) for part in zip(*pairs)]
+    else:
+        rows, cols, corr = np.array([], dtype=int), np.array([], dtype=int), np.array([])
+    order = np.lexsort((cols, rows))
+    index = pd.MultiIndex.from_arrays(
+        [data.columns[rows[order]], data.columns[cols[order]]],
+        names=['_column1', '_column2'])
+    return pd.DataFrame({'correlation': corr[order]}, index=index)
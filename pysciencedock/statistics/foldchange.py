@@ -3,25 +3,70 @@ import pandas as pd
 
 from ..describe import describe, Description
 from ..io import readCsv
+from groupstats import GroupMoments
+
+COMPARISONS = ['pairwise', 'reference']
 
 @describe(
     Description('Fold change', 'Perform a fold change analysis.', dockerImage='kitware/pysciencedock')
         .input('data', 'The input data table', type='file', deserialize=readCsv)
         .input('threshold', 'Fold change threshold', type='number', min=0, default=2, required=False)
+        .input('comparison', 'With more than two groups, compare every pair of groups or every group with a reference group', type='string-enumeration', values=COMPARISONS, default='pairwise', required=False)
+        .input('reference', 'The reference group, by default the first in sorted order', type='string', default='', required=False)
         .output('output', 'The fold change table', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def foldchange(data, threshold):
-    if len(data.index.levels[1]) != 2:
-        raise Exception('Fold change requires secondary index with two values')
+def foldchange(data, threshold, comparison, reference):
+    moments = GroupMoments.fromFrame(data).sorted()
+    groups = moments.groups
+    if len(groups) < 2:
+        raise Exception('Fold change requires secondary index with two or more values')
+
+    pairs = _pairs(groups, comparison, reference)
+    means = moments.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = means[[b for a, b in pairs]] / means[[a for a, b in pairs]]
+        keep = np.ones(change.shape, dtype=bool)
+        if threshold > 0:
+            keep = (change > threshold) | (change < 1.0 / threshold)
+
+    # Within each comparison, sort descending by fold change with missing values last.
+    order = np.argsort(np.where(np.isnan(change), np.inf, -change), axis=1, kind='mergesort')
+    rows = np.arange(len(pairs))[:, np.newaxis]
+    selected = keep[rows, order]
+    pairIndex = np.repeat(rows, selected.sum(axis=1))
+    columnIndex = order[selected]
+    values = change[pairIndex, columnIndex]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        output = pd.DataFrame({
+            'Fold change': values,
+            'Log2 fold change': np.log2(values)
+        }, columns=['Fold change', 'Log2 fold change'])
+
+    if len(groups) == 2:
+        output.index = data.columns[columnIndex]
+    else:
+        output.index = pd.MultiIndex.from_arrays([
+            [groups[pairs[i][1]] for i in pairIndex],
+            [groups[pairs[i][0]] for i in pairIndex],
+            data.columns[columnIndex]
+        ], names=['_group', '_reference', data.columns.name])
+    return output
 
-    indexA, indexB = data.index.levels[1]
 
-    meanA = data.xs(indexA, level=1).mean(axis=0)
-    meanB = data.xs(indexB, level=1).mean(axis=0)
+def _pairs(groups, comparison, reference):
+    """
+    The (reference, group) positions to compare, with the fold change of
+    each group over its reference.
+    """
+    if comparison not in COMPARISONS:
+        raise Exception('Unknown fold change comparison: %s' % comparison)
 
-    change = meanB.div(meanA)
+    if comparison == 'pairwise':
+        return [(a, b) for a in range(len(groups)) for b in range(a + 1, len(groups))]
 
-    output = pd.DataFrame([change, np.log2(change)], ['Fold change', 'Log2 fold change']).transpose()
-    if threshold > 0:
-        output = output.select(lambda x: output['Fold change'][x] > threshold or output['Fold change'][x] < 1/threshold)
-    return output.sort_values(by='Fold change', ascending=False)
+    names = [str(group) for group in groups]
+    if reference and reference not in names:
+        raise Exception('The reference group %s is not in the secondary index' % reference)
+    ref = names.index(reference) if reference else 0
+    return [(ref, b) for b in range(len(groups)) if b != ref]
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import warnings
+
+# Number of rows reduced at a time, bounding the size of temporaries.
+BLOCK_ROWS = 4096
+
+
+class GroupMoments(object):
+    """
+    Per-group count, sum and sum of squares of every column of a data table,
+    with groups given by one level of the row index. Moments are accumulated
+    in a single pass over the rows, and may be accumulated over several chunks
+    of the same table.
+
+    Values are shifted by a per-column reference before accumulating, which
+    keeps the sums of squares from losing precision on data far from zero.
+    """
+
+    def __init__(self, columns, level=1):
+        self.columns = columns
+        self.level = level
+        self.groups = []
+        self.rows = np.zeros(0)
+        self.count = np.zeros((0, len(columns)))
+        self.sum = np.zeros((0, len(columns)))
+        self.sumsq = np.zeros((0, len(columns)))
+        self.shift = None
+
+    @classmethod
+    def fromFrame(cls, data, level=1):
+        return cls(data.columns, level).update(data)
+
+    def _groupPositions(self, labels):
+        """
+        Returns the position in self.groups of each label, adding new groups.
+        """
+        positions = []
+        for label in labels:
+            if label not in self.groups:
+                self.groups.append(label)
+                self.rows = np.append(self.rows, 0)
+                for name in ('count', 'sum', 'sumsq'):
+                    setattr(self, name, np.vstack([getattr(self, name), np.zeros((1, len(self.columns)))]))
+            positions.append(self.groups.index(label))
+        return np.array(positions, dtype=int)
+
+    def update(self, data):
+        """
+        Adds the rows of a chunk of the table to the moments.
+        """
+        labels, codes = np.unique(np.asarray(data.index.get_level_values(self.level)), return_inverse=True)
+        positions = self._groupPositions(labels)
+        values = data.values
+
+        if self.shift is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                self.shift = np.nan_to_num(np.nanmean(np.asarray(values[:BLOCK_ROWS], dtype=float), axis=0))
+
+        groupRange = np.arange(len(labels))
+        for start in range(0, len(values), BLOCK_ROWS):
+            block = np.asarray(values[start:start + BLOCK_ROWS], dtype=float) - self.shift
+            missing = np.isnan(block)
+            block[missing] = 0
+            indicator = (codes[start:start + BLOCK_ROWS, np.newaxis] == groupRange).astype(float).T
+            self.count[positions] += indicator.dot(~missing)
+            self.sum[positions] += indicator.dot(block)
+            block *= block
+            self.sumsq[positions] += indicator.dot(block)
+            self.rows[positions] += indicator.sum(axis=1)
+        return self
+
+    def sorted(self):
+        """
+        Returns the moments with groups in sorted order, as pandas orders the
+        levels of an index.
+        """
+        order = np.argsort(np.array(self.groups, dtype=object), kind='mergesort')
+        result = GroupMoments(self.columns, self.level)
+        result.groups = [self.groups[i] for i in order]
+        result.rows = self.rows[order]
+        result.count = self.count[order]
+        result.sum = self.sum[order]
+        result.sumsq = self.sumsq[order]
+        result.shift = self.shift
+        return result
+
+    def mean(self):
+        """
+        The mean of each column within each group, skipping missing values.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sum / self.count + self.shift
+
+    def squaredDeviations(self):
+        """
+        The sum of squared deviations from the group mean of each column
+        within each group, skipping missing values.
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.maximum(self.sumsq - self.sum * self.sum / self.count, 0)
+
+    def complete(self):
+        """
+        Whether each column has no missing values within each group.
+        """
+        return self.count == self.rows[:, np.newaxis]
+
+
+def twoGroupStats(moments, test=True):
+    """
+    Compares the two groups of a GroupMoments, returning a DataFrame indexed
+    by column with the mean of each group, the fold change of the second
+    group over the first and, if test is True, the statistic and p-value of
+    an independent two-sample t-test assuming equal variances. Like
+    scipy.stats.ttest_ind, the test gives NaN for columns with missing values.
+    """
+    moments = moments.sorted()
+    if len(moments.groups) != 2:
+        raise Exception('Two-group statistics require a secondary index with two values')
+
+    labelA, labelB = moments.groups
+    meanA, meanB = moments.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = meanB / meanA
+        columns = [
+            ('mean(%s)' % labelA, meanA),
+            ('mean(%s)' % labelB, meanB),
+            ('foldchange', change),
+            ('log2(foldchange)', np.log2(change))
+        ]
+
+        if test:
+            from scipy.special import stdtr
+
+            nA, nB = moments.rows
+            dof = nA + nB - 2
+            sumA, sumB = moments.sum
+            pooled = moments.squaredDeviations().sum(axis=0) / dof
+            statistic = (sumA / nA - sumB / nB) / np.sqrt(pooled * (1.0 / nA + 1.0 / nB))
+            statistic[~moments.complete().all(axis=0)] = np.nan
+            pvalues = 2 * stdtr(dof, -np.abs(statistic))
+            columns = [
+                ('t', statistic),
+                ('p', pvalues),
+                ('-log10(p)', -np.log10(pvalues))
+            ] + columns
+
+    return pd.DataFrame(
+        np.column_stack([values for name, values in columns]),
+        columns=[name for name, values in columns],
+        index=moments.columns)
+
+
+def oneWayAnova(moments):
+    """
+    One-way analysis of variance of every column across the groups of a
+    GroupMoments, returning a DataFrame indexed by column with the F
+    statistic and p-value. Like scipy.stats.f_oneway, columns with missing
+    values give NaN.
+    """
+    from scipy.special import fdtrc
+
+    moments = moments.sorted()
+    numGroups = len(moments.groups)
+    total = moments.rows.sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        grandSum = moments.sum.sum(axis=0)
+        between = (moments.sum * moments.sum / moments.rows[:, np.newaxis]).sum(axis=0) - grandSum * grandSum / total
+        within = moments.squaredDeviations().sum(axis=0)
+        dfBetween = numGroups - 1
+        dfWithin = total - numGroups
+        statistic = (between / dfBetween) / (within / dfWithin)
+        statistic[~moments.complete().all(axis=0)] = np.nan
+        pvalues = fdtrc(dfBetween, dfWithin, statistic)
+
+    return pd.DataFrame({'f': statistic, 'p': pvalues}, columns=['f', 'p'], index=moments.columns)
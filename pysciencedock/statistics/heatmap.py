@@ -1,20 +1,108 @@
+import json
+import struct
+
+import numpy as np
 import pandas as pd
 
+from clustering import BACKENDS
 from hierarchy import hierarchy
 from ..describe import describe, Description
 from ..io import readCsv
 
+# Marks the start of a binary heatmap file; the version is its last character.
+HEATMAP_MAGIC = b'PSDHEAT1'
+
+FORMATS = ['csv', 'binary']
+
+
+class HeatmapMatrix(object):
+    """
+    A heatmap matrix with its row and column linkage trees, written as a
+    compact binary file. The file holds HEATMAP_MAGIC, the length of a JSON
+    header as a little-endian uint64, the header padded with spaces so the
+    data starts on an eight byte boundary, and the matrix as little-endian
+    float32 values in row-major order.
+
+    The matrix rows and columns are in the leaf order of their linkage
+    trees. If the matrix was downsampled, each displayed row or column is the
+    mean of a run of leaves, and "bins" holds the leaf position at which each
+    run starts.
+    """
+
+    def __init__(self, values, rows, columns):
+        self.values = values
+        self.rows = rows
+        self.columns = columns
+
+    def header(self):
+        return {
+            'dtype': '<f4',
+            'shape': list(self.values.shape),
+            'rows': self.rows,
+            'columns': self.columns
+        }
+
+    def write(self, fileName):
+        header = json.dumps(self.header(), separators=(',', ':'), allow_nan=False).encode('utf8')
+        header += b' ' * (-(len(HEATMAP_MAGIC) + 8 + len(header)) % 8)
+        with open(fileName, 'wb') as f:
+            f.write(HEATMAP_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(np.ascontiguousarray(self.values, dtype='<f4').tobytes())
+
+
+def readHeatmap(fileName):
+    """
+    Reads a binary heatmap file, returning its header and the matrix as a
+    read-only array mapped from the file.
+    """
+    with open(fileName, 'rb') as f:
+        if f.read(len(HEATMAP_MAGIC)) != HEATMAP_MAGIC:
+            raise Exception('Not a binary heatmap file: %s' % fileName)
+        length = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(length).decode('utf8'))
+    values = np.memmap(fileName, dtype=header['dtype'], mode='r', offset=len(HEATMAP_MAGIC) + 8 + length,
+                       shape=tuple(header['shape']))
+    return header, values
+
+
+def writeHeatmap(data, fileName):
+    """
+    Serializer for the heatmap output, in either format.
+    """
+    if isinstance(data, HeatmapMatrix):
+        data.write(fileName)
+    else:
+        data.to_csv(fileName)
+
 
 @describe(
     Description('Heatmap', 'Compute data for a heatmap with hierarchical linkage.', dockerImage='kitware/pysciencedock')
         .input('data', 'The data table', type='file', deserialize=readCsv)
         .input('method', 'The linkage method', type='string-enumeration', values=['single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward'], default='single', required=False)
         .input('metric', 'The distance metric', type='string-enumeration', values=['euclidean', 'correlation'], default='euclidean', required=False)
-        .output('matrix', 'A data table prepared for display in a heatmap', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .input('data_type', 'The data table holds observations, or a precomputed square distance or correlation matrix', type='string-enumeration', values=['observations', 'distance', 'correlation'], default='observations', required=False)
+        .input('backend', 'The linkage backend: scipy, memory (bounded memory; single, or ward with euclidean) or approximate (for very large tables)', type='string-enumeration', values=BACKENDS, default='scipy', required=False)
+        .input('format', 'CSV with the linkage appended to the data, or a binary float32 matrix in leaf order with the linkage in a JSON header', type='string-enumeration', values=FORMATS, default='csv', required=False)
+        .input('max_size', 'For the binary format, the largest number of rows and columns to output, averaging runs of adjacent leaves; 0 to keep every row and column, as the CSV format requires', type='integer', min=0, default=0, required=False)
+        .output('matrix', 'A data table prepared for display in a heatmap', type='new-file', serialize=writeHeatmap)
 )
-def heatmap(data, method, metric):
-    rowlinks = hierarchy(data, axis='rows', method=method, metric=metric)
-    collinks = hierarchy(data, axis='columns', method=method, metric=metric)
+def heatmap(data, method, metric, data_type, backend, format, max_size):
+    if format not in FORMATS:
+        raise Exception('Unknown heatmap format: %s' % format)
+    if max_size and format != 'binary':
+        raise Exception('A maximum size applies only to the binary heatmap format')
+
+    rowlinks = hierarchy(data, axis='rows', method=method, metric=metric, data_type=data_type, backend=backend)
+    if _isSymmetric(data):
+        # Rows and columns are the same observations, so they link the same way.
+        collinks = rowlinks.copy()
+    else:
+        collinks = hierarchy(data, axis='columns', method=method, metric=metric, data_type=data_type, backend=backend)
+
+    if format == 'binary':
+        return _binaryHeatmap(data, rowlinks.values, collinks.values, max_size)
 
     rowlinks['cluster'] = rowlinks.index
     rowlinks.loc[0] = [-1, -1, -1, -1, -1]
@@ -35,3 +123,78 @@ def heatmap(data, method, metric):
     data = pd.concat([data, collinks])
 
     return data
+
+
+def _isSymmetric(data):
+    return (data.shape[0] == data.shape[1] and
+            list(data.index) == list(data.columns) and
+            np.allclose(data.values, data.values.T, equal_nan=True))
+
+
+def _leaves(links, n):
+    from scipy.cluster.hierarchy import leaves_list
+
+    return leaves_list(links) if n > 1 else np.arange(n)
+
+
+def _binEdges(n, maxSize):
+    """
+    The start of each run of leaves averaged into one displayed row or
+    column, or None to keep every leaf.
+    """
+    if not maxSize or n <= maxSize:
+        return None
+    return np.unique(np.linspace(0, n, maxSize + 1).astype(int)[:-1])
+
+
+def _binMeans(values, edges, axis):
+    """
+    The mean of each run of values along an axis, skipping missing values.
+    """
+    if edges is None:
+        return values
+    missing = np.isnan(values)
+    sums = np.add.reduceat(np.where(missing, 0, values), edges, axis=axis)
+    counts = np.add.reduceat((~missing).astype(float), edges, axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+def _plain(value):
+    """
+    A value as a plain Python value for the JSON header, with missing and
+    infinite numbers as None, since JSON has no NaN.
+    """
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _axisHeader(labels, links, leaves, edges):
+    return {
+        'labels': [[_plain(v) for v in label] if isinstance(label, tuple) else _plain(label) for label in labels],
+        'names': list(labels.names),
+        'leaves': leaves.tolist(),
+        'linkage': [[_plain(v) for v in row] for row in links.tolist()],
+        'bins': None if edges is None else edges.tolist()
+    }
+
+
+def _binaryHeatmap(data, rowlinks, collinks, maxSize):
+    """
+    Builds a HeatmapMatrix from the data and the linkage matrices of its
+    rows and columns, reordering the values by leaf order only once.
+    """
+    rowLeaves = _leaves(rowlinks, data.shape[0])
+    colLeaves = _leaves(collinks, data.shape[1])
+    values = np.asarray(data.values, dtype=float)[np.ix_(rowLeaves, colLeaves)]
+
+    rowEdges = _binEdges(len(rowLeaves), maxSize)
+    colEdges = _binEdges(len(colLeaves), maxSize)
+    values = _binMeans(_binMeans(values, rowEdges, 0), colEdges, 1)
+
+    return HeatmapMatrix(
+        values,
+        _axisHeader(data.index, rowlinks, rowLeaves, rowEdges),
+        _axisHeader(data.columns, collinks, colLeaves, colEdges))
@@ -1,8 +1,8 @@
 import pandas as pd
-from scipy.cluster.hierarchy import linkage
 
 from ..describe import describe, Description
 from ..io import readCsv
+from clustering import BACKENDS, computeLinkage
 
 @describe(
     Description('Hierarchical linkage', 'Compute a hierarchical linkage of the rows or columns of a data table.', dockerImage='kitware/pysciencedock')
@@ -10,14 +10,26 @@ from ..io import readCsv
         .input('axis', 'Observations are stored in', type='enum', values=['rows', 'columns'], default='rows', required=False)
         .input('method', 'The linkage method', type='enum', values=['single', 'complete', 'average', 'weighted', 'centroid', 'median', 'ward'], default='single', required=False)
         .input('metric', 'The distance metric', type='enum', values=['euclidean', 'correlation'], default='euclidean', required=False)
+        .input('data_type', 'The data table holds observations, or a precomputed square distance or correlation matrix', type='enum', values=['observations', 'distance', 'correlation'], default='observations', required=False)
+        .input('backend', 'The linkage backend: scipy, memory (bounded memory; single, or ward with euclidean) or approximate (for very large tables)', type='enum', values=BACKENDS, default='scipy', required=False)
         .output('linkage', 'The linkage tree', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def hierarchy(data, axis, method, metric):
-    if axis == 'columns':
-        data = data.transpose()
-    clusters = range(len(data.index), 2*len(data.index) - 1)
+def hierarchy(data, axis, method, metric, data_type, backend):
+    if data_type == 'observations':
+        # A transposed view, which is free for a column-major table.
+        observations = data.values.T if axis == 'columns' else data.values
+        n = len(observations)
+        links = computeLinkage(observations=observations, method=method, metric=metric, backend=backend)
+    else:
+        if data.shape[0] != data.shape[1]:
+            raise Exception('A %s matrix must be square' % data_type)
+        n = len(data.index)
+        distances = data.values if data_type == 'distance' else 1 - data.values
+        links = computeLinkage(distances=distances, method=method, backend=backend)
+
+    clusters = range(n, 2*n - 1)
     result = pd.DataFrame(
-        linkage(data, method=method, metric=metric),
+        links,
         columns=['child1', 'child2', 'distance', 'size'],
         index=clusters)
     for col in ['child1', 'child2', 'size']:
@@ -1,18 +1,131 @@
+import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
 
 from ..describe import describe, Description
-from ..io import readCsv
+from ..io import CsvTable, loadTable, openCsv
+from ..parallel import getShared, parallelMap
+from ..sketch import RowReservoir
+
+# Rows sampled to compute silhouette scores, which cost quadratic time in the rows.
+SILHOUETTE_SAMPLE_ROWS = 5000
 
 @describe(
-    Description('K means', 'Performs K means on a data table.', dockerImage='kitware/pysciencedock')
-        .input('data', 'The data table', type='file', deserialize=readCsv)
+    Description('K means', 'Performs K means on a data table, optionally for a range of cluster counts.', dockerImage='kitware/pysciencedock')
+        .input('data', 'The data table', type='file', deserialize=openCsv)
         .input('num_clusters', 'The number of clusters', type='number', min=1, step=1, default=3, required=False)
-        .output('clusters', 'The data with an additional column named "cluster"', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .input('max_clusters', 'The largest number of clusters to try, from the number of clusters up; the count with the best silhouette score is used for the clusters output', type='number', min=0, step=1, default=0, required=False)
+        .input('algorithm', 'Full-batch or mini-batch K means', type='string-enumeration', values=['full', 'minibatch'], default='full', required=False)
+        .input('batch_size', 'The mini-batch size', type='integer', min=1, default=1000, required=False)
+        .input('chunksize', 'Rows to read at a time, which requires mini-batch K means, or 0 to load the whole table', type='integer', min=0, default=0, required=False)
+        .input('processes', 'The number of worker processes for trying several cluster counts', type='integer', min=1, default=1, required=False)
+        .output('clusters', 'The cluster of each row, in a column named "cluster"', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
         .output('cluster_centers', 'The cluster center of each cluster', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .output('sweep', 'The inertia and silhouette score for each number of clusters', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def kmeans(data, num_clusters):
-    model = KMeans(n_clusters=int(num_clusters), random_state=0).fit(data)
-    clusters = data.copy()
-    clusters['cluster'] = model.labels_
-    return dict(clusters=clusters, cluster_centers=pd.DataFrame(model.cluster_centers_, columns=data.columns))
+def kmeans(data, num_clusters, max_clusters, algorithm, batch_size, chunksize, processes):
+    counts = list(range(int(num_clusters), max(int(num_clusters), int(max_clusters)) + 1))
+
+    if chunksize and algorithm != 'minibatch':
+        raise Exception('Reading the table in chunks requires the minibatch algorithm')
+
+    if isinstance(data, CsvTable) and chunksize:
+        index, columns, fits = _streamingFits(data, counts, batch_size, chunksize)
+    else:
+        data = loadTable(data)
+        index, columns = data.index, data.columns
+        shared = {'values': data.values, 'algorithm': algorithm, 'batch_size': batch_size}
+        fits = list(parallelMap(_fit, counts, processes, shared))
+
+    sweep = pd.DataFrame(
+        [(fit['inertia'], fit['silhouette']) for fit in fits],
+        columns=['inertia', 'silhouette'],
+        index=pd.Index(counts, name='_clusters'))
+    best = fits[0]
+    if len(fits) > 1:
+        best = fits[int(np.nanargmax(sweep['silhouette'].fillna(-np.inf).values))]
+
+    return dict(
+        clusters=pd.DataFrame({'cluster': best['labels']}, index=index),
+        cluster_centers=pd.DataFrame(best['centers'], columns=columns),
+        sweep=sweep)
+
+
+def _model(numClusters, algorithm, batchSize):
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    if algorithm == 'minibatch':
+        return MiniBatchKMeans(n_clusters=numClusters, batch_size=batchSize, random_state=0)
+    return KMeans(n_clusters=numClusters, random_state=0)
+
+
+def _silhouette(values, labels):
+    from sklearn.metrics import silhouette_score
+
+    if not 1 < len(np.unique(labels)) < len(values):
+        return np.nan
+    sampleSize = SILHOUETTE_SAMPLE_ROWS if len(values) > SILHOUETTE_SAMPLE_ROWS else None
+    return silhouette_score(values, labels, sample_size=sampleSize, random_state=0)
+
+
+def _fit(numClusters):
+    values = getShared('values')
+    model = _model(numClusters, getShared('algorithm'), getShared('batch_size')).fit(values)
+    return {
+        'labels': model.labels_,
+        'centers': model.cluster_centers_,
+        'inertia': model.inertia_,
+        'silhouette': _silhouette(values, model.labels_)
+    }
+
+
+def _streamingFits(data, counts, batchSize, chunksize):
+    """
+    Fits mini-batch K means for every cluster count in one pass over chunks
+    of the table, then labels the rows in a second pass. Silhouette scores
+    are computed on a random sample of the rows.
+    """
+    models = [_model(k, 'minibatch', batchSize) for k in counts]
+    pending = None
+    for chunk in data.chunks(chunksize):
+        values = chunk.values.astype(float)
+        # A first partial fit needs at least as many rows as clusters.
+        if pending is not None:
+            values = np.vstack([pending, values])
+            pending = None
+        if len(values) < counts[-1] and not hasattr(models[-1], 'cluster_centers_'):
+            pending = values
+            continue
+        for model in models:
+            model.partial_fit(values)
+    if pending is not None:
+        for model in models:
+            model.partial_fit(pending)
+
+    indexes = []
+    labels = [[] for k in counts]
+    inertia = np.zeros(len(counts))
+    reservoir = RowReservoir(SILHOUETTE_SAMPLE_ROWS)
+    columns = None
+    for chunk in data.chunks(chunksize):
+        values = chunk.values.astype(float)
+        columns = chunk.columns
+        indexes.append(chunk.index)
+        chunkLabels = []
+        for i, model in enumerate(models):
+            distances = model.transform(values)
+            chunkLabels.append(distances.argmin(axis=1))
+            inertia[i] += (distances.min(axis=1) ** 2).sum()
+            labels[i].append(chunkLabels[-1].astype(np.int32))
+        reservoir.update(np.column_stack([values] + chunkLabels))
+
+    sample = reservoir.values()
+    numColumns = len(columns)
+    fits = []
+    for i, model in enumerate(models):
+        fits.append({
+            'labels': np.concatenate(labels[i]),
+            'centers': model.cluster_centers_,
+            'inertia': inertia[i],
+            'silhouette': _silhouette(sample[:, :numColumns], sample[:, numColumns + i].astype(int))
+        })
+    return indexes[0].append(indexes[1:]), columns, fits
@@ -0,0 +1,17 @@
+from ..describe import describe, Description
+from ..io import readCsv
+from correction import CORRECTIONS, significant
+
+@describe(
+    Description('Multiple testing', 'Corrects a table of p-values for multiple testing and keeps the significant rows.', dockerImage='kitware/pysciencedock')
+        .input('data', 'A table of test results, such as the output of the t-test, volcano or ANOVA tasks', type='file', deserialize=readCsv)
+        .input('column', 'The column of p-values', type='string', default='p', required=False)
+        .input('correction', 'The multiple testing correction', type='string-enumeration', values=CORRECTIONS[1:], default='bh', required=False)
+        .input('alpha', 'The significance threshold for the corrected p-values', type='number', min=0, max=1, default=0.05, required=False)
+        .output('significant', 'The significant rows, with the corrected p-values', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+)
+def multitest(data, column, correction, alpha):
+    if column not in data.columns:
+        raise Exception('Multiple testing requires a column named %s' % column)
+
+    return significant(data, correction, alpha, column)
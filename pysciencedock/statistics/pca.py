@@ -1,20 +1,78 @@
 import numpy as np
 import pandas as pd
-from sklearn.decomposition import PCA
 
 from ..describe import describe, Description
-from ..io import readCsv
+from ..io import CsvTable, loadTable, openCsv
+
+SOLVERS = ['auto', 'full', 'randomized', 'incremental']
 
 @describe(
     Description('PCA', 'Performs principal component analysis of a data table.', dockerImage='kitware/pysciencedock')
-        .input('data', 'The data table', type='file', deserialize=readCsv)
+        .input('data', 'The data table', type='file', deserialize=openCsv)
         .input('num_components', 'The number of components', type='number', min=1, step=1, default=5, required=False)
+        .input('solver', 'Full or randomized SVD, chosen by the size of the table with auto, or incremental PCA over batches of columns', type='string-enumeration', values=SOLVERS, default='auto', required=False)
+        .input('chunksize', 'Columns per batch for the incremental solver; batches are read from the file one at a time', type='integer', min=1, default=1000, required=False)
         .output('explained', 'The explained variance for each component', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
         .output('components', 'The component vectors', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def pca(data, num_components):
-    pcaModel = PCA(n_components=int(num_components))
-    pcaModel.fit(data.transpose())
+def pca(data, num_components, solver, chunksize):
+    from sklearn.decomposition import PCA, IncrementalPCA
+
+    numComponents = int(num_components)
+    if solver not in SOLVERS:
+        raise Exception('Unknown PCA solver: %s' % solver)
+
+    if solver == 'incremental':
+        pcaModel = IncrementalPCA(n_components=numComponents)
+        if isinstance(data, CsvTable):
+            index, batches = _columnBatches(data, chunksize)
+        else:
+            data = loadTable(data)
+            index = data.index
+            batches = (data.values[:, start:start + chunksize].T for start in range(0, data.shape[1], chunksize))
+        _partialFit(pcaModel, batches, numComponents)
+    else:
+        data = loadTable(data)
+        index = data.index
+        pcaModel = PCA(n_components=numComponents, svd_solver=solver, random_state=0)
+        # The columns are the observations; a transposed view of the values
+        # avoids copying the table before PCA makes its own centered copy.
+        pcaModel.fit(data.values.T)
+
     explained = pd.Series(pcaModel.explained_variance_ratio_)
-    components = pd.DataFrame(pcaModel.components_.transpose(), index=data.index)
+    components = pd.DataFrame(pcaModel.components_.transpose(), index=index)
     return dict(explained=explained, components=components)
+
+
+def _columnBatches(table, chunksize):
+    """
+    Returns the index of a CSV table and a generator of its batches of
+    columns as observations, reading the first batch to find the index.
+    """
+    chunks = table.columnChunks(chunksize)
+    first = next(chunks)
+
+    def batches():
+        yield first.values.T
+        for chunk in chunks:
+            yield chunk.values.T
+
+    return first.index, batches()
+
+
+def _partialFit(model, batches, minimum):
+    """
+    Fits an incremental model on batches of observations, merging a batch
+    with the next when either has fewer observations than components.
+    """
+    pending = None
+    for batch in batches:
+        if pending is None:
+            pending = batch
+        elif len(pending) >= minimum and len(batch) >= minimum:
+            model.partial_fit(pending)
+            pending = batch
+        else:
+            pending = np.vstack([pending, batch])
+    if pending is not None:
+        model.partial_fit(pending)
@@ -1,19 +1,136 @@
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
 import pandas as pd
-from sklearn.cross_decomposition import PLSRegression
 
 from ..describe import describe, Description
 from ..io import readCsv
+from ..parallel import canFork, getShared, parallelMap
 
 @describe(
-    Description('PLSDA', 'Performs partial least squares descriminant analysis on a data table.', dockerImage='kitware/pysciencedock')
+    Description('PLSDA', 'Performs partial least squares descriminant analysis on a data table, with optional cross-validation and permutation testing.', dockerImage='kitware/pysciencedock')
         .input('data', 'The data table', type='file', deserialize=readCsv)
-        .input('num_components', 'The number of components', type='number', min=1, step=1, default=5, required=False)
+        .input('num_components', 'The number of components, or the largest number to consider with cross-validation', type='number', min=1, step=1, default=5, required=False)
+        .input('folds', 'The number of cross-validation folds, or 0 to fit the model without validation; with folds, the number of components with the best Q2 is used', type='integer', min=0, default=0, required=False)
+        .input('permutations', 'The number of permutations of the groups for testing the cross-validated statistics', type='integer', min=0, default=0, required=False)
+        .input('seed', 'The random seed for the folds and permutations', type='integer', default=0, required=False)
+        .input('processes', 'The number of worker processes for the folds and permutations', type='integer', min=1, default=1, required=False)
         .output('loadings', 'The loadings', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
         .output('scores', 'The scores', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .output('vip', 'The variable importance in projection of each column', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .output('validation', 'The cross-validated Q2 and accuracy for each number of components', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .output('permutation', 'The cross-validated statistics and their permutation test p-values', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+        .output('timing', 'The seconds taken by each fold of each permutation, permutation 0 being the data as given', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def plsda(data, num_components):
-    plsModel = PLSRegression(n_components=int(num_components))
-    plsModel.fit(data, data.index.labels[1])
+def plsda(data, num_components, folds, permutations, seed, processes):
+    from sklearn.cross_decomposition import PLSRegression
+
+    numComponents = int(num_components)
+    groups = pd.factorize(data.index.get_level_values(1), sort=True)[0]
+    if permutations and not folds:
+        raise Exception('Permutation testing requires cross-validation folds')
+
+    validation = pd.DataFrame(columns=['q2', 'accuracy'], index=pd.Index([], name='_components'))
+    permutation = pd.DataFrame(columns=['observed', 'p'], index=pd.Index([], name='_statistic'))
+    timing = pd.DataFrame(columns=['seconds'], index=pd.MultiIndex.from_arrays([[], []], names=['_permutation', '_fold']))
+    if folds:
+        validation, permutation, timing = _crossValidate(data.values.astype(float), groups, numComponents, folds, permutations, seed, processes)
+        numComponents = int(validation['q2'].idxmax())
+
+    plsModel = PLSRegression(n_components=numComponents)
+    plsModel.fit(data, groups)
     loadings = pd.DataFrame(plsModel.x_loadings_, index=data.columns)
     scores = pd.DataFrame(plsModel.x_scores_, index=data.index)
-    return dict(loadings=loadings, scores=scores)
+    vip = pd.DataFrame({'vip': _vip(plsModel)}, index=data.columns)
+    return dict(loadings=loadings, scores=scores, vip=vip, validation=validation, permutation=permutation, timing=timing)
+
+
+def _vip(model):
+    weights = model.x_weights_ / np.sqrt((model.x_weights_ ** 2).sum(axis=0))
+    explained = (model.y_loadings_ ** 2).sum(axis=0) * (model.x_scores_ ** 2).sum(axis=0)
+    return np.sqrt(len(weights) * (weights ** 2).dot(explained) / explained.sum())
+
+
+def _foldPredictions(item):
+    """
+    Fits one fold of one permutation and predicts its held out rows with
+    each number of components. The first k components of a PLS fit are
+    those of a k component fit, so one fit gives every prediction.
+    """
+    from sklearn.cross_decomposition import PLSRegression
+
+    permutation, fold = item
+    start = time.time()
+    values = getShared('values')
+    responses = getShared('responses')[permutation]
+    test = getShared('folds')[fold]
+    train = np.ones(len(values), dtype=bool)
+    train[test] = False
+
+    model = PLSRegression(n_components=getShared('components'))
+    model.fit(values[train], responses[train])
+    centered = (values[test] - model.x_mean_) / model.x_std_
+    predictions = []
+    for k in range(1, model.n_components + 1):
+        coef = model.x_rotations_[:, :k].dot(model.y_loadings_[:, :k].T) * model.y_std_
+        predictions.append(centered.dot(coef)[:, 0] + model.y_mean_[0])
+    return permutation, fold, np.array(predictions), time.time() - start
+
+
+def _crossValidate(values, groups, numComponents, folds, permutations, seed, processes):
+    """
+    Runs stratified cross-validation of the data as given and of each
+    permutation of its groups, spreading the folds over worker processes.
+    Permutation i shuffles the groups with seed + i; the folds are the same
+    for every permutation. Workers read the values from a memory-mapped file
+    rather than each holding a copy.
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    tests = [test for train, test in splitter.split(values, groups)]
+    responses = [groups] + [np.random.RandomState(seed + i).permutation(groups) for i in range(1, permutations + 1)]
+    items = [(p, fold) for p in range(permutations + 1) for fold in range(folds)]
+
+    tmpDir = None
+    if processes > 1 and canFork():
+        tmpDir = tempfile.mkdtemp()
+        fileName = os.path.join(tmpDir, 'values.npy')
+        np.save(fileName, values)
+        values = np.load(fileName, mmap_mode='r')
+
+    try:
+        shared = {'values': values, 'responses': responses, 'folds': tests, 'components': numComponents}
+        predictions = np.empty((permutations + 1, numComponents, len(groups)))
+        seconds = []
+        for p, fold, foldPredictions, elapsed in parallelMap(_foldPredictions, items, processes, shared):
+            predictions[p][:, tests[fold]] = foldPredictions
+            seconds.append(elapsed)
+    finally:
+        if tmpDir:
+            shutil.rmtree(tmpDir)
+
+    actual = np.array(responses)[:, np.newaxis, :]
+    total = ((groups - groups.mean()) ** 2).sum()
+    q2 = 1 - ((predictions - actual) ** 2).sum(axis=2) / total
+    predicted = np.clip(np.round(predictions), 0, groups.max())
+    accuracy = (predicted == actual).mean(axis=2)
+
+    validation = pd.DataFrame(
+        {'q2': q2[0], 'accuracy': accuracy[0]},
+        index=pd.Index(range(1, numComponents + 1), name='_components'),
+        columns=['q2', 'accuracy'])
+    best = int(np.argmax(q2[0]))
+    observed = np.array([q2[0, best], accuracy[0, best]])
+    permuted = np.array([q2[1:, best], accuracy[1:, best]])
+    permutation = pd.DataFrame(
+        {'observed': observed, 'p': ((permuted >= observed[:, np.newaxis]).sum(axis=1) + 1.0) / (permutations + 1)},
+        index=pd.Index(['q2', 'accuracy'], name='_statistic'),
+        columns=['observed', 'p'])
+    timing = pd.DataFrame(
+        {'seconds': seconds},
+        index=pd.MultiIndex.from_tuples(items, names=['_permutation', '_fold']))
+    return validation, permutation, timing
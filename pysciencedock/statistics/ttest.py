@@ -1,29 +1,19 @@
-import numpy as np
-import pandas as pd
-from scipy.stats import ttest_ind
-
 from ..describe import describe, Description
 from ..io import readCsv
+from correction import CORRECTIONS, significant
+from groupstats import GroupMoments, twoGroupStats
 
 @describe(
     Description('T-test', 'Performs a statistical t-test on a data table.', dockerImage='kitware/pysciencedock')
         .input('data', 'The data table', type='file', deserialize=readCsv)
+        .input('correction', 'The multiple testing correction; with a correction, only the columns significant at alpha are output', type='string-enumeration', values=CORRECTIONS, default='none', required=False)
+        .input('alpha', 'The significance threshold for the corrected p-values', type='number', min=0, max=1, default=0.05, required=False)
         .output('pvalues', 'The p-values for each column', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def ttest(data):
+def ttest(data, correction, alpha):
     if len(data.index.levels[1]) != 2:
         raise Exception('T-test requires secondary index with two values')
 
-    indexA, indexB = data.index.levels[1]
-
-    dataA = data.xs(indexA, level=1)
-    dataB = data.xs(indexB, level=1)
-
-    statistic, pvalues = ttest_ind(dataA, dataB)
-
-    pvalues = pd.DataFrame(
-        [statistic, pvalues, -np.log10(pvalues)],
-        columns=data.columns,
-        index=['t', 'p', '-log10(p)']).transpose()
+    stats = twoGroupStats(GroupMoments.fromFrame(data))
 
-    return pvalues
+    return significant(stats[['t', 'p', '-log10(p)']], correction, alpha)
@@ -0,0 +1,17 @@
+from ..describe import describe, Description
+from ..io import readCsv
+from correction import CORRECTIONS, significant
+from groupstats import GroupMoments, twoGroupStats
+
+@describe(
+    Description('Two-group report', 'Computes group means, fold change and t-test results for each column of a data table with two groups.', dockerImage='kitware/pysciencedock')
+        .input('data', 'The data table', type='file', deserialize=readCsv)
+        .input('correction', 'The multiple testing correction; with a correction, only the columns significant at alpha are output', type='string-enumeration', values=CORRECTIONS, default='none', required=False)
+        .input('alpha', 'The significance threshold for the corrected p-values', type='number', min=0, max=1, default=0.05, required=False)
+        .output('report', 'The t-test, p-values, fold change and group means for each column', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+)
+def twogroup(data, correction, alpha):
+    if len(data.index.levels[1]) != 2:
+        raise Exception('Two-group report requires secondary index with two values')
+
+    return significant(twoGroupStats(GroupMoments.fromFrame(data)), correction, alpha)
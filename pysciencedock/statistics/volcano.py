@@ -1,34 +1,19 @@
-import numpy as np
-import pandas as pd
-from scipy.stats import ttest_ind
-
 from ..describe import describe, Description
 from ..io import readCsv
+from correction import CORRECTIONS, significant
+from groupstats import GroupMoments, twoGroupStats
 
 @describe(
     Description('Volcano', 'Computes data for a volcano plot from a data table.', dockerImage='kitware/pysciencedock')
         .input('data', 'The data table', type='file', deserialize=readCsv)
+        .input('correction', 'The multiple testing correction; with a correction, only the columns significant at alpha are output', type='string-enumeration', values=CORRECTIONS, default='none', required=False)
+        .input('alpha', 'The significance threshold for the corrected p-values', type='number', min=0, max=1, default=0.05, required=False)
         .output('volcano', 'The fold change and p-values for each column', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
 )
-def volcano(data):
+def volcano(data, correction, alpha):
     if len(data.index.levels[1]) != 2:
         raise Exception('Volcano requires secondary index with two values')
 
-    indexA, indexB = data.index.levels[1]
-
-    dataA = data.xs(indexA, level=1)
-    dataB = data.xs(indexB, level=1)
-
-    meanA = dataA.mean(axis=0)
-    meanB = dataB.mean(axis=0)
-
-    change = meanB.div(meanA)
-
-    statistic, pvalues = ttest_ind(dataA, dataB)
-
-    pvalues = pd.DataFrame(
-        [statistic, pvalues, -np.log10(pvalues), change, np.log2(change)],
-        columns=data.columns,
-        index=['t', 'p', '-log10(p)', 'foldchange', 'log2(foldchange)']).transpose()
+    stats = twoGroupStats(GroupMoments.fromFrame(data))
 
-    return pvalues
+    return significant(stats[['t', 'p', '-log10(p)', 'foldchange', 'log2(foldchange)']], correction, alpha)
@@ -1,2 +1,3 @@
 from concatenate import concatenate
+from convert import convert
 from csv_to_json import csv_to_json
@@ -1,13 +1,102 @@
 import pandas as pd
+import six
 
 from ..describe import describe, Description
-from ..io import readCsv
+from ..io import CsvTable, expandPaths, loadTable, openCsv, readInput, writeCsv
+from ..parallel import parallelMap
+
+
+def _tableList(table1, table2, tables):
+    """
+    The tables to combine, with any file names, glob patterns and manifests
+    among the more tables expanded and read as the table inputs are.
+    """
+    if isinstance(tables, six.string_types):
+        tables = [tables]
+    more = []
+    for table in tables or []:
+        if isinstance(table, six.string_types):
+            more.extend(readInput(fileName, openCsv) for fileName in expandPaths([table]))
+        else:
+            more.append(table)
+    return [table for table in [table1, table2] + more if table is not None]
+
+
+def _streamConcatenate(table1, table2, tables, chunksize, processes):
+    """
+    The output of concatenate for serializing: a generator of chunks of the
+    combined table when reading the tables in chunks, so that they are
+    written as they are read.
+    """
+    tables = _tableList(table1, table2, tables)
+    columnsList = [table.columns() if isinstance(table, CsvTable) else table.columns for table in tables]
+    columns = _alignColumns(columnsList)
+
+    if not chunksize:
+        return pd.concat([table.reindex(columns=columns) for table in parallelMap(loadTable, tables, processes)])
+
+    # Columns missing from some table hold missing values, so write numeric
+    # ones as floats throughout, as the combined table in memory would hold
+    # them.
+    partial = [column for column in columns if not all(column in c for c in columnsList)]
+    return _streamRows(tables, columns, partial, chunksize, processes)
+
 
 @describe(
-    Description('Concatenate', 'Concatenates two data tables.', dockerImage='kitware/pysciencedock')
-        .input('table1', 'The first data table', type='file', deserialize=readCsv)
-        .input('table2', 'The second data table', type='file', deserialize=readCsv)
-        .output('combined', 'The combined table', type='new-file', serialize=lambda df, fileName: df.to_csv(fileName))
+    Description('Concatenate', 'Concatenates data tables, aligning their columns.', dockerImage='kitware/pysciencedock')
+        .input('table1', 'The first data table', type='file', deserialize=openCsv)
+        .input('table2', 'The second data table', type='file', deserialize=openCsv, required=False)
+        .input('tables', 'More data tables: a file name, a glob pattern, or @ followed by a file listing one per line', type='string', default='', required=False, paths=True)
+        .input('chunksize', 'Rows to read and write at a time, or 0 to combine the tables in memory', type='integer', min=0, default=0, required=False)
+        .input('processes', 'The number of worker processes for parsing the tables', type='integer', min=1, default=1, required=False)
+        .output('combined', 'The combined table', type='new-file', serialize=writeCsv)
+        .stream(_streamConcatenate)
 )
-def concatenate(table1, table2):
-    return pd.concat([table1, table2])
+def concatenate(table1, table2, tables, chunksize, processes):
+    return loadTable(_streamConcatenate(table1, table2, tables, chunksize, processes))
+
+
+def _alignColumns(columnsList):
+    """
+    The columns of the combined table: those of the tables if they all have
+    the same columns, otherwise the sorted union, as pandas.concat does.
+    """
+    first = columnsList[0]
+    if all(columns.equals(first) for columns in columnsList[1:]):
+        return first
+    union = first
+    for columns in columnsList[1:]:
+        union = union.union(columns)
+    return union
+
+
+def _alignChunk(chunk, columns, partial):
+    chunk = chunk.reindex(columns=columns)
+    # Other columns, such as strings, stay objects holding missing values.
+    numeric = [column for column in partial if chunk[column].dtype.kind in 'iuf']
+    if numeric:
+        chunk[numeric] = chunk[numeric].astype(float)
+    return chunk
+
+
+def _streamRows(tables, columns, partial, chunksize, processes):
+    """
+    Yields chunks of rows of each table in turn with the aligned columns.
+    With one process each CSV table is read a chunk at a time; with more,
+    whole tables are parsed in parallel, as many at a time as there are
+    processes, and then split into chunks.
+    """
+    if processes > 1:
+        for first in range(0, len(tables), processes):
+            for table in parallelMap(loadTable, tables[first:first + processes], processes):
+                for start in range(0, len(table), chunksize):
+                    yield _alignChunk(table.iloc[start:start + chunksize], columns, partial)
+        return
+
+    for table in tables:
+        if isinstance(table, CsvTable):
+            for chunk in table.chunks(chunksize):
+                yield _alignChunk(chunk, columns, partial)
+        else:
+            for start in range(0, len(table), chunksize):
+                yield _alignChunk(table.iloc[start:start + chunksize], columns, partial)
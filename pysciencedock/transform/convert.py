@@ -0,0 +1,54 @@
+import pandas as pd
+
+from ..describe import describe, Description
+from ..io import NPZ_ORDERS, TABLE_FORMATS, loadTable, openCsv, writeTable
+
+
+class ConvertedTable(object):
+    """
+    A table to write in a given format when it is serialized, whatever the
+    name of the output file.
+    """
+
+    def __init__(self, data, format, order):
+        self.data = data
+        self.format = format
+        self.order = order
+
+    def write(self, fileName):
+        writeTable(loadTable(self.data), fileName, self.format, self.order)
+
+
+class ConvertedFrame(pd.DataFrame):
+    """
+    The table convert returns, which remembers the format and order to
+    write itself in, so that it is written as it would be streamed when a
+    pipeline both passes it on to another step and writes it.
+    """
+
+    _metadata = ['format', 'order']
+
+    def write(self, fileName):
+        writeTable(pd.DataFrame(self, copy=False), fileName, self.format, self.order)
+
+
+def _streamConvert(data, format, order):
+    """
+    The output of convert for serializing, read only when it is written.
+    """
+    return ConvertedTable(data, format, order)
+
+
+@describe(
+    Description('Convert table', 'Converts a table between CSV, Parquet, Feather and NPZ. Uncompressed NPZ tables are memory-mapped when read, so tasks use their values without copying them.', dockerImage='kitware/pysciencedock')
+        .input('data', 'The data table', type='file', deserialize=openCsv)
+        .input('format', 'The format to write', type='string-enumeration', values=TABLE_FORMATS, default='npz', required=False)
+        .input('order', 'For NPZ, store the values row by row (C) or column by column (F); column-major suits tasks treating columns as observations, such as PCA', type='string-enumeration', values=NPZ_ORDERS, default='C', required=False)
+        .output('output', 'The converted table', type='new-file', serialize=lambda table, fileName: table.write(fileName))
+        .stream(_streamConvert)
+)
+def convert(data, format, order):
+    table = ConvertedFrame(loadTable(data), copy=False)
+    table.format = format
+    table.order = order
+    return table
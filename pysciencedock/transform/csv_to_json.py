@@ -1,12 +1,59 @@
 import pandas as pd
 
 from ..describe import describe, Description
-from ..io import readCsv
+from ..io import JSON_ORIENTS, iterChunks, loadTable, openCsv, writeJson
+
+
+class JsonTable(object):
+    """
+    A table to convert to JSON when it is serialized, so that chunks of it
+    are read and written one at a time.
+    """
+
+    def __init__(self, data, orient, chunksize, compression):
+        self.data = data
+        self.orient = orient
+        self.chunksize = chunksize
+        self.compression = compression
+
+    def write(self, fileName):
+        chunksize = 0 if self.orient == 'columns' else self.chunksize
+        compression = None if self.compression == 'none' else self.compression
+        writeJson(iterChunks(self.data, chunksize), fileName, self.orient, compression)
+
+
+class JsonFrame(pd.DataFrame):
+    """
+    The table csv_to_json returns, which remembers how to write itself as
+    JSON, so that it is written as it would be streamed when a pipeline both
+    passes it on to another step and writes it.
+    """
+
+    _metadata = ['orient', 'chunksize', 'compression']
+
+    def write(self, fileName):
+        JsonTable(pd.DataFrame(self, copy=False), self.orient, self.chunksize, self.compression).write(fileName)
+
+
+def _streamCsvToJson(data, orient, chunksize, compression):
+    """
+    The output of csv_to_json for serializing, converted a chunk at a time.
+    """
+    return JsonTable(data, orient, chunksize, compression)
+
 
 @describe(
-    Description('CSV to JSON', 'Converts a CSV table to an array of objects in JSON format.', dockerImage='kitware/pysciencedock')
-        .input('data', 'The CSV data table', type='file', deserialize=readCsv)
-        .output('output', 'The converted JSON table', type='new-file', serialize=lambda df, fileName: df.to_json(fileName))
+    Description('CSV to JSON', 'Converts a CSV table to JSON, reading and writing it in chunks of rows.', dockerImage='kitware/pysciencedock')
+        .input('data', 'The CSV data table', type='file', deserialize=openCsv)
+        .input('orient', 'An object of columns; or, written chunk by chunk, an array of row objects, one row object per line, or the column names with an array of row arrays', type='string-enumeration', values=JSON_ORIENTS, default='columns', required=False)
+        .input('chunksize', 'Rows to read and write at a time for the records, lines and split orientations', type='integer', min=1, default=10000, required=False)
+        .input('compression', 'The compression of the JSON file', type='string-enumeration', values=['none', 'gzip'], default='none', required=False)
+        .output('output', 'The converted JSON table', type='new-file', serialize=lambda table, fileName: table.write(fileName))
+        .stream(_streamCsvToJson)
 )
-def csv_to_json(data):
-    return data
+def csv_to_json(data, orient, chunksize, compression):
+    table = JsonFrame(loadTable(data), copy=False)
+    table.orient = orient
+    table.chunksize = chunksize
+    table.compression = compression
+    return table
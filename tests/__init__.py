@@ -1 +1,11 @@
+from io_test import IoTest
 from metabolomics_test import MetabolomicsTest
+from registry_test import RegistryTest
+from server_test import ServerTest
+from batch_test import BatchTest
+from pipeline_test import PipelineTest
+from statistics_test import StatisticsTest
+from transform_test import TransformTest
+from resultcache_test import ResultCacheTest
+from instrument_test import InstrumentTest
+from benchmarks_test import BenchmarksTest
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import pandas as pd
+from pysciencedock import registry
+import pysciencedock.batch as batch
+from pysciencedock.batch import fileItems, runBatch
+from pysciencedock.server import runRequest
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        for name in ['a', 'b']:
+            with open(os.path.join(self.tmpDir, name + '.csv'), 'w') as f:
+                f.write('sample,group,x,y\ns1,g1,1,2\ns2,g1,2,3\ns3,g2,5,1\ns4,g2,6,2\n')
+        with open(os.path.join(self.tmpDir, 'bad.csv'), 'w') as f:
+            f.write('sample,group,x\ns1,g1,1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def path(self, name):
+        return os.path.join(self.tmpDir, name)
+
+    def testFileItems(self):
+        task = registry.getTask('ttest')
+        self.assertEqual(fileItems(task, [self.path('[ab].csv')]), [
+            {'data': self.path('a.csv'), 'pvalues': self.path('a_pvalues.csv')},
+            {'data': self.path('b.csv'), 'pvalues': self.path('b_pvalues.csv')}
+        ])
+        self.assertEqual(
+            fileItems(task, [self.path('a.csv')], 'data', {'pvalues': '{stem}.{output}{ext}'}, 'out'),
+            [{'data': self.path('a.csv'), 'pvalues': os.path.join('out', 'a.pvalues.csv')}])
+        with self.assertRaises(Exception):
+            fileItems(task, [self.path('a.csv')], templates={'missing': '{stem}'})
+
+    def testRunBatch(self):
+        items = fileItems(registry.getTask('ttest'), [self.path('*.csv')])
+        summary = runBatch('ttest', items, {'alpha': '0.5'}, processes=2)
+        self.assertEqual((summary['items'], summary['succeeded'], summary['failed']), (3, 2, 1))
+        results = summary['results']
+        self.assertEqual([r['status'] for r in results], ['success', 'success', 'error'])
+        self.assertEqual(results[0]['result'], {'pvalues': self.path('a_pvalues.csv')})
+        self.assertEqual(results[0]['params']['alpha'], '0.5')
+        self.assertEqual(results[2]['params']['data'], self.path('bad.csv'))
+        self.assertEqual(list(pd.read_csv(self.path('b_pvalues.csv'), index_col=0).columns), ['t', 'p', '-log10(p)'])
+
+    def testRunBatchErrors(self):
+        with self.assertRaises(Exception):
+            runBatch('missing', [])
+        item = {'data': self.path('a.csv'), 'pvalues': self.path('p.csv')}
+        with self.assertRaises(Exception):
+            runBatch('ttest', [item, dict(item, data=self.path('b.csv'))])
+
+    def testRunBatchLostWorkers(self):
+        # Items whose worker dies or hangs are reported without stopping the others.
+        items = [{'data': self.path('a.csv'), 'pvalues': self.path('a_pvalues.csv')},
+                 {'data': self.path('exit'), 'pvalues': self.path('exit_pvalues.csv')},
+                 {'data': self.path('hang'), 'pvalues': self.path('hang_pvalues.csv')},
+                 {'data': self.path('b.csv'), 'pvalues': self.path('b_pvalues.csv')}]
+        original = batch.runRequest
+        batch.runRequest = _failingRequest
+        try:
+            summary = runBatch('ttest', items, processes=2, timeout=2)
+        finally:
+            batch.runRequest = original
+        self.assertEqual([r['status'] for r in summary['results']], ['success', 'error', 'error', 'success'])
+        self.assertIn('exited', summary['results'][1]['error'])
+        self.assertIn('longer than 2 seconds', summary['results'][2]['error'])
+        self.assertEqual(summary['results'][3]['params']['data'], self.path('b.csv'))
+
+
+def _failingRequest(request):
+    name = os.path.basename(request['params']['data'])
+    if name == 'exit':
+        os._exit(1)
+    if name == 'hang':
+        time.sleep(60)
+    return runRequest(request)
@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from benchmarks.run import compare, parseSizes, runBenchmarks
+from benchmarks.synthetic import syntheticStudy
+
+
+class BenchmarksTest(unittest.TestCase):
+    def testSyntheticStudy(self):
+        data = syntheticStudy(300, 40, groups=3, missing=0.2, seed=1)
+        self.assertEqual(data.shape, (300, 40))
+        self.assertEqual(list(data.index.names), ['_sample', '_group'])
+        self.assertEqual(len(data.index.levels[1]), 3)
+        self.assertAlmostEqual(data.isnull().values.mean(), 0.2, delta=0.02)
+        self.assertTrue((data.fillna(1).values > 0).all())
+
+        # Missing values are mostly the low ones.
+        complete = syntheticStudy(300, 40, groups=3, seed=1)
+        self.assertLess(complete[data.isnull()].stack().median(), complete[data.notnull()].stack().median())
+
+        self.assertTrue(np.array_equal(syntheticStudy(20, 5, seed=2).values, syntheticStudy(20, 5, seed=2).values))
+        self.assertFalse(np.array_equal(syntheticStudy(20, 5, seed=2).values, syntheticStudy(20, 5, seed=3).values))
+
+    def testRun(self):
+        results = runBenchmarks(['readCsv', 'ttest'], parseSizes('20x5'))
+        self.assertEqual([(r['benchmark'], r['rows'], r['columns']) for r in results['results']],
+                         [('readCsv', 20, 5), ('ttest', 20, 5)])
+        ttest = results['results'][1]
+        self.assertEqual(sorted(ttest['phases']), ['deserialize', 'run', 'serialize', 'validate'])
+        self.assertGreater(ttest['wall'], 0)
+        self.assertGreater(ttest['peak_rss'], 0)
+        self.assertEqual(compare(results, results), [])
+
+    def testCompare(self):
+        def results(wall, rss):
+            return {'results': [{'benchmark': 'pca', 'rows': 10, 'columns': 5, 'wall': wall, 'peak_rss': rss}]}
+
+        baseline = results(1.0, 100 << 20)
+        self.assertEqual(compare(results(1.2, 110 << 20), baseline), [])
+        # Differences below the noise floor are not regressions.
+        self.assertEqual(compare(results(0.04, 100 << 20), results(0.01, 100 << 20)), [])
+        regressions = compare(results(2.0, 200 << 20), baseline)
+        self.assertEqual([r['metric'] for r in regressions], ['wall', 'peak_rss'])
+        self.assertEqual(regressions[0]['current'], 2.0)
+        self.assertEqual(compare(results(2.0, 100 << 20), baseline, tolerance=1.5), [])
+        self.assertEqual(compare(results(2.0, 100 << 20), {'results': []}), [])
@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from pysciencedock.describe import describe, Description
+from pysciencedock.instrument import METRICS_ENV, PROFILE_ENV, Metrics
+from pysciencedock.transform import concatenate
+
+
+@describe(
+    Description('Double', 'Doubles a table.', dockerImage='kitware/pysciencedock')
+        .input('data', 'The table', type='file', deserialize=lambda fileName: pd.read_csv(fileName, index_col=0))
+        .output('output', 'The doubled table', type='new-file', serialize=lambda data, fileName: data.to_csv(fileName))
+)
+def double(data):
+    if data.empty:
+        raise Exception('The table is empty')
+    return data * 2
+
+
+class InstrumentTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.metricsFile = os.path.join(self.tmpDir, 'metrics.jsonl')
+        self.profileDir = os.path.join(self.tmpDir, 'profiles')
+        self.dataFile = os.path.join(self.tmpDir, 'data.csv')
+        pd.DataFrame({'a': [1, 2, 3], 'b': [4, 5, 6]}).to_csv(self.dataFile)
+
+    def tearDown(self):
+        for name in [METRICS_ENV, PROFILE_ENV]:
+            os.environ.pop(name, None)
+        shutil.rmtree(self.tmpDir)
+
+    def records(self):
+        with open(self.metricsFile) as f:
+            return [json.loads(line) for line in f]
+
+    def testPhases(self):
+        os.environ[METRICS_ENV] = self.metricsFile
+        outFile = os.path.join(self.tmpDir, 'out.csv')
+        double(_mode='params', params={'data': self.dataFile, 'output': outFile})
+        double(_mode='params', params={'data': self.dataFile, 'output': outFile})
+
+        records = self.records()
+        self.assertEqual(len(records), 2)
+        record = records[0]
+        self.assertEqual(record['task'], 'double')
+        self.assertEqual(record['status'], 'success')
+        self.assertEqual([p['phase'] for p in record['phases']], ['deserialize', 'validate', 'run', 'serialize'])
+        deserialize = record['phases'][0]
+        self.assertEqual(deserialize['input'], 'data')
+        self.assertEqual(deserialize['bytes'], os.path.getsize(self.dataFile))
+        self.assertEqual(deserialize['shape'], [3, 2])
+        serialize = record['phases'][3]
+        self.assertEqual(serialize['output'], 'output')
+        self.assertEqual(serialize['bytes'], os.path.getsize(outFile))
+        self.assertEqual(serialize['shape'], [3, 2])
+        for phase in record['phases']:
+            self.assertGreaterEqual(phase['wall'], 0)
+            self.assertGreaterEqual(phase['cpu'], 0)
+            self.assertGreaterEqual(phase['rss_growth'], 0)
+            self.assertLessEqual(phase['process_peak_rss'], record['process_peak_rss'])
+        self.assertGreater(record['process_peak_rss'], 0)
+        self.assertFalse(os.path.exists(self.profileDir))
+
+    def testLazyInput(self):
+        # A table read in chunks is parsed within the run, not when it is deserialized.
+        os.environ[METRICS_ENV] = self.metricsFile
+        concatenate(_mode='params', params={
+            'table1': self.dataFile, 'chunksize': 1, 'combined': os.path.join(self.tmpDir, 'out.csv')})
+        phases = dict((p['phase'], p) for p in self.records()[0]['phases'])
+        self.assertNotIn('parse_wall', phases['deserialize'])
+        self.assertGreater(phases['run']['parse_wall'] + phases['serialize']['parse_wall'], 0)
+
+    def testError(self):
+        os.environ[METRICS_ENV] = self.metricsFile
+        pd.DataFrame({'a': []}).to_csv(self.dataFile)
+        with self.assertRaises(Exception):
+            double(_mode='params', params={'data': self.dataFile, 'output': os.path.join(self.tmpDir, 'out.csv')})
+        record = self.records()[0]
+        self.assertEqual(record['status'], 'error')
+        self.assertEqual(record['phases'][-1]['phase'], 'run')
+
+    def testProfile(self):
+        os.environ[PROFILE_ENV] = self.profileDir
+        double(_mode='params', params={'data': self.dataFile, 'output': os.path.join(self.tmpDir, 'out.csv')})
+        profiles = os.listdir(self.profileDir)
+        self.assertEqual(len(profiles), 1)
+        self.assertTrue(profiles[0].startswith('double-'))
+        self.assertFalse(os.path.exists(self.metricsFile))
+
+    def testDisabled(self):
+        metrics = Metrics('double')
+        with metrics.phase('run', size=1) as info:
+            pass
+        self.assertEqual(info, {'size': 1})
+        self.assertEqual(metrics.phases, [])
@@ -0,0 +1,239 @@
+import bz2
+import gzip
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+from pysciencedock.io import CsvTable, TABLE_FORMATS, openCsv, readCsv, readInput, readTable, sniffFormat, writeJson, writeTable
+import pysciencedock.io as io
+import pysciencedock.statistics as st
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+def _writeZip(fileName, mode):
+    # A writer for the single member of a zip archive, like gzip.open.
+    class Writer(object):
+        def __enter__(self):
+            self.archive = zipfile.ZipFile(fileName, 'w', zipfile.ZIP_DEFLATED)
+            return self
+
+        def write(self, content):
+            self.archive.writestr(os.path.basename(fileName)[:-len('.zip')], content)
+
+        def __exit__(self, *args):
+            self.archive.close()
+    return Writer()
+
+class IoTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.csv = os.path.join(self.tmpDir, 'study.csv')
+        with open(self.csv, 'w') as f:
+            f.write('sample,group,a,b\ns1,x,1.0,2.0\ns2,y,3.0,4.0\ns3,x,5.0,6.0\n')
+        self.study = pd.DataFrame(
+            {'a': [1.0, 3.0, 5.0], 'b': [2.0, 4.0, 6.0]},
+            index=pd.MultiIndex.from_tuples(
+                [('s1', 'x'), ('s2', 'y'), ('s3', 'x')], names=['_sample', '_group']))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testReadCsv(self):
+        assert_frame_equal(readCsv(self.csv), self.study)
+
+    def testReadCsvCompressed(self):
+        with open(self.csv, 'rb') as f:
+            content = f.read()
+        openers = [('.gz', gzip.open), ('.bz2', bz2.BZ2File), ('.zip', _writeZip)]
+        if lzma is not None:
+            openers.append(('.xz', lzma.open))
+        for ext, opener in openers:
+            fileName = self.csv + ext
+            with opener(fileName, 'wb') as f:
+                f.write(content)
+            assert_frame_equal(readCsv(fileName), self.study)
+            assert_frame_equal(pd.concat(CsvTable(fileName).chunks(2)), self.study)
+            self.assertEqual(list(CsvTable(fileName).columns()), ['a', 'b'])
+
+    def testReadCsvQuotedNewline(self):
+        # The first row spans two lines, which must not confuse the sniffing.
+        with open(self.csv, 'w') as f:
+            f.write('sample,note,a\ns1,"two\nlines",1.0\ns2,one,2.0\n')
+        data = readCsv(self.csv)
+        self.assertEqual(data.index.names, ['_sample', '_note'])
+        self.assertEqual(list(data.columns), ['a'])
+        self.assertEqual(list(data.a), [1.0, 2.0])
+
+    def testColumnChunks(self):
+        study = pd.DataFrame(
+            np.arange(70.0).reshape(10, 7), columns=['c%d' % i for i in range(7)],
+            index=pd.MultiIndex.from_arrays([['s%d' % i for i in range(10)], ['x', 'y'] * 5], names=['_sample', '_group']))
+        fileName = os.path.join(self.tmpDir, 'wide.csv')
+        study.to_csv(fileName)
+        spillCells = io.SPILL_CELLS
+        # Few enough values per parse that the rows are read in chunks.
+        io.SPILL_CELLS = 20
+        try:
+            chunks = list(CsvTable(fileName).columnChunks(3))
+        finally:
+            io.SPILL_CELLS = spillCells
+        self.assertEqual([list(chunk.columns) for chunk in chunks], [['c0', 'c1', 'c2'], ['c3', 'c4', 'c5'], ['c6']])
+        assert_frame_equal(pd.concat(chunks, axis=1), study)
+
+    def testReadCsvCache(self):
+        cacheDir = os.path.join(self.tmpDir, 'cache')
+        assert_frame_equal(readCsv(self.csv, cacheDir=cacheDir), self.study)
+        self.assertEqual(len(os.listdir(cacheDir)), 1)
+        assert_frame_equal(readCsv(self.csv, cacheDir=cacheDir), self.study)
+        self.assertEqual(len(os.listdir(cacheDir)), 1)
+
+        # Changing the content must not hit the old entry.
+        with open(self.csv, 'a') as f:
+            f.write('s4,y,7.0,8.0\n')
+        self.assertEqual(len(readCsv(self.csv, cacheDir=cacheDir)), 4)
+        self.assertEqual(len(os.listdir(cacheDir)), 2)
+
+    def testReadCsvCacheEvict(self):
+        cacheDir = os.path.join(self.tmpDir, 'cache')
+        readCsv(self.csv, cacheDir=cacheDir)
+        old = os.path.join(cacheDir, os.listdir(cacheDir)[0])
+        # Room for about one table.
+        os.environ[io.CACHE_SIZE_ENV] = str(os.path.getsize(old) + 100)
+        try:
+            past = os.path.getmtime(old) - 60
+            os.utime(old, (past, past))
+            with open(self.csv, 'a') as f:
+                f.write('s4,y,7.0,8.0\n')
+            self.assertEqual(len(readCsv(self.csv, cacheDir=cacheDir)), 4)
+        finally:
+            del os.environ[io.CACHE_SIZE_ENV]
+        self.assertEqual(len(os.listdir(cacheDir)), 1)
+        self.assertFalse(os.path.exists(old))
+
+    def checkTableFormat(self, fmt):
+        fileName = os.path.join(self.tmpDir, 'study.' + fmt)
+        writeTable(self.study, fileName)
+        # Formats are recognized by content, not by name.
+        renamed = os.path.join(self.tmpDir, 'study-' + fmt)
+        os.rename(fileName, renamed)
+        self.assertEqual(sniffFormat(renamed), fmt)
+        assert_frame_equal(readTable(renamed), self.study)
+
+        # Chunks are written as one table.
+        writeTable((self.study.iloc[start:start + 2] for start in range(0, 3, 2)), fileName)
+        assert_frame_equal(readTable(fileName), self.study)
+
+        # Every task reads binary inputs and writes binary outputs by extension.
+        output = os.path.join(self.tmpDir, 'pvalues.' + fmt)
+        st.ttest(_mode='params', params={'data': renamed, 'pvalues': output})
+        self.assertEqual(sniffFormat(output), fmt)
+        expected = st.ttest(readCsv(self.csv))
+        assert_frame_equal(readTable(output), expected)
+
+    def testNpz(self):
+        self.checkTableFormat('npz')
+        series = pd.Series([0.5, 0.25], index=pd.Index([1, 2], name='_components'))
+        fileName = os.path.join(self.tmpDir, 'series.npz')
+        writeTable(series, fileName)
+        assert_frame_equal(readTable(fileName), pd.DataFrame({'0': [0.5, 0.25]}, index=series.index))
+
+    def testNpzMemoryMap(self):
+        fileName = os.path.join(self.tmpDir, 'study.npz')
+        for order, transposed in [('C', False), ('F', True)]:
+            writeTable(self.study, fileName, order=order)
+            data = readTable(fileName)
+            assert_frame_equal(data, self.study)
+            # The values are those of the file, in its order, and transposing
+            # a column-major table gives a row-major view.
+            base = data.values
+            while not isinstance(base, mmap.mmap):
+                base = base.base
+            self.assertEqual(data.values.T.flags.c_contiguous, transposed)
+            # Writes are not carried through to the file.
+            data.iloc[0, 0] = -1.0
+            assert_frame_equal(readTable(fileName), self.study)
+            self.assertFalse(isinstance(readTable(fileName, mmap=False).values.base, mmap.mmap))
+
+        # Compressed tables are read instead.
+        with np.load(fileName) as npz:
+            np.savez_compressed(fileName, **dict(npz))
+        assert_frame_equal(readTable(fileName), self.study)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def testParquet(self):
+        self.checkTableFormat('parquet')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def testFeather(self):
+        self.checkTableFormat('feather')
+
+    def testReadInput(self):
+        fileName = os.path.join(self.tmpDir, 'study.npz')
+        writeTable(self.study, fileName)
+        assert_frame_equal(readInput(fileName, readCsv), self.study)
+        assert_frame_equal(readInput(fileName, openCsv), self.study)
+
+        # The index columns of a CsvTable apply to the table as written.
+        flat = readInput(fileName, lambda name: CsvTable(name, indexCol=0))
+        self.assertEqual(flat.index.name, '_sample')
+        self.assertEqual(list(flat.columns), ['_group', 'a', 'b'])
+
+        # Other inputs get the file itself, as do zip files that are not tables.
+        self.assertEqual(readInput(fileName, lambda name: name), fileName)
+        archive = os.path.join(self.tmpDir, 'study.zip')
+        with zipfile.ZipFile(archive, 'w') as f:
+            f.write(self.csv, 'study.csv')
+        self.assertEqual(sniffFormat(archive), 'csv')
+        self.assertEqual(readInput(archive, lambda name: name), archive)
+
+    def testCsvFormat(self):
+        self.assertEqual(sniffFormat(self.csv), 'csv')
+        self.assertEqual(TABLE_FORMATS[0], 'csv')
+        fileName = os.path.join(self.tmpDir, 'copy.csv')
+        writeTable(self.study, fileName)
+        assert_frame_equal(readTable(fileName), self.study)
+
+    def testWriteJson(self):
+        fileName = os.path.join(self.tmpDir, 'study.json')
+        rows = [
+            {'_sample': 's1', '_group': 'x', 'a': 1.0, 'b': 2.0},
+            {'_sample': 's2', '_group': 'y', 'a': 3.0, 'b': 4.0},
+            {'_sample': 's3', '_group': 'x', 'a': 5.0, 'b': 6.0}
+        ]
+        chunks = lambda: CsvTable(self.csv).chunks(2)
+
+        writeJson(chunks(), fileName, 'records')
+        with open(fileName) as f:
+            self.assertEqual(json.load(f), rows)
+
+        writeJson(chunks(), fileName, 'lines', compression='gzip')
+        with gzip.open(fileName) as f:
+            self.assertEqual([json.loads(line) for line in f], rows)
+
+        writeJson(chunks(), fileName, 'split')
+        with open(fileName) as f:
+            self.assertEqual(json.load(f), {
+                'columns': ['_sample', '_group', 'a', 'b'],
+                'data': [[row[col] for col in ['_sample', '_group', 'a', 'b']] for row in rows]})
+
+        writeJson(self.study, fileName)
+        with open(fileName) as f:
+            self.assertEqual(f.read(), self.study.to_json())
+
+        writeJson(iter([]), fileName, 'records')
+        with open(fileName) as f:
+            self.assertEqual(json.load(f), [])
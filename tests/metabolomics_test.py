@@ -1,8 +1,15 @@
+import inspect
+import itertools
+import os
+import shutil
+import tempfile
 import unittest
 import pandas as pd
 import numpy as np
 from pandas.util.testing import assert_frame_equal
 import pysciencedock.metabolomics as mb
+from pysciencedock.io import CsvTable, loadTable, writeTable
+from pysciencedock.sketch import RowReservoir
 
 class MetabolomicsTest(unittest.TestCase):
     def setUp(self):
@@ -85,3 +92,89 @@ class MetabolomicsTest(unittest.TestCase):
 
         output = mb.normalize(self.study, scaling='range')
         assert_frame_equal(output, self.range)
+
+    def testNormalizeFloat32(self):
+        output = mb.normalize(self.study, normalization='sum', transformation='log', scaling='auto', dtype='float32')
+        expected = mb.normalize(self.study, normalization='sum', transformation='log', scaling='auto')
+        self.assertTrue((output.dtypes == np.float32).all())
+        assert_frame_equal(output, expected.astype(np.float32))
+        assert_frame_equal(self.study, pd.DataFrame({'a': [1, 2, 3], 'b': [2, 4, 6], 'c': [3, 6, 9]}))
+
+    def testNormalizeChunks(self):
+        random = np.random.RandomState(0)
+        study = pd.DataFrame(
+            random.lognormal(3, 1, (50, 4)),
+            columns=['a', 'b', 'c', 'd'],
+            index=pd.MultiIndex.from_arrays([range(50), [i % 3 for i in range(50)]], names=['sample', 'group']))
+        study.iloc[3, 1] = np.nan
+        # A negative column sum rules out deriving the scaling statistics in one pass.
+        study['d'] = -study['d']
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tmpDir, 'study.csv')
+            study.to_csv(fileName)
+            table = CsvTable(fileName, indexCol=[0, 1])
+            for normalization, transformation, scaling in itertools.product(
+                    ['none', 'sum', 'median'], ['none', 'log', 'cube root'], ['none', 'mean', 'auto', 'range']):
+                expected = mb.normalize(table, normalization=normalization, transformation=transformation, scaling=scaling)
+                output = mb.normalize(
+                    table, normalization=normalization, transformation=transformation, scaling=scaling, chunksize=7)
+                assert_frame_equal(output, expected)
+
+            # Written output is streamed in chunks to the same result.
+            outFile = os.path.join(tmpDir, 'normalized.csv')
+            mb.normalize(_mode='params', params={
+                'data': fileName, 'normalization': 'sum', 'scaling': 'auto', 'chunksize': '7', 'output': outFile})
+            expected = mb.normalize(table, normalization='sum', scaling='auto', chunksize=7)
+            assert_frame_equal(pd.read_csv(outFile, index_col=[0, 1]), expected)
+            self.assertTrue(inspect.isgenerator(mb.normalize(
+                _mode='stream', data=table, normalization='sum', chunksize=7)))
+
+            # A binary table keeps the two index columns normalize reads.
+            npzFile = os.path.join(tmpDir, 'study.npz')
+            writeTable(pd.read_csv(fileName, index_col=[0, 1]), npzFile)
+            mb.normalize(_mode='params', params={'data': npzFile, 'normalization': 'sum', 'scaling': 'auto', 'output': outFile})
+            assert_frame_equal(pd.read_csv(outFile, index_col=[0, 1]), expected, check_names=False)
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def testReservoirCells(self):
+        # A wide table is sampled in fewer rows, bounding the values kept.
+        reservoir = RowReservoir(1024, maxCells=100)
+        for start in range(0, 500, 50):
+            reservoir.update(np.arange(start, start + 50, dtype=float)[:, np.newaxis] * np.ones(10))
+        self.assertEqual(reservoir.values().shape, (10, 10))
+        self.assertEqual(reservoir.seen, 500)
+        self.assertTrue(np.all((reservoir.median() >= 0) & (reservoir.median() < 500)))
+
+    def testHarmonize(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            path = lambda name: os.path.join(tmpDir, name)
+            with open(path('broad_metadata.csv'), 'w') as f:
+                f.write('HMDB_ID,SAS_NAME\nHMDB01,alanine\nHMDB02,_glycine\nHMDB03,serine\nX,unused\n')
+            with open(path('metabolon_metadata.csv'), 'w') as f:
+                f.write('HMDB_ID,SAS_NAME\nHMDB02,M2\nHMDB01,M1\nHMDB09,M9\n')
+            with open(path('broad.csv'), 'w') as f:
+                f.write(',ALANINE,X_GLYCINE,SERINE\nb1,1.0,,5\nb2,3.0,4.0,6\nb3,,2.0,7\n')
+            with open(path('metabolon.csv'), 'w') as f:
+                f.write(',M1,M2,M9\nm1,0,8,1\nm2,2,,1\n')
+
+            output = mb.harmonize(datasets=path('*[dn].csv'), metadata=path('*_metadata.csv'))
+            writeTable(pd.read_csv(path('metabolon.csv'), index_col=0), path('metabolon.npz'))
+            assert_frame_equal(mb.harmonize(
+                datasets=[path('broad.csv'), path('metabolon.npz')],
+                metadata=path('*_metadata.csv'), platforms='broad,metabolon'), output, check_index_type=False)
+            assert_frame_equal(mb.harmonize(
+                datasets=[path('broad.csv'), path('metabolon.csv')],
+                metadata=[path('broad_metadata.csv'), path('metabolon_metadata.csv')]), output)
+        finally:
+            shutil.rmtree(tmpDir)
+
+        broad = pd.DataFrame({'HMDB01': [1.0, 3.0, 0.5], 'HMDB02': [1.0, 4.0, 2.0]}, index=['b1', 'b2', 'b3'])
+        metabolon = pd.DataFrame({'HMDB01': [0.0, 2.0], 'HMDB02': [8.0, 4.0]}, index=['m1', 'm2'])
+        expected = pd.concat([broad / broad.median(), metabolon / metabolon.median()])
+        expected.index = pd.MultiIndex.from_arrays(
+            [expected.index, ['broad'] * 3 + ['metabolon'] * 2], names=['_sample', '_platform'])
+        assert_frame_equal(output, expected)
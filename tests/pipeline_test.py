@@ -0,0 +1,70 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+import pysciencedock.metabolomics as mb
+import pysciencedock.statistics as st
+from pysciencedock.io import readTable, sniffFormat
+from pysciencedock.pipeline import Pipeline, ref
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.study = pd.DataFrame(
+            {'a': [1.0, 2.0, 5.0, 6.0], 'b': [2.0, 3.0, 1.0, 2.0]},
+            index=pd.MultiIndex.from_tuples(
+                [('s1', 'x'), ('s2', 'x'), ('s3', 'y'), ('s4', 'y')], names=['_sample', '_group']))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testRun(self):
+        output = os.path.join(self.tmpDir, 'pvalues.csv')
+        written = Pipeline() \
+            .step('stats', 'ttest', {'data': ref('norm')}, {'pvalues': output}) \
+            .step('norm', 'normalize', {'data': self.study, 'normalization': 'sum'}) \
+            .run()
+        self.assertEqual(written, {'norm': {}, 'stats': {'pvalues': output}})
+        expected = st.ttest(mb.normalize(self.study, normalization='sum'))
+        assert_frame_equal(pd.read_csv(output, index_col=0), expected)
+
+    def testValidate(self):
+        pipeline = Pipeline().step('stats', 'ttest', {'data': ref('norm', 'missing')})
+        pipeline.step('norm', 'normalize', {'data': self.study})
+        with self.assertRaisesRegexp(Exception, 'has no output "missing"'):
+            pipeline.validate()
+
+        pipeline = Pipeline() \
+            .step('a', 'ttest', {'data': ref('b')}) \
+            .step('b', 'normalize', {'data': ref('a')})
+        with self.assertRaisesRegexp(Exception, 'cycle'):
+            pipeline.validate()
+
+        with self.assertRaisesRegexp(Exception, 'input "data" is required'):
+            Pipeline().step('stats', 'ttest').validate()
+
+    def testWrittenAndPassedOn(self):
+        # An output also passed to another step is written as if streamed.
+        output = os.path.join(self.tmpDir, 'study.jsonl.gz')
+        pvalues = os.path.join(self.tmpDir, 'pvalues.csv')
+        Pipeline() \
+            .step('json', 'csv_to_json', {'data': self.study, 'orient': 'lines', 'compression': 'gzip'}, {'output': output}) \
+            .step('stats', 'ttest', {'data': ref('json')}, {'pvalues': pvalues}) \
+            .run()
+        with gzip.open(output) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['_sample'] for row in rows], ['s1', 's2', 's3', 's4'])
+        assert_frame_equal(pd.read_csv(pvalues, index_col=0), st.ttest(self.study))
+
+    def testConvertPassedOn(self):
+        output = os.path.join(self.tmpDir, 'study')
+        Pipeline() \
+            .step('convert', 'convert', {'data': self.study, 'format': 'npz', 'order': 'F'}, {'output': output}) \
+            .step('stats', 'ttest', {'data': ref('convert')}) \
+            .run()
+        self.assertEqual(sniffFormat(output), 'npz')
+        self.assertTrue(readTable(output).values.flags['F_CONTIGUOUS'])
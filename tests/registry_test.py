@@ -0,0 +1,24 @@
+import json
+import unittest
+from pysciencedock import registry
+
+class RegistryTest(unittest.TestCase):
+    def testManifestUpToDate(self):
+        with open(registry.MANIFEST_PATH) as f:
+            manifest = json.load(f)
+        built = json.loads(json.dumps(registry.buildManifest()))
+        self.assertEqual(manifest, built,
+            'tasks.json is stale, run "python -m pysciencedock --build-manifest"')
+
+    def testGetTask(self):
+        task = registry.getTask('ttest')
+        self.assertEqual(task.__name__, 'ttest')
+        self.assertIsNone(registry.getTask('missing'))
+
+    def testDeferredImports(self):
+        # Libraries that tasks import only when called are listed for warming up.
+        imports = dict((entry['name'], entry['imports']) for entry in registry.loadManifest())
+        self.assertIn('sklearn.decomposition', imports['pca'])
+        self.assertIn('scipy.special', imports['ttest'])
+        self.assertIn('scipy.cluster.hierarchy', imports['heatmap'])
+        self.assertNotIn('sklearn.decomposition', imports['ttest'])
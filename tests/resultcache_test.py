@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pysciencedock.describe import describe, Description
+from pysciencedock.resultcache import RESULT_CACHE_ENV, ResultCache, getResultCache
+from pysciencedock.io import sniffFormat
+from pysciencedock.server import runRequest
+from pysciencedock.statistics import ttest
+from pysciencedock.transform import concatenate
+
+calls = []
+
+
+@describe(
+    Description('Repeat', 'Repeats the contents of a file.', dockerImage='kitware/pysciencedock')
+        .input('data', 'The file', type='file', deserialize=lambda fileName: open(fileName).read())
+        .input('times', 'The number of repeats', type='integer', default=2, required=False)
+        .output('output', 'The repeated contents', type='new-file', serialize=lambda text, fileName: open(fileName, 'w').write(text))
+)
+def repeat(data, times):
+    calls.append(times)
+    return data * times
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmpDir, 'cache')
+        os.environ[RESULT_CACHE_ENV] = self.cacheDir
+        del calls[:]
+
+    def tearDown(self):
+        del os.environ[RESULT_CACHE_ENV]
+        shutil.rmtree(self.tmpDir)
+
+    def path(self, name, content=None):
+        path = os.path.join(self.tmpDir, name)
+        if content is not None:
+            with open(path, 'w') as f:
+                f.write(content)
+        return path
+
+    def read(self, name):
+        with open(self.path(name)) as f:
+            return f.read()
+
+    def testMemoize(self):
+        cache = getResultCache()
+        repeat(_mode='params', params={'data': self.path('a.txt', 'ab'), 'output': self.path('out1')})
+        result = repeat(_mode='params', params={'data': self.path('a.txt'), 'output': self.path('out2'), 'times': '2'})
+        self.assertEqual(result, {'output': self.path('out2')})
+        self.assertEqual(self.read('out2'), 'abab')
+        self.assertEqual(calls, [2])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # The key is the content of the input, not its name.
+        repeat(_mode='params', params={'data': self.path('b.txt', 'ab'), 'output': self.path('out3')})
+        self.assertEqual(calls, [2])
+        repeat(_mode='params', params={'data': self.path('b.txt', 'cd'), 'output': self.path('out4')})
+        repeat(_mode='params', params={'data': self.path('b.txt'), 'output': self.path('out5'), 'times': 3})
+        self.assertEqual(calls, [2, 2, 3])
+        self.assertEqual(self.read('out5'), 'cdcdcd')
+        self.assertEqual(cache.stats()['entries'], 3)
+
+    def testStatsAcrossProcesses(self):
+        # The counts are kept in the directory, so a later process sees them.
+        repeat(_mode='params', params={'data': self.path('a.txt', 'ab'), 'output': self.path('out1')})
+        repeat(_mode='params', params={'data': self.path('a.txt'), 'output': self.path('out2')})
+        stats = ResultCache(self.cacheDir).stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 1, 0))
+        self.assertEqual(stats['entries'], 1)
+
+    def testEvict(self):
+        cache = ResultCache(self.cacheDir, maxBytes=30)
+        cache.put('old', {'output': self.path('old', '123456')}, {})
+        past = time.time() - 60
+        os.utime(os.path.join(self.cacheDir, 'old'), (past, past))
+        self.assertEqual(cache.stats()['entries'], 1)
+        cache.put('new', {'output': self.path('new', '123456')}, {})
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertIsNone(cache.get('old', {'output': self.path('copy')}))
+        self.assertEqual(cache.get('new', {'output': self.path('copy')}), {})
+        self.assertEqual(self.read('copy'), '123456')
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(ResultCache(self.cacheDir).stats()['evictions'], 1)
+
+    def testServerReportsHits(self):
+        csv = self.path('study.csv', 'sample,group,a,b\ns1,x,1,2\ns2,x,2,3\ns3,y,5,1\ns4,y,6,2\n')
+        request = {'task': 'ttest', 'params': {'data': csv, 'pvalues': self.path('pvalues.csv')}}
+        self.assertEqual(runRequest(request)['cache'], 'miss')
+        self.assertEqual(runRequest(request)['cache'], 'hit')
+
+    def testPathInputs(self):
+        # Files named by a string input are keyed by their content too.
+        self.path('part1.csv', 'sample,a\ns1,1\n')
+        self.path('part2.csv', 'sample,a\ns2,2\n')
+        params = {'table1': self.path('part1.csv'), 'tables': self.path('part[2].csv'), 'combined': self.path('out.csv')}
+        concatenate(_mode='params', params=params)
+        self.path('part2.csv', 'sample,a\ns2,3\n')
+        concatenate(_mode='params', params=params)
+        self.assertEqual(self.read('out.csv'), '_sample,a\ns1,1\ns2,3\n')
+        self.assertEqual((getResultCache().hits, getResultCache().misses), (0, 2))
+
+    def testOutputFormats(self):
+        # The same run written in another format is not a hit.
+        csv = self.path('study.csv', 'sample,group,a,b\ns1,x,1,2\ns2,x,2,3\ns3,y,5,1\ns4,y,6,2\n')
+        ttest(_mode='params', params={'data': csv, 'pvalues': self.path('pvalues.csv')})
+        ttest(_mode='params', params={'data': csv, 'pvalues': self.path('pvalues.npz')})
+        self.assertEqual(sniffFormat(self.path('pvalues.npz')), 'npz')
+        self.assertEqual((getResultCache().hits, getResultCache().misses), (0, 2))
@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+import six
+from pysciencedock.server import runRequest, serveStream
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.csv = os.path.join(self.tmpDir, 'study.csv')
+        with open(self.csv, 'w') as f:
+            f.write('sample,group,a,b\ns1,x,1,2\ns2,x,2,3\ns3,y,5,1\ns4,y,6,2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testRunRequest(self):
+        output = os.path.join(self.tmpDir, 'pvalues.csv')
+        response = runRequest({'id': 1, 'task': 'ttest', 'params': {'data': self.csv, 'pvalues': output}})
+        self.assertEqual(response['status'], 'success')
+        self.assertEqual(response['id'], 1)
+        self.assertEqual(response['result'], {'pvalues': output})
+        self.assertEqual(list(pd.read_csv(output, index_col=0).columns), ['t', 'p', '-log10(p)'])
+
+    def testRunRequestError(self):
+        response = runRequest({'id': 2, 'task': 'missing'})
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(response['error'], 'Task "missing" not found.')
+
+    def testServeStream(self):
+        pool = multiprocessing.Pool(1)
+        try:
+            # A client that has gone away does not stop responses to the next.
+            requests = json.dumps({'id': 1, 'task': 'missing'}) + '\n'
+            serveStream(pool, six.StringIO(requests), _BrokenStream())
+            output = six.StringIO()
+            serveStream(pool, six.StringIO(requests + 'not json\n'), output)
+        finally:
+            pool.close()
+            pool.join()
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(sorted((r['id'], r['status']) for r in responses), [(None, 'error'), (1, 'error')])
+
+
+class _BrokenStream(object):
+    def write(self, text):
+        raise IOError(32, 'Broken pipe')
+
+    def flush(self):
+        pass
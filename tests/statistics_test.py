@@ -0,0 +1,293 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from pandas.util.testing import assert_frame_equal, assert_series_equal
+from scipy.cluster.hierarchy import is_monotonic, is_valid_linkage, leaves_list, linkage
+from scipy.spatial.distance import pdist, squareform
+from scipy.stats import f_oneway, ttest_ind
+import pysciencedock.statistics as st
+from pysciencedock.io import CsvTable
+from pysciencedock.statistics.clustering import computeLinkage
+from pysciencedock.statistics.correction import adjustPValues
+from pysciencedock.statistics.groupstats import GroupMoments
+from pysciencedock.statistics.heatmap import readHeatmap, writeHeatmap
+
+class StatisticsTest(unittest.TestCase):
+    def setUp(self):
+        random = np.random.RandomState(0)
+        groups = ['b' if i % 3 else 'a' for i in range(40)]
+        self.study = pd.DataFrame(
+            random.lognormal(10, 1, (40, 6)),
+            columns=['m%d' % i for i in range(6)],
+            index=pd.MultiIndex.from_arrays([range(40), groups], names=['_sample', '_group']))
+        self.study.iloc[3, 4] = np.nan
+        self.dataA = self.study.xs('a', level=1)
+        self.dataB = self.study.xs('b', level=1)
+
+    def testGroupMomentsChunks(self):
+        whole = GroupMoments.fromFrame(self.study)
+        chunked = GroupMoments(self.study.columns)
+        for start in range(0, 40, 7):
+            chunked.update(self.study.iloc[start:start + 7])
+        np.testing.assert_allclose(chunked.sorted().mean(), whole.sorted().mean())
+        np.testing.assert_allclose(chunked.sorted().squaredDeviations(), whole.sorted().squaredDeviations())
+
+    def testTtest(self):
+        statistic, pvalues = ttest_ind(self.dataA, self.dataB)
+        output = st.ttest(self.study)
+        assert_series_equal(output['t'], pd.Series(statistic, index=self.study.columns, name='t'))
+        assert_series_equal(output['p'], pd.Series(pvalues, index=self.study.columns, name='p'))
+        self.assertTrue(np.isnan(output['p']['m4']))
+
+    def testVolcano(self):
+        change = self.dataB.mean() / self.dataA.mean()
+        output = st.volcano(self.study)
+        assert_series_equal(output['foldchange'], change, check_names=False)
+        assert_series_equal(output['log2(foldchange)'], np.log2(change), check_names=False)
+
+    def testTwoGroup(self):
+        output = st.twogroup(self.study)
+        self.assertEqual(list(output.columns), [
+            't', 'p', '-log10(p)', 'mean(a)', 'mean(b)', 'foldchange', 'log2(foldchange)'])
+        assert_series_equal(output['mean(a)'], self.dataA.mean(), check_names=False)
+
+    def testAnova(self):
+        study = self.study.copy()
+        study.index = pd.MultiIndex.from_arrays(
+            [range(40), ['g%d' % (i % 3) for i in range(40)]], names=['_sample', '_group'])
+        expected = pd.DataFrame(
+            [f_oneway(*[v for k, v in study[col].groupby(level=1)]) for col in study.columns],
+            columns=['f', 'p'],
+            index=study.columns)
+        assert_frame_equal(st.anova(study), expected)
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tmpDir, 'study.csv')
+            study.to_csv(fileName)
+            assert_frame_equal(st.anova(CsvTable(fileName), chunksize=7), expected)
+        finally:
+            shutil.rmtree(tmpDir)
+
+        with self.assertRaisesRegexp(Exception, 'three or more values'):
+            st.anova(self.study)
+        with self.assertRaisesRegexp(Exception, 'at least one row'):
+            st.anova(self.study.iloc[:0])
+        with self.assertRaisesRegexp(Exception, 'at least one row'):
+            st.anova(chunk for chunk in [])
+
+    def testLinkageBackends(self):
+        values = np.random.RandomState(1).randn(200, 5)
+        for method, metric in [('single', 'euclidean'), ('single', 'correlation'), ('ward', 'euclidean')]:
+            np.testing.assert_allclose(
+                computeLinkage(values, method=method, metric=metric, backend='memory'),
+                linkage(values, method=method, metric=metric))
+
+        distances = squareform(pdist(values))
+        np.testing.assert_allclose(
+            computeLinkage(distances=distances, method='single', backend='memory'), linkage(values, 'single'))
+        np.testing.assert_allclose(
+            computeLinkage(distances=distances, method='average'), linkage(values, 'average'))
+
+        values = np.random.RandomState(2).randn(2500, 3)
+        links = computeLinkage(values, method='average', backend='approximate')
+        self.assertTrue(is_valid_linkage(links))
+        self.assertTrue(is_monotonic(links))
+        self.assertEqual(links[-1, 3], 2500)
+
+    def testHeatmapSymmetric(self):
+        corr = self.study.corr()
+        output = st.heatmap(corr, method='average', metric='correlation')
+        rows = output.iloc[:6, 6:].values
+        cols = output.iloc[6:, :6].values.T
+        np.testing.assert_allclose(rows[1:], cols[1:])
+
+        output = st.hierarchy(corr, method='average', data_type='correlation')
+        expected = linkage(squareform(1 - corr.values, checks=False), 'average')
+        np.testing.assert_allclose(output.values, expected)
+
+    def testHeatmapBinary(self):
+        data = self.study.fillna(1.0)
+        tmpDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tmpDir, 'heatmap.bin')
+            writeHeatmap(st.heatmap(data, method='average', format='binary'), fileName)
+            header, values = readHeatmap(fileName)
+            rows = leaves_list(linkage(data.values, 'average'))
+            cols = leaves_list(linkage(data.values.T, 'average'))
+            self.assertEqual(header['rows']['leaves'], rows.tolist())
+            self.assertEqual(header['rows']['labels'][0], list(data.index[0]))
+            self.assertEqual(header['columns']['names'], [None])
+            np.testing.assert_allclose(values, data.values[np.ix_(rows, cols)], rtol=1e-6)
+
+            writeHeatmap(st.corrheatmap(data, format='binary', max_size=4), fileName)
+            header, values = readHeatmap(fileName)
+            self.assertEqual(values.shape, (4, 4))
+            self.assertEqual(header['rows']['bins'], [0, 1, 3, 4])
+            del values
+
+            # Missing labels are null, as browsers reject NaN in JSON.
+            data.index = pd.MultiIndex.from_arrays([[np.nan] + list(range(1, 40)), data.index.get_level_values(1)])
+            writeHeatmap(st.heatmap(data, method='average', format='binary'), fileName)
+            with open(fileName, 'rb') as f:
+                self.assertNotIn(b'NaN', f.read(4096))
+            self.assertIsNone(readHeatmap(fileName)[0]['rows']['labels'][0][0])
+
+            with self.assertRaisesRegexp(Exception, 'only to the binary'):
+                st.heatmap(data, method='average', max_size=4)
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def testCorrelation(self):
+        study = self.study.fillna(1.0)
+        for method in ['pearson', 'spearman', 'kendall']:
+            for processes in [1, 2]:
+                output = st.correlation(study, method=method, processes=processes)
+                np.testing.assert_allclose(output.values, study.corr(method=method).values)
+        # Missing values are skipped pair by pair, with ties among the ranks.
+        study = (self.study / 10000).round()
+        for method in ['pearson', 'spearman']:
+            for processes in [1, 2]:
+                output = st.correlation(study, method=method, processes=processes)
+                np.testing.assert_allclose(output.values, study.corr(method=method).values)
+        study = self.study.fillna(1.0)
+
+        corr = study.corr()
+        output = st.correlation(study, layout='sparse', threshold=0.2)
+        expected = [(a, b) for i, a in enumerate(corr.columns) for b in corr.columns[i + 1:] if abs(corr[a][b]) >= 0.2]
+        self.assertEqual(list(output.index), expected)
+        self.assertEqual(len(st.correlation(study, layout='upper')), 15)
+
+    def testKmeans(self):
+        from sklearn.cluster import KMeans
+
+        random = np.random.RandomState(3)
+        centers = np.array([[0, 0], [10, 0], [0, 10]])
+        data = pd.DataFrame(
+            np.repeat(centers, 30, axis=0) + random.randn(90, 2),
+            columns=['x', 'y'],
+            index=pd.Index(['s%d' % i for i in range(90)], name='_sample'))
+
+        output = st.kmeans(data, num_clusters=3)
+        expected = KMeans(n_clusters=3, random_state=0).fit(data.values)
+        self.assertEqual(list(output['clusters'].columns), ['cluster'])
+        np.testing.assert_array_equal(output['clusters']['cluster'].values, expected.labels_)
+        np.testing.assert_allclose(output['sweep']['inertia'].values, [expected.inertia_])
+
+        output = st.kmeans(data, num_clusters=2, max_clusters=5, processes=2)
+        self.assertEqual(list(output['sweep'].index), [2, 3, 4, 5])
+        self.assertEqual(output['sweep']['silhouette'].idxmax(), 3)
+        self.assertEqual(len(output['cluster_centers']), 3)
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tmpDir, 'data.csv')
+            data.to_csv(fileName)
+            output = st.kmeans(
+                CsvTable(fileName), num_clusters=2, max_clusters=4, algorithm='minibatch', batch_size=20, chunksize=25)
+            with self.assertRaisesRegexp(Exception, 'requires the minibatch algorithm'):
+                st.kmeans(CsvTable(fileName), num_clusters=2, chunksize=25)
+        finally:
+            shutil.rmtree(tmpDir)
+        self.assertEqual(output['sweep']['silhouette'].idxmax(), 3)
+        self.assertEqual(len(output['clusters']), 90)
+        self.assertEqual(output['clusters']['cluster'].nunique(), 3)
+
+    def testPcaSolvers(self):
+        from sklearn.decomposition import PCA
+
+        random = np.random.RandomState(4)
+        data = pd.DataFrame(
+            random.randn(20, 3).dot(np.diag([8, 4, 2])).dot(random.randn(3, 300)) + 0.01 * random.randn(20, 300),
+            columns=['m%d' % i for i in range(300)],
+            index=pd.Index(['s%d' % i for i in range(20)], name='_sample'))
+        expected = PCA(n_components=3, svd_solver='full').fit(data.transpose())
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(tmpDir, 'data.csv')
+            data.to_csv(fileName)
+            outputs = [st.pca(data, 3, solver=solver, chunksize=70) for solver in ['full', 'randomized', 'incremental']]
+            outputs.append(st.pca(CsvTable(fileName), 3, solver='incremental', chunksize=70))
+        finally:
+            shutil.rmtree(tmpDir)
+
+        for output in outputs:
+            np.testing.assert_allclose(output['explained'].values, expected.explained_variance_ratio_, atol=1e-4)
+            np.testing.assert_allclose(
+                np.abs(output['components'].values), np.abs(expected.components_.T), atol=1e-2)
+            self.assertEqual(list(output['components'].index), list(data.index))
+
+    def testPlsdaValidation(self):
+        random = np.random.RandomState(5)
+        values = random.randn(40, 12)
+        values[1::2, :3] += 1.5
+        data = pd.DataFrame(
+            values,
+            columns=['m%d' % i for i in range(12)],
+            index=pd.MultiIndex.from_arrays([range(40), ['a', 'b'] * 20], names=['_sample', '_group']))
+
+        output = st.plsda(data, num_components=3)
+        self.assertEqual(output['loadings'].shape, (12, 3))
+        self.assertEqual(len(output['validation']), 0)
+
+        serial = st.plsda(data, num_components=3, folds=4, permutations=9)
+        parallel = st.plsda(data, num_components=3, folds=4, permutations=9, processes=2)
+        assert_frame_equal(serial['validation'], parallel['validation'])
+        assert_frame_equal(serial['permutation'], parallel['permutation'])
+        self.assertEqual(list(serial['validation'].index), [1, 2, 3])
+        self.assertEqual(serial['loadings'].shape[1], serial['validation']['q2'].idxmax())
+        self.assertAlmostEqual(serial['permutation']['p']['q2'], 0.1)
+        self.assertEqual(len(serial['timing']), 40)
+        self.assertEqual(set(serial['vip']['vip'].nlargest(3).index), set(['m0', 'm1', 'm2']))
+
+    def testCorrection(self):
+        pvalues = [0.04, 0.001, np.nan, 0.03, 0.5]
+        np.testing.assert_allclose(adjustPValues(pvalues, 'bh'), [0.16 / 3, 0.004, np.nan, 0.16 / 3, 0.5])
+        np.testing.assert_allclose(adjustPValues(pvalues, 'by'), [0.16 / 3 * 25 / 12, 0.004 * 25 / 12, np.nan, 0.16 / 3 * 25 / 12, 1])
+        np.testing.assert_allclose(adjustPValues(pvalues, 'bonferroni'), [0.16, 0.004, np.nan, 0.12, 1])
+        np.testing.assert_allclose(adjustPValues(pvalues, 'holm'), [0.09, 0.004, np.nan, 0.09, 0.5])
+        # Only p-values above 0.5, not 0.5 itself, count towards the null proportion of 0.4.
+        pvalues = [0.04, 0.001, np.nan, 0.03, 0.5, 0.8]
+        np.testing.assert_allclose(adjustPValues(pvalues, 'qvalue'), [0.08 / 3, 0.002, np.nan, 0.08 / 3, 0.25, 0.32])
+
+        output = st.ttest(self.study, correction='bonferroni', alpha=0.5)
+        adjusted = np.minimum(st.ttest(self.study)['p'] * 5, 1)
+        self.assertEqual(list(output.index), list(adjusted[adjusted <= 0.5].index))
+        assert_series_equal(output['adjusted p'], adjusted[adjusted <= 0.5], check_names=False)
+        assert_frame_equal(st.multitest(st.ttest(self.study), correction='bonferroni', alpha=0.5), output)
+
+    def testMultitestParams(self):
+        tmpDir = tempfile.mkdtemp()
+        try:
+            data = os.path.join(tmpDir, 'ttest.csv')
+            output = os.path.join(tmpDir, 'significant.csv')
+            st.ttest(self.study).to_csv(data)
+            st.multitest(_mode='params', params={
+                'data': data, 'column': 'p', 'correction': 'bonferroni', 'alpha': '0.5', 'significant': output})
+            expected = st.multitest(pd.read_csv(data, index_col=0), correction='bonferroni', alpha=0.5)
+            assert_frame_equal(pd.read_csv(output, index_col=0), expected)
+        finally:
+            shutil.rmtree(tmpDir)
+
+    def testFoldChange(self):
+        change = self.dataB.mean() / self.dataA.mean()
+        expected = change[(change > 1.2) | (change < 1 / 1.2)].sort_values(ascending=False)
+        output = st.foldchange(self.study, threshold=1.2)
+        assert_series_equal(output['Fold change'], expected, check_names=False)
+
+        study = self.study.copy()
+        study.index = pd.MultiIndex.from_arrays(
+            [range(40), ['g%d' % (i % 3) for i in range(40)]], names=['_sample', '_group'])
+        means = study.groupby(level=1).mean()
+        output = st.foldchange(study, threshold=0)
+        self.assertEqual(sorted(set(zip(output.index.get_level_values(0), output.index.get_level_values(1)))),
+                         [('g1', 'g0'), ('g2', 'g0'), ('g2', 'g1')])
+        self.assertAlmostEqual(output.loc[('g2', 'g1', 'm0'), 'Fold change'], means['m0']['g2'] / means['m0']['g1'])
+
+        output = st.foldchange(study, threshold=0, comparison='reference', reference='g2')
+        self.assertEqual(sorted(set(output.index.get_level_values(1))), ['g2'])
+        self.assertEqual(len(output), 12)
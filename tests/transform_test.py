@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from pandas.util.testing import assert_frame_equal
+import pysciencedock.transform as tr
+from pysciencedock.io import CsvTable, expandPaths, loadTable, readTable, sniffFormat, writeTable
+import pysciencedock.statistics as st
+
+class TransformTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.plates = []
+        for i in range(4):
+            plate = pd.DataFrame(
+                {'m%d' % (i % 3): [float(i), i + 0.5], 'm9': [1.0, 2.0]},
+                index=pd.MultiIndex.from_tuples(
+                    [('p%ds1' % i, 'a'), ('p%ds2' % i, 'b')], names=['_sample', '_group']))
+            plate.to_csv(os.path.join(self.tmpDir, 'plate%d.csv' % i))
+            self.plates.append(plate)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def testExpandPaths(self):
+        path = lambda name: os.path.join(self.tmpDir, name)
+        with open(path('list.txt'), 'w') as f:
+            f.write('# plates\nplate3.csv\n\nplate0.csv\n')
+        self.assertEqual(
+            expandPaths([path('plate[12].csv'), '@' + path('list.txt')]),
+            [path('plate1.csv'), path('plate2.csv'), path('plate3.csv'), path('plate0.csv')])
+        with self.assertRaisesRegexp(Exception, 'No files match'):
+            expandPaths([path('missing*.csv')])
+
+    def testConcatenate(self):
+        tables = [CsvTable(os.path.join(self.tmpDir, 'plate%d.csv' % i)) for i in range(4)]
+        expected = pd.concat([plate for plate in self.plates], sort=True)
+
+        assert_frame_equal(tr.concatenate(tables[0], tables[1]), pd.concat(self.plates[:2], sort=True))
+        assert_frame_equal(tr.concatenate(tables[0], tables=os.path.join(self.tmpDir, 'plate[123].csv')), expected)
+        for processes in [1, 2]:
+            assert_frame_equal(tr.concatenate(tables[0], tables=tables[1:], chunksize=1, processes=processes), expected)
+            output = os.path.join(self.tmpDir, 'combined%d.csv' % processes)
+            tr.concatenate(_mode='params', params={
+                'table1': tables[0].fileName, 'tables': os.path.join(self.tmpDir, 'plate[123].csv'),
+                'chunksize': 1, 'processes': processes, 'combined': output})
+            assert_frame_equal(readTable(output), expected)
+
+        # A string column in only some tables stays strings when streamed.
+        labeled = self.plates[1].assign(label=['x', 'y'], count=[1, 2])
+        labeledFile = os.path.join(self.tmpDir, 'labeled.csv')
+        labeled.to_csv(labeledFile)
+        expected = pd.concat([self.plates[0], labeled], sort=True)
+        assert_frame_equal(tr.concatenate(tables[0], CsvTable(labeledFile)), expected)
+        assert_frame_equal(tr.concatenate(tables[0], CsvTable(labeledFile), chunksize=1), expected)
+
+        # Tables in binary formats are read as they are given to table inputs.
+        binary = os.path.join(self.tmpDir, 'plate1.npz')
+        writeTable(self.plates[1], binary)
+        assert_frame_equal(tr.concatenate(tables[0], tables=binary), pd.concat(self.plates[:2], sort=True),
+                           check_index_type=False, check_column_type=False)
+
+        # A file name is taken whole, commas and all.
+        named = os.path.join(self.tmpDir, 'plate,1.csv')
+        shutil.copy(tables[1].fileName, named)
+        assert_frame_equal(tr.concatenate(tables[0], tables=named), pd.concat(self.plates[:2], sort=True))
+
+    def testConvert(self):
+        plate = os.path.join(self.tmpDir, 'plate0.csv')
+        converted = os.path.join(self.tmpDir, 'plate0')
+        assert_frame_equal(tr.convert(CsvTable(plate), format='npz', order='F'), self.plates[0])
+        tr.convert(_mode='params', params={'data': plate, 'order': 'F', 'output': converted})
+        self.assertEqual(sniffFormat(converted), 'npz')
+        assert_frame_equal(readTable(converted), self.plates[0])
+
+        # Tasks give the same results from the memory-mapped table.
+        for name, params in [('pca', {'num_components': 1}), ('hierarchy', {'axis': 'columns'})]:
+            expected = getattr(st, name)(**dict(params, data=self.plates[0]))
+            result = getattr(st, name)(**dict(params, data=readTable(converted)))
+            if name == 'pca':
+                assert_frame_equal(result['components'], expected['components'])
+            else:
+                assert_frame_equal(result, expected)
+
+    def testCsvToJson(self):
+        plate = os.path.join(self.tmpDir, 'plate0.csv')
+        output = os.path.join(self.tmpDir, 'plate0.json')
+        assert_frame_equal(tr.csv_to_json(CsvTable(plate), orient='lines', chunksize=1, compression='none'), self.plates[0])
+
+        tr.csv_to_json(_mode='params', params={'data': plate, 'orient': 'lines', 'chunksize': 1, 'output': output})
+        with open(output) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual([row['_sample'] for row in rows], ['p0s1', 'p0s2'])
+        self.assertEqual([row['m0'] for row in rows], [0.0, 0.5])